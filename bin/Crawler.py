@@ -4,16 +4,14 @@
 import os
 import sys
 import re
-import uuid
 import json
 import redis
 import datetime
 import time
-import subprocess
-import requests
 
 from collections import deque
 from pyfaup.faup import Faup
+from twisted.internet import reactor, task, threads
 
 sys.path.append(os.environ['AIL_BIN'])
 from Helper import Process
@@ -22,6 +20,9 @@ from pubsublogger import publisher
 sys.path.append(os.path.join(os.environ['AIL_BIN'], 'lib'))
 import crawlers
 
+sys.path.append(os.path.join(os.environ['AIL_BIN'], 'torcrawler'))
+from TorSplashCrawler import TorSplashCrawlerRunner
+
 # ======== FUNCTIONS ========
 
 def load_blacklist(service_type):
@@ -34,14 +35,6 @@ def load_blacklist(service_type):
     except Exception:
         pass
 
-def update_auto_crawler():
-    current_epoch = int(time.time())
-    list_to_crawl = redis_crawler.zrangebyscore('crawler_auto_queue', '-inf', current_epoch)
-    for elem_to_crawl in list_to_crawl:
-        mess, type = elem_to_crawl.rsplit(';', 1)
-        redis_crawler.sadd(f'{type}_crawler_priority_queue', mess)
-        redis_crawler.zrem('crawler_auto_queue', elem_to_crawl)
-
 # Extract info form url (url, domain, domain url, ...)
 def unpack_url(url):
     to_crawl = {}
@@ -195,89 +188,231 @@ def set_crawled_domain_metadata(type_service, date, domain, father_item):
 
 # Put message back on queue
 def on_error_send_message_back_in_queue(type_service, domain, message):
-    if not redis_crawler.sismember(
-        f'{type_service}_domain_crawler_queue', domain
-    ):
-        redis_crawler.sadd(f'{type_service}_domain_crawler_queue', domain)
-        redis_crawler.sadd(f'{type_service}_crawler_priority_queue', message)
-
-def crawl_onion(url, domain, port, type_service, message, crawler_config):
-    crawler_config['url'] = url
-    crawler_config['port'] = port
-    print(f'Launching Crawler: {url}')
-
-    r_cache.hset(f'metadata_crawler:{splash_url}', 'crawling_domain', domain)
-    r_cache.hset(
-        f'metadata_crawler:{splash_url}',
-        'started_time',
-        datetime.datetime.now().strftime("%Y/%m/%d  -  %H:%M.%S"),
-    )
-
-
-    retry = True
-    nb_retry = 0
-    while retry:
-        try:
-            r = requests.get(f'http://{splash_url}' , timeout=30.0)
-            retry = False
-        except Exception:
-            # TODO: relaunch docker or send error message
-            nb_retry += 1
-
-            if nb_retry == 2:
-                crawlers.restart_splash_docker(splash_url, splash_name)
-                time.sleep(20)
-
-            elif nb_retry == 6:
-                on_error_send_message_back_in_queue(type_service, domain, message)
-                publisher.error(f'{splash_url} SPASH DOWN')
-                print('--------------------------------------')
-                print('         \033[91m DOCKER SPLASH DOWN\033[0m')
-                print(f'          {splash_url} DOWN')
-                r_cache.hset(f'metadata_crawler:{splash_url}', 'status', 'SPLASH DOWN')
-                nb_retry == 0
-
-            print('         \033[91m DOCKER SPLASH NOT AVAILABLE\033[0m')
-            print(f'          Retry({nb_retry}) in 10 seconds')
-            time.sleep(10)
-
-    if r.status_code == 200:
-        r_cache.hset(f'metadata_crawler:{splash_url}', 'status', 'Crawling')
-        # save config in cash
-        UUID = str(uuid.uuid4())
-        r_cache.set(f'crawler_request:{UUID}', json.dumps(crawler_config))
-
-        process = subprocess.Popen(["python", './torcrawler/tor_crawler.py', UUID],
-                                   stdout=subprocess.PIPE)
-        while process.poll() is None:
-            time.sleep(1)
-
-        if process.returncode == 0:
-            output = process.stdout.read().decode()
-            print(output)
-            # error: splash:Connection to proxy refused
-            if 'Connection to proxy refused' in output:
-                on_error_send_message_back_in_queue(type_service, domain, message)
-                publisher.error(f'{splash_url} SPASH, PROXY DOWN OR BAD CONFIGURATION')
-                print('------------------------------------------------------------------------')
-                print('         \033[91m SPLASH: Connection to proxy refused')
-                print('')
-                print('            PROXY DOWN OR BAD CONFIGURATION\033[0m'.format(splash_url))
-                print('------------------------------------------------------------------------')
-                r_cache.hset(f'metadata_crawler:{splash_url}', 'status', 'Error')
-                exit(-2)
-            else:
-                crawlers.update_splash_manager_connection_status(True)
+    crawlers.send_message_back_in_queue(type_service, domain, message)
+
+def print_splash_down():
+    publisher.error(f'{splash_url} SPASH DOWN')
+    print('--------------------------------------')
+    print('         \033[91m DOCKER SPLASH DOWN\033[0m')
+    print(f'          {splash_url} DOWN')
+
+class CrawlerService(object):
+    """
+    Long running crawler service of a Splash: the reactor is kept alive and
+    <concurrency> domains are crawled concurrently. A new domain is pulled
+    from the crawler queues when a crawl ends (deferred callback) or every
+    second if idle. The Splash availability is checked in a thread: the
+    reactor is shared by all the crawls.
+    """
+
+    def __init__(self, concurrency):
+        self.concurrency = concurrency
+        self.runner = TorSplashCrawlerRunner()
+        # domain => to crawl
+        self.running = {}
+        self.splash_nb_retry = 0
+        self.splash_next_check = 0
+        self.splash_checking = False
+        self.exit_code = 0
+        # next auto crawl/delayed domain due
+        self.wakeup = None
+
+    def update_status(self):
+        if self.running:
+            r_cache.hset(f'metadata_crawler:{splash_url}', 'status', 'Crawling')
+            r_cache.hset(f'metadata_crawler:{splash_url}', 'crawling_domain', ', '.join(self.running))
+            r_cache.hset(f'metadata_crawler:{splash_url}', 'type', ', '.join(sorted({to_crawl['type_service'] for to_crawl in self.running.values()})))
         else:
-            print(process.stdout.read())
-            exit(-1)
-    else:
-        on_error_send_message_back_in_queue(type_service, domain, message)
-        print('--------------------------------------')
-        print('         \033[91m DOCKER SPLASH DOWN\033[0m')
-        print(f'          {splash_url} DOWN')
-        r_cache.hset(f'metadata_crawler:{splash_url}', 'status', 'Crawling')
-        exit(1)
+            r_cache.hset(f'metadata_crawler:{splash_url}', 'status', 'Waiting')
+            r_cache.hdel(f'metadata_crawler:{splash_url}', 'crawling_domain')
+            r_cache.hdel(f'metadata_crawler:{splash_url}', 'type')
+
+    def check_splash(self, to_crawl):
+        """
+        Check the Splash availability in a thread, then start the crawl
+        """
+        self.splash_checking = True
+        d = threads.deferToThread(crawlers.is_splash_reachable, f'http://{splash_url}', timeout=30.0)
+        d.addErrback(lambda failure: False)
+        d.addCallback(self.splash_checked, to_crawl)
+
+    def splash_checked(self, reachable, to_crawl):
+        self.splash_checking = False
+        splash_available = self.update_splash_status(reachable)
+        # fill the other crawl slots
+        if self.start_crawl(to_crawl, splash_available) and splash_available and reactor.running and not self.exit_code:
+            self.schedule()
+
+    def update_splash_status(self, reachable):
+        if reachable:
+            self.splash_nb_retry = 0
+            return True
+        # TODO: relaunch docker or send error message
+        self.splash_nb_retry += 1
+        if self.splash_nb_retry == 2:
+            crawlers.restart_splash_docker(splash_url, splash_name)
+        elif self.splash_nb_retry >= 6:
+            print_splash_down()
+            r_cache.hset(f'metadata_crawler:{splash_url}', 'status', 'SPLASH DOWN')
+        print('         \033[91m DOCKER SPLASH NOT AVAILABLE\033[0m')
+        print(f'          Retry({self.splash_nb_retry}) in 10 seconds')
+        self.splash_next_check = time.time() + (20 if self.splash_nb_retry == 2 else 10)
+        return False
+
+    def schedule(self):
+        """
+        Fill the free crawl slots
+        """
+        crawlers.update_auto_crawler_queue()
+        # splash down, wait before next check
+        if time.time() < self.splash_next_check or self.splash_checking:
+            return
+        if len(self.running) < self.concurrency:
+            rotation_mode.rotate()
+            to_crawl = crawlers.get_elem_to_crawl_by_queue_type(rotation_mode)
+            if not to_crawl:
+                self.set_wakeup()
+                return
+            self.check_splash(to_crawl)
+
+    def set_wakeup(self):
+        """
+        Wake up when the next auto crawl or delayed domain is due
+        """
+        next_due = crawlers.get_crawler_queues_next_due_epoch(rotation_mode)
+        if self.wakeup and self.wakeup.active():
+            self.wakeup.cancel()
+        self.wakeup = None
+        if next_due is not None:
+            self.wakeup = reactor.callLater(max(next_due - time.time(), 0), self.schedule)
+
+    def start_crawl(self, to_crawl, splash_available):
+        """
+        :return: False if the domain is sent back in queue
+        """
+        url_data = unpack_url(to_crawl['url'])
+        # remove domain from queue
+        redis_crawler.srem(f"{to_crawl['type_service']}_domain_crawler_queue", url_data['domain'])
+
+        # domain already crawled by this service or Splash down
+        if url_data['domain'] in self.running or not splash_available:
+            on_error_send_message_back_in_queue(to_crawl['type_service'], url_data['domain'], to_crawl['original_message'])
+            return False
+
+        print()
+        print()
+        print('\033[92m------------------START CRAWLER------------------\033[0m')
+        print(f"crawler type:     {to_crawl['type_service']}")
+        print('\033[92m-------------------------------------------------\033[0m')
+        print(f"url:         {url_data['url']}")
+        print(f"domain:      {url_data['domain']}")
+        print(f"domain_url:  {url_data['domain_url']}")
+        print(f"queue:       {to_crawl['queue_name']}, waited {to_crawl['wait']}s")
+        print()
+
+        # Check blacklist
+        if redis_crawler.sismember(f"blacklist_{to_crawl['type_service']}", url_data['domain']):
+            print('                 Blacklisted Domain')
+            print()
+            print()
+            return True
+
+        date = {'date_day': datetime.datetime.now().strftime("%Y%m%d"),
+                'date_month': datetime.datetime.now().strftime("%Y%m"),
+                'epoch': int(time.time())}
+
+        crawler_config = load_crawler_config(to_crawl['queue_type'], to_crawl['type_service'], url_data['domain'], to_crawl['paste'],  to_crawl['url'], date)
+        # check if default crawler
+        if not crawler_config['requested']:
+            # Auto crawl only if service not up this month
+            if redis_crawler.sismember(f"month_{to_crawl['type_service']}_up:{date['date_month']}", url_data['domain']):
+                return True
+
+        set_crawled_domain_metadata(to_crawl['type_service'], date, url_data['domain'], to_crawl['paste'])
+
+        #### CRAWLER ####
+        # Manual and Auto Crawler: url, Default Crawler: domain url
+        url = url_data['url'] if crawler_config['requested'] else url_data['domain_url']
+        crawler_config['url'] = url
+        crawler_config['port'] = url_data['port']
+        print(f'Launching Crawler: {url}')
+
+        options = crawler_config['crawler_options']
+        if options['cookiejar_uuid']:
+            cookies = crawlers.load_crawler_cookies(options['cookiejar_uuid'], url_data['domain'], crawler_type=to_crawl['type_service'])
+        else:
+            cookies = []
+
+        self.running[url_data['domain']] = to_crawl
+        r_cache.hset(f'metadata_crawler:{splash_url}', 'started_time', datetime.datetime.now().strftime("%Y/%m/%d  -  %H:%M.%S"))
+        self.update_status()
+
+        d = self.runner.crawl(crawler_config['splash_url'], to_crawl['type_service'], options, date,
+                              crawler_config['requested'], url, url_data['domain'], url_data['port'],
+                              cookies, to_crawl['paste'])
+        d.addCallback(self.end_crawl, to_crawl, url_data, date, crawler_config)
+        d.addErrback(self.crawl_error, to_crawl, url_data)
+        d.addBoth(self.crawl_done, url_data['domain'])
+        return True
+
+    def end_crawl(self, crawler, to_crawl, url_data, date, crawler_config):
+        # error: splash:Connection to proxy refused
+        if crawler.spider and crawler.spider.crawl_error == 'Connection to proxy refused':
+            on_error_send_message_back_in_queue(to_crawl['type_service'], url_data['domain'], to_crawl['original_message'])
+            publisher.error(f'{splash_url} SPASH, PROXY DOWN OR BAD CONFIGURATION')
+            print('------------------------------------------------------------------------')
+            print('         \033[91m SPLASH: Connection to proxy refused')
+            print('')
+            print('            PROXY DOWN OR BAD CONFIGURATION\033[0m')
+            print('------------------------------------------------------------------------')
+            r_cache.hset(f'metadata_crawler:{splash_url}', 'status', 'Error')
+            self.stop(-2)
+            return
+        crawlers.update_splash_manager_connection_status(True)
+
+        # Save last_status day (DOWN)
+        if not is_domain_up_day(url_data['domain'], to_crawl['type_service'], date['date_day']):
+            redis_crawler.sadd(f"{to_crawl['type_service']}_down:{date['date_day']}", url_data['domain'])
+
+        # if domain was UP at least one time
+        history_key = f"crawler_history_{to_crawl['type_service']}:{url_data['domain']}:{url_data['port']}"
+        if redis_crawler.exists(history_key):
+            # add crawler history (if domain is down)
+            if not redis_crawler.zrangebyscore(history_key, date['epoch'], date['epoch']):
+                # Domain is down
+                redis_crawler.zadd(history_key, int(date['epoch']), int(date['epoch']))
+
+        # update list, last crawled domains
+        redis_crawler.lpush(f"last_{to_crawl['type_service']}", f"{url_data['domain']}:{url_data['port']};{date['epoch']}")
+        redis_crawler.ltrim(f"last_{to_crawl['type_service']}", 0, 15)
+
+        # add next auto Crawling in queue:
+        if to_crawl['paste'] == 'auto':
+            crawlers.add_auto_crawler_in_queue(url_data['domain'], to_crawl['type_service'], url_data['port'], date['epoch'],
+                                               crawler_config['crawler_options']['time'], to_crawl['original_message'])
+
+    def crawl_error(self, failure, to_crawl, url_data):
+        print(f"Crawler error: {url_data['domain']}")
+        print(failure.getTraceback())
+        publisher.error(f"{splash_url} Crawler error: {url_data['domain']} {failure.getErrorMessage()}")
+
+    def crawl_done(self, _, domain):
+        self.running.pop(domain, None)
+        self.update_status()
+        # pull the next domain
+        if reactor.running and not self.exit_code:
+            self.schedule()
+
+    def stop(self, exit_code):
+        self.exit_code = exit_code
+        if reactor.running:
+            reactor.stop()
+
+    def run(self):
+        loop = task.LoopingCall(self.schedule)
+        loop.start(1.0)
+        reactor.run()
+        return self.exit_code
 
 # check external links (full_crawl)
 def search_potential_source_domain(type_service, domain):
@@ -370,6 +505,13 @@ if __name__ == '__main__':
     else:
         default_crawler_png = False
 
+    # number of domains crawled concurrently by Splash
+    if p.config.has_option("Crawler", "splash_concurrency"):
+        crawler_concurrency = p.config.getint("Crawler", "splash_concurrency")
+    else:
+        crawler_concurrency = 1
+    print(f'concurrency: {crawler_concurrency}')
+
     # Default crawler options
     default_crawler_config = {'html': True,
                               'har': default_crawler_har,
@@ -388,98 +530,5 @@ if __name__ == '__main__':
     load_blacklist('onion')
     load_blacklist('regular')
 
-    while True:
-
-        update_auto_crawler()
-
-        rotation_mode.rotate()
-        to_crawl = crawlers.get_elem_to_crawl_by_queue_type(rotation_mode)
-        if to_crawl:
-            url_data = unpack_url(to_crawl['url'])
-            # remove domain from queue
-            redis_crawler.srem('{}_domain_crawler_queue'.format(to_crawl['type_service']), url_data['domain'])
-
-            print()
-            print()
-            print('\033[92m------------------START CRAWLER------------------\033[0m')
-            print('crawler type:     {}'.format(to_crawl['type_service']))
-            print('\033[92m-------------------------------------------------\033[0m')
-            print('url:         {}'.format(url_data['url']))
-            print('domain:      {}'.format(url_data['domain']))
-            print('domain_url:  {}'.format(url_data['domain_url']))
-            print()
-
-            # Check blacklist
-            if not redis_crawler.sismember('blacklist_{}'.format(to_crawl['type_service']), url_data['domain']):
-                date = {'date_day': datetime.datetime.now().strftime("%Y%m%d"),
-                        'date_month': datetime.datetime.now().strftime("%Y%m"),
-                        'epoch': int(time.time())}
-
-                # Update crawler status type
-                r_cache.hset('metadata_crawler:{}'.format(splash_url), 'type', to_crawl['type_service'])
-
-                crawler_config = load_crawler_config(to_crawl['queue_type'], to_crawl['type_service'], url_data['domain'], to_crawl['paste'],  to_crawl['url'], date)
-                # check if default crawler
-                if not crawler_config['requested']:
-                    # Auto crawl only if service not up this month
-                    if redis_crawler.sismember('month_{}_up:{}'.format(to_crawl['type_service'], date['date_month']), url_data['domain']):
-                        continue
-
-                set_crawled_domain_metadata(to_crawl['type_service'], date, url_data['domain'], to_crawl['paste'])
-
-
-                #### CRAWLER ####
-                # Manual and Auto Crawler
-                if crawler_config['requested']:
-
-                ######################################################crawler strategy
-                    # CRAWL domain
-                    crawl_onion(url_data['url'], url_data['domain'], url_data['port'], to_crawl['type_service'], to_crawl['original_message'], crawler_config)
-
-                # Default Crawler
-                else:
-                    # CRAWL domain
-                    crawl_onion(url_data['domain_url'], url_data['domain'], url_data['port'], to_crawl['type_service'], to_crawl['original_message'], crawler_config)
-                    #if url != domain_url and not is_domain_up_day(url_data['domain'], to_crawl['type_service'], date['date_day']):
-                    #    crawl_onion(url_data['url'], url_data['domain'], to_crawl['original_message'])
-
-
-                # Save last_status day (DOWN)
-                if not is_domain_up_day(url_data['domain'], to_crawl['type_service'], date['date_day']):
-                    redis_crawler.sadd('{}_down:{}'.format(to_crawl['type_service'], date['date_day']), url_data['domain'])
-
-                # if domain was UP at least one time
-                if redis_crawler.exists('crawler_history_{}:{}:{}'.format(to_crawl['type_service'], url_data['domain'], url_data['port'])):
-                    # add crawler history (if domain is down)
-                    if not redis_crawler.zrangebyscore('crawler_history_{}:{}:{}'.format(to_crawl['type_service'], url_data['domain'], url_data['port']), date['epoch'], date['epoch']):
-                        # Domain is down
-                        redis_crawler.zadd('crawler_history_{}:{}:{}'.format(to_crawl['type_service'], url_data['domain'], url_data['port']), int(date['epoch']), int(date['epoch']))
-
-                        ############################
-                        # extract page content
-                        ############################
-
-                # update list, last crawled domains
-                redis_crawler.lpush('last_{}'.format(to_crawl['type_service']), '{}:{};{}'.format(url_data['domain'], url_data['port'], date['epoch']))
-                redis_crawler.ltrim('last_{}'.format(to_crawl['type_service']), 0, 15)
-
-                #update crawler status
-                r_cache.hset('metadata_crawler:{}'.format(splash_url), 'status', 'Waiting')
-                r_cache.hdel('metadata_crawler:{}'.format(splash_url), 'crawling_domain')
-
-                # Update crawler status type
-                r_cache.hdel('metadata_crawler:{}'.format(splash_url), 'type', to_crawl['type_service'])
-
-                # add next auto Crawling in queue:
-                if to_crawl['paste'] == 'auto':
-                    redis_crawler.zadd('crawler_auto_queue', int(time.time()+crawler_config['crawler_options']['time']) , '{};{}'.format(to_crawl['original_message'], to_crawl['type_service']))
-                    # update list, last auto crawled domains
-                    redis_crawler.lpush('last_auto_crawled', '{}:{};{}'.format(url_data['domain'], url_data['port'], date['epoch']))
-                    redis_crawler.ltrim('last_auto_crawled', 0, 9)
-            else:
-                print('                 Blacklisted Domain')
-                print()
-                print()
-
-        else:
-            time.sleep(1)
+    crawler_service = CrawlerService(crawler_concurrency)
+    exit(crawler_service.run())
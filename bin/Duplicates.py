@@ -11,7 +11,8 @@ Its input comes from other modules, namely:
 
 This one differ from v1 by only using redis and not json file stored on disk
 
-Perform comparisions with ssdeep and tlsh
+Perform comparisions with ssdeep and tlsh, only on the candidates returned
+by the similarity index of each month (see lib/similarity_index.py)
 
 Requirements:
 -------------
@@ -27,6 +28,7 @@ import ssdeep
 import tlsh
 from packages import Paste
 from pubsublogger import publisher
+from lib.similarity_index import SimilarityIndex
 
 from Helper import Process
 
@@ -59,6 +61,33 @@ if __name__ == "__main__":
                 db=str(year) + str(month),
                 decode_responses=True)
 
+    # Creating the dico name: yyyymm
+    # Get the date of the range
+    dico_range_list = []
+    date_range = date_today - timedelta(days = maximum_month_range*30.4166666)
+    num_of_month = (date_today.year - date_range.year)*12 + (date_today.month - date_range.month)
+    for diff_month in range(0, num_of_month+1):
+        curr_date_range = date_today - timedelta(days = diff_month*30.4166666)
+        to_append = str(curr_date_range.year)+str(curr_date_range.month).zfill(2)
+        dico_range_list.append(to_append)
+
+    # Use all dico in range
+    dico_range_list = dico_range_list[0:maximum_month_range]
+
+    # SIMILARITY INDEX, monthly partitions
+    similarity_indexes = {}
+    for dico_name in dico_redis:
+        sim_index = SimilarityIndex(dico_redis[dico_name])
+        if dico_name in dico_range_list:
+            if not sim_index.is_built():
+                print(f'Building similarity index: {dico_name}')
+                sim_index.build()
+            similarity_indexes[dico_name] = sim_index
+        # expired month
+        elif sim_index.is_built():
+            print(f'Dropping similarity index: {dico_name}')
+            sim_index.drop()
+
     # FUNCTIONS #
     publisher.info("Script duplicate started")
 
@@ -66,7 +95,6 @@ if __name__ == "__main__":
         try:
             hash_dico = {}
             dupl = set()
-            dico_range_list = []
 
             x = time.time()
 
@@ -90,18 +118,6 @@ if __name__ == "__main__":
             # Assignate the correct redis connexion
             r_serv1 = dico_redis[PST.p_date.year + PST.p_date.month]
 
-            # Creating the dico name: yyyymm
-            # Get the date of the range
-            date_range = date_today - timedelta(days = maximum_month_range*30.4166666)
-            num_of_month = (date_today.year - date_range.year)*12 + (date_today.month - date_range.month)
-            for diff_month in range(0, num_of_month+1):
-                curr_date_range = date_today - timedelta(days = diff_month*30.4166666)
-                to_append = str(curr_date_range.year)+str(curr_date_range.month).zfill(2)
-                dico_range_list.append(to_append)
-
-            # Use all dico in range
-            dico_range_list = dico_range_list[0:maximum_month_range]
-
             # UNIQUE INDEX HASHS TABLE
             yearly_index = str(date_today.year)+'00'
             r_serv0 = dico_redis[yearly_index]
@@ -119,7 +135,8 @@ if __name__ == "__main__":
             # Go throught the Database of the dico (of the month)
             for curr_dico_name, curr_dico_redis in opened_dico:
                 for hash_type, paste_hash in paste_hashes.items():
-                    for dico_hash in curr_dico_redis.smembers('HASHS_'+hash_type):
+                    # only compare the plausible candidates
+                    for dico_hash in similarity_indexes[curr_dico_name].get_candidates(hash_type, paste_hash):
 
                         try:
                             if hash_type == 'ssdeep':
@@ -166,6 +183,8 @@ if __name__ == "__main__":
                     print('bad Hash: ' + hash_type)
                 else:
                     r_serv1.sadd("HASHS_"+hash_type, paste_hash)
+                    if PST.p_date.year + PST.p_date.month in similarity_indexes:
+                        similarity_indexes[PST.p_date.year + PST.p_date.month].add(hash_type, paste_hash)
 
     ##################### Similarity found  #######################
 
@@ -14,11 +14,15 @@ the same Subscriber name in both of them.
 import redis
 import configparser
 import os
+import sys
 import zmq
 import time
 import datetime
 import json
 
+sys.path.append(os.environ['AIL_BIN'])
+from lib.module_telemetry import ModuleTelemetry
+
 
 class PubSub(object): ## TODO: remove config, use ConfigLoader by default
 
@@ -147,6 +151,8 @@ class Process(object):
                 decode_responses=True)
 
             self.moduleNum = os.getpid()
+            # heartbeat, started on the first message fetch
+            self.telemetry = ModuleTelemetry(self.r_temp, self.subscriber_name, self.moduleNum)
 
     def populate_set_in(self):
         # monoproc
@@ -166,17 +172,54 @@ class Process(object):
 
     def get_from_set(self):
         # multiproc
+        self.telemetry.start()
         in_set = f'{self.subscriber_name}in'
         self.r_temp.hset('queues', self.subscriber_name,
                          int(self.r_temp.scard(in_set)))
         message = self.r_temp.spop(in_set)
 
-        timestamp = int(time.mktime(datetime.datetime.now().timetuple()))
-        dir_name = os.environ['AIL_HOME']+self.config.get('Directories', 'pastes')
-
         if message is None:
+            self.telemetry.end_messages()
             return None
 
+        path, complete_path = self._get_message_path(message)
+        self.telemetry.start_messages(path, complete_path)
+
+        curr_date = datetime.date.today()
+        self.serv_statistics.hincrby(
+            curr_date.strftime("%Y%m%d"),
+            f'paste_by_modules_in:{self.subscriber_name}',
+            1,
+        )
+
+        return message
+
+    def get_from_set_batch(self, count):
+        # multiproc
+        # Pop up to count messages in one round trip and update the module
+        # bookkeeping (queue size, telemetry, stats) once per batch
+        self.telemetry.start()
+        in_set = f'{self.subscriber_name}in'
+        messages = self.r_temp.execute_command('SPOP', in_set, count)
+        self.r_temp.hset('queues', self.subscriber_name,
+                         int(self.r_temp.scard(in_set)))
+        if not messages:
+            self.telemetry.end_messages()
+            return []
+
+        # last message of the batch is reported as the current one
+        path, complete_path = self._get_message_path(messages[-1])
+        self.telemetry.start_messages(path, complete_path, nb_messages=len(messages))
+
+        curr_date = datetime.date.today()
+        self.serv_statistics.hincrby(
+            curr_date.strftime("%Y%m%d"),
+            f'paste_by_modules_in:{self.subscriber_name}',
+            len(messages),
+        )
+        return messages
+
+    def _get_message_path(self, message):
         try:
             if '.gz' in message:
                 path = message.split(".")[-2].split("/")[-1]
@@ -189,40 +232,13 @@ class Process(object):
                     if (index_s == -1)
                     else message[index_s:index_e]
                 )
-
             else:
                 path = "-"
                 complete_path = "?"
-
-            value = f"{timestamp}, {path}"
-            self.r_temp.set(f"MODULE_{self.subscriber_name}_{str(self.moduleNum)}", value)
-            self.r_temp.set(
-                f"MODULE_{self.subscriber_name}_{str(self.moduleNum)}_PATH",
-                complete_path,
-            )
-
-            self.r_temp.sadd(f"MODULE_TYPE_{self.subscriber_name}", str(self.moduleNum))
-
-            curr_date = datetime.date.today()
-            self.serv_statistics.hincrby(
-                curr_date.strftime("%Y%m%d"),
-                f'paste_by_modules_in:{self.subscriber_name}',
-                1,
-            )
-
-            return message
-
         except:
-            print('except')
             path = "?"
-            value = f"{timestamp}, {path}"
-            self.r_temp.set(f"MODULE_{self.subscriber_name}_{str(self.moduleNum)}", value)
-            self.r_temp.set(
-                f"MODULE_{self.subscriber_name}_{str(self.moduleNum)}_PATH", "?"
-            )
-
-            self.r_temp.sadd(f"MODULE_TYPE_{self.subscriber_name}", str(self.moduleNum))
-            return message
+            complete_path = "?"
+        return path, complete_path
 
     def populate_set_out(self, msg, channel=None):
         # multiproc
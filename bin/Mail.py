@@ -19,9 +19,6 @@ import redis
 import time
 import datetime
 
-import dns.resolver
-import dns.exception
-
 from multiprocessing import Process as Proc
 
 from pubsublogger import publisher
@@ -34,6 +31,7 @@ import Item
 
 sys.path.append(os.path.join(os.environ['AIL_BIN'], 'lib/'))
 import ConfigLoader
+from mx_resolver import MXResolver
 
 ## LOAD CONFIG ##
 config_loader = ConfigLoader.ConfigLoader()
@@ -45,62 +43,8 @@ dns_server = config_loader.get_config_str('Mail', 'dns')
 config_loader = None
 ## -- ##
 
-def is_mxdomain_in_cache(mxdomain):
-    return r_serv_cache.exists(f'mxdomain:{mxdomain}')
-
-def save_mxdomain_in_cache(mxdomain):
-    r_serv_cache.setex(f'mxdomain:{mxdomain}', 1, datetime.timedelta(days=1))
-
-def check_mx_record(set_mxdomains, dns_server):
-    """Check if emails MX domains are responding.
-
-    :param adress_set: -- (set) This is a set of emails domains
-    :return: (int) Number of adress with a responding and valid MX domains
-
-    """
-    resolver = dns.resolver.Resolver()
-    resolver.nameservers = [dns_server]
-    resolver.timeout = 5.0
-    resolver.lifetime = 2.0
-
-    valid_mxdomain = []
-    for mxdomain in set_mxdomains:
-
-        # check if is in cache
-        # # TODO:
-        if is_mxdomain_in_cache(mxdomain):
-            valid_mxdomain.append(mxdomain)
-        else:
-
-            # DNS resolution
-            try:
-                if answers := resolver.query(
-                    mxdomain, rdtype=dns.rdatatype.MX
-                ):
-                    save_mxdomain_in_cache(mxdomain)
-                    valid_mxdomain.append(mxdomain)
-            except dns.resolver.NoNameservers:
-                publisher.debug('NoNameserver, No non-broken nameservers are available to answer the query.')
-                print('NoNameserver, No non-broken nameservers are available to answer the query.')
-            except dns.resolver.NoAnswer:
-                publisher.debug('NoAnswer, The response did not contain an answer to the question.')
-                print('NoAnswer, The response did not contain an answer to the question.')
-            except dns.name.EmptyLabel:
-                publisher.debug('SyntaxError: EmptyLabel')
-                print('SyntaxError: EmptyLabel')
-            except dns.resolver.NXDOMAIN:
-                #save_mxdomain_in_cache(mxdomain)
-                publisher.debug('The query name does not exist.')
-                print('The query name does not exist.')
-            except dns.name.LabelTooLong:
-                publisher.debug('The Label is too long')
-                print('The Label is too long')
-            except dns.exception.Timeout:
-                print('dns timeout')
-                #save_mxdomain_in_cache(mxdomain)
-            except Exception as e:
-                print(e)
-    return valid_mxdomain
+# all the MX domains of an item are resolved concurrently, results cached
+mx_resolver = MXResolver(r_serv_cache, [dns_server])
 
 def extract_all_emails(redis_key, item_content):
     all_emails = re.findall(email_regex, item_content)
@@ -174,7 +118,7 @@ if __name__ == "__main__":
 
                             ## TODO: add MAIL trackers
 
-            valid_mx = check_mx_record(set_mxdomains, dns_server)
+            valid_mx = mx_resolver.get_valid_mx_domains(set_mxdomains)
 
             item_date = Item.get_item_date(item_id)
 
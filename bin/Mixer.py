@@ -23,7 +23,22 @@ Depending on the configuration, this module will process the feed as follow:
         - SImply do not bother to check if it is a duplicate
         - Simply do not bother to check if it is a duplicate
 
-Note that the hash of the content is defined as the sha1(gzip64encoded).
+Note that the hash of the content is defined as the sha1(content): the content
+is decoded (base64 + gzip), the same content re-encoded is a duplicate.
+
+The items saved by a local producer (crawler, submitted items, JSON importer)
+are read in the Mixer local ingest queue: '<item id> local:<sha1>', the sha1
+of the content is computed by the producer. The same duplicate filter is
+applied, the new items are sent to Global by the Global local ingest queue and
+the duplicates are deleted. A local item received from a feeder is rejected.
+
+Duplicates are filtered by a time windowed Bloom filter (window: ttl_duplicate),
+Redis is only queried if the filter find a possible duplicate. The filter is
+saved on disk (Blooms directory) and reloaded on restart.
+
+The number of processed and duplicated items by feeder is saved in the
+daily statistics (ARDB_Statistics) and published every refresh_time (logs,
+dashboard feeders graphs).
 
 Every data coming from a named feed can be sent to a pre-processing module before going to the global module.
 The mapping can be done via the variable FEED_QUEUE_MAPPING
@@ -33,9 +48,14 @@ The mapping can be done via the variable FEED_QUEUE_MAPPING
 import os
 import sys
 
+import atexit
 import base64
+import binascii
+import gzip
 import hashlib
+import signal
 import time
+import zlib
 from pubsublogger import publisher
 import redis
 
@@ -43,12 +63,104 @@ from Helper import Process
 
 sys.path.append(os.path.join(os.environ['AIL_BIN'], 'lib/'))
 import ConfigLoader
+import Statistics
+import item_basic
+import item_store
+from bloom_filter import TimeWindowBloomFilter
 
 
 # CONFIG #
 refresh_time = 30
+# Max number of buffered Redis writes
+max_pipeline_size = 100
 FEED_QUEUE_MAPPING = { "feeder2": "preProcess1" } # Map a feeder name to a pre-processing module
 
+def get_content_digest(gzip64encoded):
+    # hash of the decoded content: the same content re-encoded is a duplicate
+    try:
+        content = gzip.decompress(base64.b64decode(gzip64encoded))
+    except (binascii.Error, OSError, EOFError, zlib.error):
+        content = gzip64encoded.encode('utf8')
+    return hashlib.sha1(content).hexdigest()
+
+def load_dedup_filter(dedup_filter, checkpoint_file, server, operation_mode):
+    if dedup_filter.load(checkpoint_file):
+        print('Duplicate filter loaded')
+        return
+    # No checkpoint: fill the filter with the keys saved in Redis
+    for key in server.scan_iter(count=1000):
+        if operation_mode == 1 and not key.startswith('HASH_'):
+            dedup_filter.add(key)
+        elif operation_mode == 2 and key.startswith('HASH_'):
+            dedup_filter.add(key[5:])
+    print('Duplicate filter filled from Redis')
+
+def filter_duplicate(pipe, dedup_filter, operation_mode, ttl_key, paste_name, feeder_name, digest):
+    """
+    Check if an item is a duplicate, the Redis writes are buffered in the pipeline
+
+    :param digest: sha1 of the content
+    :return: (True if the item is sent to Global, True if duplicated)
+    """
+    # Avoid any duplicate coming from any sources
+    if operation_mode == 1:
+        # possible duplicate, check in Redis
+        if dedup_filter.check_and_add(digest):
+            pipe.exists(digest)
+            is_duplicate = bool(pipe.execute()[-1])
+        else:
+            is_duplicate = False
+        pipe.sadd(digest, feeder_name)
+        pipe.expire(digest, ttl_key)
+        return not is_duplicate, is_duplicate
+
+    elif operation_mode == 2:
+        # Filter to avoid duplicate
+        if dedup_filter.check_and_add(paste_name):
+            pipe.get(f'HASH_{paste_name}')
+            content = pipe.execute()[-1]
+        else:
+            content = None
+        if content is None:
+            # New content
+            # Store in redis for filtering
+            pipe.set(f'HASH_{paste_name}', digest)
+            pipe.sadd(paste_name, feeder_name)
+            pipe.expire(paste_name, ttl_key)
+            pipe.expire(f'HASH_{paste_name}', ttl_key)
+            return True, False
+
+        # Same paste name but different content
+        if digest != content:
+            pipe.sadd(paste_name, feeder_name)
+            pipe.expire(paste_name, ttl_key)
+            return True, True
+        return False, True
+
+    # Don't look if duplicated content
+    return True, False
+
+def publish_feeders_stats(processed_paste_per_feeder, duplicated_paste_per_feeder):
+    processed_paste = sum(processed_paste_per_feeder.values())
+    print(processed_paste_per_feeder)
+    to_print = 'Mixer; ; ; ;mixer_all All_feeders Processed {0} paste(s) in {1}sec'.format(processed_paste, refresh_time)
+    print(to_print)
+    publisher.info(to_print)
+
+    for feeder, count in processed_paste_per_feeder.items():
+        to_print = 'Mixer; ; ; ;mixer_{0} {0} Processed {1} paste(s) in {2}sec'.format(feeder, count, refresh_time)
+        print(to_print)
+        publisher.info(to_print)
+
+    for feeder, count in duplicated_paste_per_feeder.items():
+        to_print = 'Mixer; ; ; ;mixer_{0} {0} Duplicated {1} paste(s) in {2}sec'.format(feeder, count, refresh_time)
+        print(to_print)
+        publisher.info(to_print)
+
+def sigterm_handler(signum, frame):
+    # save the duplicate filter (atexit)
+    sys.exit(0)
+
 if __name__ == '__main__':
     publisher.port = 6380
     publisher.channel = 'Script'
@@ -70,12 +182,26 @@ if __name__ == '__main__':
     operation_mode = config_loader.get_config_int("Module_Mixer", "operation_mode")
     ttl_key = config_loader.get_config_int("Module_Mixer", "ttl_duplicate")
     default_unnamed_feed_name = config_loader.get_config_str("Module_Mixer", "default_unnamed_feed_name")
+    dedup_capacity = config_loader.get_config_int("Module_Mixer", "dedup_capacity")
+    dedup_error_rate = float(config_loader.get_config_str("Module_Mixer", "dedup_error_rate"))
 
     PASTES_FOLDER = os.path.join(os.environ['AIL_HOME'], config_loader.get_config_str("Directories", "pastes")) + '/'
+    BLOOMS_FOLDER = os.path.join(os.environ['AIL_HOME'], config_loader.get_config_str("Directories", "bloomfilters"))
     config_loader = None
 
+    # DUPLICATE FILTER #
+    dedup_filter = None
+    if operation_mode in (1, 2):
+        checkpoint_file = os.path.join(BLOOMS_FOLDER, f'mixer_mode_{operation_mode}')
+        dedup_filter = TimeWindowBloomFilter(dedup_capacity, error_rate=dedup_error_rate, window=ttl_key)
+        load_dedup_filter(dedup_filter, checkpoint_file, server, operation_mode)
+        atexit.register(dedup_filter.save, checkpoint_file)
+        signal.signal(signal.SIGTERM, sigterm_handler)
+
+    # Redis writes, executed before a Redis lookup or when idle
+    pipe = server.pipeline(transaction=False)
+
     # STATS #
-    processed_paste = 0
     processed_paste_per_feeder = {}
     duplicated_paste_per_feeder = {}
     time_1 = time.time()
@@ -84,10 +210,55 @@ if __name__ == '__main__':
 
     while True:
 
+        if int(time.time() - time_1) > refresh_time:
+            # items sent directly to the Mixer queue (importers, crawler, ...)
+            if list_feeder := server_cache.hgetall("mixer_cache:list_feeder"):
+                for feeder, count in list_feeder.items():
+                    processed_paste_per_feeder[feeder] = processed_paste_per_feeder.get(feeder, 0) + int(count)
+                # delete internal feeder list
+                server_cache.delete("mixer_cache:list_feeder")
+
+            Statistics.incr_mixer_feeders_statistics(processed_paste_per_feeder, duplicated_paste_per_feeder)
+            # dashboard: processed/duplicated feeders graphs
+            publish_feeders_stats(processed_paste_per_feeder, duplicated_paste_per_feeder)
+            # the known feeders are published with 0
+            processed_paste_per_feeder = dict.fromkeys(processed_paste_per_feeder, 0)
+            duplicated_paste_per_feeder = dict.fromkeys(duplicated_paste_per_feeder, 0)
+
+            if dedup_filter:
+                pipe.execute()
+                dedup_filter.save(checkpoint_file)
+
+            time_1 = time.time()
+
+        # items saved by the local producers
+        local_messages = item_basic.pop_local_ingest_messages(item_basic.MIXER_LOCAL_INGEST_QUEUE, max_pipeline_size)
+        for local_message in local_messages:
+            item_id, digest = local_message.split()
+            digest = digest[len(item_store.LOCAL_ITEM_MARKER):]
+            feeder_name = item_basic.get_source(item_id)
+
+            is_new, is_duplicate = filter_duplicate(pipe, dedup_filter, operation_mode, ttl_key,
+                                                    item_id, feeder_name, digest)
+            if is_duplicate:
+                duplicated_paste_per_feeder[feeder_name] = duplicated_paste_per_feeder.get(feeder_name, 0) + 1
+            if is_new:
+                item_basic.add_local_ingest_message(item_basic.GLOBAL_LOCAL_INGEST_QUEUE, local_message)
+            # saved by the producer
+            else:
+                item_basic.delete_local_item(item_id)
+
+            if len(pipe) >= max_pipeline_size:
+                pipe.execute()
+
         message = p.get_from_set()
         if message is not None:
             splitted = message.split()
-            if len(splitted) == 2:
+            if len(splitted) == 2 and item_store.is_local_item_message(splitted[1]):
+                # only the local producers send local items (local ingest queue)
+                print(f'Untrusted local item: {splitted[0]}')
+                publisher.warning(f'Mixer; Untrusted local item {splitted[0]}')
+            elif len(splitted) == 2:
                 complete_paste, gzip64encoded = splitted
 
                 try:
@@ -105,108 +276,37 @@ if __name__ == '__main__':
                 paste_name = paste_name.replace(PASTES_FOLDER, '', 1)
 
                 # Processed paste
-                processed_paste += 1
-                try:
-                    processed_paste_per_feeder[feeder_name] += 1
-                except KeyError as e:
-                    # new feeder
-                    processed_paste_per_feeder[feeder_name] = 1
-                    duplicated_paste_per_feeder[feeder_name] = 0
-
+                processed_paste_per_feeder[feeder_name] = processed_paste_per_feeder.get(feeder_name, 0) + 1
+                duplicated_paste_per_feeder.setdefault(feeder_name, 0)
 
                 relay_message = "{0} {1}".format(paste_name, gzip64encoded)
                 #relay_message = b" ".join( [paste_name, gzip64encoded] )
 
-                digest = hashlib.sha1(gzip64encoded.encode('utf8')).hexdigest()
-
-                # Avoid any duplicate coming from any sources
-                if operation_mode == 1:
-                    if server.exists(digest): # Content already exists
-                        #STATS
-                        duplicated_paste_per_feeder[feeder_name] += 1
-                    elif feeder_name in FEED_QUEUE_MAPPING:
+                if operation_mode in (1, 2):
+                    digest = get_content_digest(gzip64encoded)
+                else:
+                    digest = None
+                is_new, is_duplicate = filter_duplicate(pipe, dedup_filter, operation_mode, ttl_key,
+                                                        paste_name, feeder_name, digest)
+                if is_duplicate:
+                    #STATS
+                    duplicated_paste_per_feeder[feeder_name] = duplicated_paste_per_feeder.get(feeder_name, 0) + 1
+                if is_new:
+                    # populate Global OR populate another set based on the feeder_name
+                    if feeder_name in FEED_QUEUE_MAPPING:
                         p.populate_set_out(relay_message, FEED_QUEUE_MAPPING[feeder_name])
                     else:
                         p.populate_set_out(relay_message, 'Mixer')
 
-                    server.sadd(digest, feeder_name)
-                    server.expire(digest, ttl_key)
-
-
-                elif operation_mode == 2:
-                    # Filter to avoid duplicate
-                    content = server.get(f'HASH_{paste_name}')
-                    if content is None:
-                        # New content
-                        # Store in redis for filtering
-                        server.set(f'HASH_{paste_name}', digest)
-                        server.sadd(paste_name, feeder_name)
-                        server.expire(paste_name, ttl_key)
-                        server.expire(f'HASH_{paste_name}', ttl_key)
-
-                        # populate Global OR populate another set based on the feeder_name
-                        if feeder_name in FEED_QUEUE_MAPPING:
-                            p.populate_set_out(relay_message, FEED_QUEUE_MAPPING[feeder_name])
-                        else:
-                            p.populate_set_out(relay_message, 'Mixer')
-
-                    else:
-                        # Same paste name but different content
-                        #STATS
-                        duplicated_paste_per_feeder[feeder_name] += 1
-                        if digest != content:
-                            server.sadd(paste_name, feeder_name)
-                            server.expire(paste_name, ttl_key)
-
-                            # populate Global OR populate another set based on the feeder_name
-                            if feeder_name in FEED_QUEUE_MAPPING:
-                                p.populate_set_out(relay_message, FEED_QUEUE_MAPPING[feeder_name])
-                            else:
-                                p.populate_set_out(relay_message, 'Mixer')
-
-                elif feeder_name in FEED_QUEUE_MAPPING:
-                    p.populate_set_out(relay_message, FEED_QUEUE_MAPPING[feeder_name])
-                else:
-                    p.populate_set_out(relay_message, 'Mixer')
-
+                if len(pipe) >= max_pipeline_size:
+                    pipe.execute()
 
             else:
                 # TODO Store the name of the empty paste inside a Redis-list.
                 print("Empty Paste: not processed")
                 publisher.debug("Empty Paste: {0} not processed".format(message))
-        else:
-
-            if int(time.time() - time_1) > refresh_time:
-                if list_feeder := server_cache.hkeys(
-                    "mixer_cache:list_feeder"
-                ):
-                    for feeder in list_feeder:
-                        count = int(server_cache.hget("mixer_cache:list_feeder", feeder))
-                        if count is None:
-                            count = 0
-                        processed_paste_per_feeder[feeder] = processed_paste_per_feeder.get(feeder, 0) + count
-                        processed_paste = processed_paste + count
-                print(processed_paste_per_feeder)
-                to_print = 'Mixer; ; ; ;mixer_all All_feeders Processed {0} paste(s) in {1}sec'.format(processed_paste, refresh_time)
-                print(to_print)
-                publisher.info(to_print)
-                processed_paste = 0
-
-                for feeder, count in processed_paste_per_feeder.items():
-                    to_print = 'Mixer; ; ; ;mixer_{0} {0} Processed {1} paste(s) in {2}sec'.format(feeder, count, refresh_time)
-                    print(to_print)
-                    publisher.info(to_print)
-                    processed_paste_per_feeder[feeder] = 0
-
-                for feeder, count in duplicated_paste_per_feeder.items():
-                    to_print = 'Mixer; ; ; ;mixer_{0} {0} Duplicated {1} paste(s) in {2}sec'.format(feeder, count, refresh_time)
-                    print(to_print)
-                    publisher.info(to_print)
-                    duplicated_paste_per_feeder[feeder] = 0
-
-                time_1 = time.time()
-
-                # delete internal feeder list
-                server_cache.delete("mixer_cache:list_feeder")
+        elif not local_messages:
+            if len(pipe):
+                pipe.execute()
             time.sleep(0.5)
             continue
@@ -19,6 +19,7 @@ from packages import Paste
 
 sys.path.append(os.path.join(os.environ['AIL_BIN'], 'lib/'))
 import ConfigLoader
+import module_telemetry
 
  # CONFIG VARIABLES
 kill_retry_threshold = 60 #1m
@@ -42,7 +43,7 @@ PID_NAME_DICO = {}
 # Tables containing info for the dashboad
 TABLES = {"running": [], "idle": [], "notRunning": [], "logs": [("No events recorded yet", 0)]}
 TABLES_TITLES = {"running": "", "idle": "", "notRunning": "", "logs": ""}
-TABLES_PADDING = {"running": [12, 23, 8, 8, 23, 10, 55, 11, 11, 12], "idle": [9, 23, 8, 12, 50], "notRunning": [9, 23, 35], "logs": [15, 23, 8, 50]}
+TABLES_PADDING = {"running": [12, 23, 8, 8, 23, 10, 35, 10, 10, 11, 11, 12], "idle": [9, 23, 8, 12, 50], "notRunning": [9, 23, 35], "logs": [15, 23, 8, 50]}
 
 # Indicator for the health of a queue (green(0), red(2), yellow(1))
 QUEUE_STATUS = {}
@@ -528,48 +529,28 @@ def getPid(module):
     return None
 
 def clearRedisModuleInfo():
-    for k in server.keys("MODULE_*"):
-        server.delete(k)
+    module_telemetry.clear_fleet(server)
     inst_time = datetime.datetime.fromtimestamp(int(time.time()))
     log(([str(inst_time).split(' ')[1], "*", "-", "Cleared redis module info"], 0))
 
 def cleanRedis():
-    for k in server.keys("MODULE_TYPE_*"):
-        moduleName = k[12:].split('_')[0]
-        for pid in server.smembers(k):
-            flag_pid_valid = False
-            proc = Popen([command_search_name.format(pid)], stdin=PIPE, stdout=PIPE, bufsize=1, shell=True)
-            try:
-                for line in proc.stdout:
-                    line = line.decode('utf8')
-                    splittedLine = line.split()
-                    if ('python3.5' in splittedLine or 'python3' in splittedLine or 'python' in splittedLine):
-                        moduleCommand = f"./{moduleName}.py"
-                        moduleCommand2 = f"{moduleName}.py"
-                        if(moduleCommand in splittedLine or moduleCommand2 in splittedLine):
-                            flag_pid_valid = True
-
-
-                if not flag_pid_valid:
-                    #print flag_pid_valid, 'cleaning', pid, 'in', k
-                    server.srem(k, pid)
-                    inst_time = datetime.datetime.fromtimestamp(int(time.time()))
-                    log(
-                        (
-                            [
-                                str(inst_time).split(' ')[1],
-                                moduleName,
-                                pid,
-                                f"Cleared invalid pid in {k}",
-                            ],
-                            0,
-                        )
-                    )
-
-
-            except IOError as e:
-                inst_time = datetime.datetime.fromtimestamp(int(time.time()))
-                log(([str(inst_time).split(' ')[1], " - ", " - ", "Cleaning fail due to resize."], 0))
+    # the heartbeats of the dead modules expire, remove the killed modules now
+    queues, workers = module_telemetry.get_fleet(server)
+    for worker in workers:
+        if not psutil.pid_exists(worker['pid']):
+            module_telemetry.delete_worker(server, worker['module'], worker['pid'])
+            inst_time = datetime.datetime.fromtimestamp(int(time.time()))
+            log(
+                (
+                    [
+                        str(inst_time).split(' ')[1],
+                        worker['module'],
+                        worker['pid'],
+                        "Cleared invalid pid",
+                    ],
+                    0,
+                )
+            )
 
 
 def restart_module(module, count=1):
@@ -598,7 +579,7 @@ def kill_module(module, pid):
         inst_time = datetime.datetime.fromtimestamp(int(time.time()))
         log(([str(inst_time).split(' ')[1], module, pid, "PID was None"], 0))
         pid = getPid(module)
-    elif server.exists(f"MODULE_{module}_{str(pid)}") == 0:
+    elif not module_telemetry.is_worker_alive(server, module, pid):
         return
 
     lastTimeKillCommand[pid] = int(time.time())
@@ -649,21 +630,22 @@ def fetchQueueData():
     printarray_running = []
     printarray_idle = []
     printarray_notrunning = []
-    for queue, card in iter(server.hgetall("queues").items()):
+    # fleet view: queues + modules heartbeats
+    queues, workers = module_telemetry.get_fleet(server)
+    queues_workers = {}
+    for worker in workers:
+        queues_workers.setdefault(worker['module'], []).append(worker)
+
+    for queue, card in iter(queues.items()):
         all_queue.add(queue)
-        key = f"MODULE_{queue}_"
-        keySet = f"MODULE_TYPE_{queue}"
         array_module_type = []
 
-        for moduleNum in server.smembers(keySet):
-            value = server.get(key + str(moduleNum))
-            complete_paste_path = ( server.get(key + str(moduleNum) + "_PATH") )
-            if(complete_paste_path is not None):
-                complete_paste_path = complete_paste_path
-            COMPLETE_PASTE_PATH_PER_PID[moduleNum] = complete_paste_path
+        for worker in queues_workers.get(queue, []):
+            moduleNum = str(worker['pid'])
+            COMPLETE_PASTE_PATH_PER_PID[moduleNum] = worker['last_path']
 
-            if value is not None:
-                timestamp, path = value.split(", ")
+            if worker['last_time'] is not None:
+                timestamp, path = worker['last_time'], worker['last']
                 if timestamp is not None and path is not None:
                     # Queue health
                     startTime_readable = datetime.datetime.fromtimestamp(int(timestamp))
@@ -729,7 +711,8 @@ def fetchQueueData():
                                 mem_percent = 0
 
                         array_module_type.append( ([" <K>    [ ]", str(queue), str(moduleNum), str(card), str(startTime_readable),
-                                                    str(processed_time_readable), str(path), "{0:.2f}".format(cpu_percent)+"%",
+                                                    str(processed_time_readable), str(path), f"{worker['rate']}/s", str(worker['p99']),
+                                                    "{0:.2f}".format(cpu_percent)+"%",
                                                     "{0:.2f}".format(mem_percent)+"%", "{0:.2f}".format(cpu_avg)+"%"], moduleNum) )
 
                     else:
@@ -741,7 +724,7 @@ def fetchQueueData():
     for curr_queue in module_file_array:
         if curr_queue not in all_queue: #Module not running by default
             printarray_notrunning.append( ([" <S>  ", curr_queue, "Not running by default"], curr_queue) )
-        elif not list(server.smembers(f'MODULE_TYPE_{curr_queue}')):
+        elif curr_queue not in queues_workers:
             if curr_queue in no_info_modules:
                     #If no info since long time, try to kill
                 if args.autokill == 1:
@@ -888,7 +871,7 @@ if __name__ == "__main__":
     cleanRedis()
 
 
-    TABLES_TITLES["running"] = format_string([([" Action", "Queue name", "PID", "#", "S Time", "R Time", "Processed element", "CPU %", "Mem %", "Avg CPU%"],0)], TABLES_PADDING["running"])[0][0]
+    TABLES_TITLES["running"] = format_string([([" Action", "Queue name", "PID", "#", "S Time", "R Time", "Processed element", "Rate", "p99 ms", "CPU %", "Mem %", "Avg CPU%"],0)], TABLES_PADDING["running"])[0][0]
     TABLES_TITLES["idle"] = format_string([([" Action", "Queue", "PID", "Idle Time", "Last paste hash"],0)], TABLES_PADDING["idle"])[0][0]
     TABLES_TITLES["notRunning"] = format_string([([" Action", "Queue", "State"],0)], TABLES_PADDING["notRunning"])[0][0]
     TABLES_TITLES["logs"] = format_string([(["Time", "Module", "PID", "Info"],0)], TABLES_PADDING["logs"])[0][0]
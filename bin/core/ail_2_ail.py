@@ -2,6 +2,7 @@
 # -*-coding:UTF-8 -*
 
 import os
+import fcntl
 import json
 import secrets
 import re
@@ -28,8 +29,25 @@ config_loader = ConfigLoader.ConfigLoader()
 r_cache = config_loader.get_redis_conn("Redis_Cache")
 r_serv_db = config_loader.get_redis_conn("ARDB_DB")
 r_serv_sync = config_loader.get_redis_conn("ARDB_DB")
+if config_loader.has_option('AIL_2_AIL', 'batch_size'):
+    SYNC_BATCH_SIZE = config_loader.get_config_int('AIL_2_AIL', 'batch_size')
+    SYNC_BATCH_CREDITS = config_loader.get_config_int('AIL_2_AIL', 'batch_credits')
+    SYNC_IMPORTER_MAX_SIZE = config_loader.get_config_int('AIL_2_AIL', 'importer_max_size')
+    SYNC_SPILL_DIR = config_loader.get_config_str('AIL_2_AIL', 'spill_dir')
+else:
+    SYNC_BATCH_SIZE = 100
+    SYNC_BATCH_CREDITS = 4
+    SYNC_IMPORTER_MAX_SIZE = 10000
+    SYNC_SPILL_DIR = 'sync_spill'
+SYNC_SPILL_DIR = os.path.join(os.environ['AIL_HOME'], SYNC_SPILL_DIR)
 config_loader = None
 
+# sync server version supporting the batch protocol
+SYNC_BATCH_VERSION = 0.2
+SYNC_QUEUE_DEFAULT_MAX_SIZE = 100
+# spill segment max size (bytes)
+SYNC_SPILL_SEGMENT_SIZE = 1000000
+
 WEBSOCKETS_CLOSE_CODES = {
                             1000: 'Normal Closure',
                             1001: 'Going Away',
@@ -86,7 +104,7 @@ def get_ail_uuid():
     return r_serv_db.get('ail:uuid')
 
 def get_sync_server_version():
-    return '0.1'
+    return '0.2'
 
 def is_valid_websocket_url(websocket_url):
     regex_websocket_url = r'^(wss:\/\/)([0-9]{1,3}(?:\.[0-9]{1,3}){3}|(?=[^\/]{1,254}(?![^\/]))(?:(?=[a-zA-Z0-9-]{1,63}\.?)(?:xn--+)?[a-zA-Z0-9]+(?:-[a-zA-Z0-9]+)*\.?)+[a-zA-Z]{2,63}):([0-9]{1,5})$'
@@ -479,6 +497,15 @@ def change_pull_push_state(ail_uuid, pull=None, push=None):
 def get_ail_server_version(ail_uuid):
     return r_serv_sync.hget(f'ail:instance:{ail_uuid}', 'version')
 
+def is_ail_server_sync_batch(ail_uuid):
+    """
+    Check if the remote AIL server supports the batch protocol, the version is fetched if unknown
+    """
+    version = get_ail_server_version(ail_uuid)
+    if not version:
+        version = get_remote_ail_server_version(ail_uuid)
+    return bool(version) and float(version) >= SYNC_BATCH_VERSION
+
 def get_ail_server_ping(ail_uuid):
     res = r_serv_sync.hget(f'ail:instance:{ail_uuid}', 'ping')
     return res == 'True'
@@ -1083,41 +1110,201 @@ def get_sync_queue_object(ail_uuid, push=True):
     obj_dict, queue_uuid = get_sync_queue_object_and_queue_uuid(ail_uuid, push=push)[0]
     return obj_dict
 
-def get_sync_queue_object_by_queue_uuid(queue_uuid, ail_uuid, push=True):
+def get_sync_queue_key(queue_uuid, ail_uuid, push=True):
+    sync_mode = 'push' if push else 'pull'
+    return f'sync:queue:{sync_mode}:{queue_uuid}:{ail_uuid}'
+
+def get_sync_queue_spill_dir(queue_uuid, ail_uuid, push=True):
     sync_mode = 'push' if push else 'pull'
-    if obj_dict := r_serv_sync.lpop(
-        f'sync:queue:{sync_mode}:{queue_uuid}:{ail_uuid}'
-    ):
+    return os.path.join(SYNC_SPILL_DIR, sync_mode, queue_uuid, ail_uuid)
+
+def get_sync_queue_object_by_queue_uuid(queue_uuid, ail_uuid, push=True):
+    key = get_sync_queue_key(queue_uuid, ail_uuid, push=push)
+    obj_dict = r_serv_sync.lpop(key)
+    if not obj_dict:
+        if refill_sync_queue(queue_uuid, ail_uuid, push=push):
+            obj_dict = r_serv_sync.lpop(key)
+    if obj_dict:
         obj_dict = json.loads(obj_dict)
         # # REVIEW: # TODO: create by obj type
         return Item(obj_dict['id'])
 
+def _add_to_sync_queue(queue_uuid, ail_uuid, obj, max_size, push=True):
+    key = get_sync_queue_key(queue_uuid, ail_uuid, push=push)
+    spill_dir = get_sync_queue_spill_dir(queue_uuid, ail_uuid, push=push)
+    # queue full or older objects on disk: spill to disk, keep the order
+    if _get_spill_segments(spill_dir) or r_serv_sync.llen(key) >= max_size:
+        spill_sync_queue_objects(spill_dir, [obj])
+    else:
+        r_serv_sync.rpush(key, obj)
+
 def add_object_to_sync_queue(queue_uuid, ail_uuid, obj_dict, push=True, pull=True):
     obj = json.dumps(obj_dict)
-
-    # # TODO: # FIXME: USE CACHE ??????
+    max_size = int(get_sync_queue_max_size(queue_uuid) or SYNC_QUEUE_DEFAULT_MAX_SIZE)
     if push:
-        r_serv_sync.lpush(f'sync:queue:push:{queue_uuid}:{ail_uuid}', obj)
-        r_serv_sync.ltrim(f'sync:queue:push:{queue_uuid}:{ail_uuid}', 0, 200)
-
+        _add_to_sync_queue(queue_uuid, ail_uuid, obj, max_size, push=True)
     if pull:
-        r_serv_sync.lpush(f'sync:queue:pull:{queue_uuid}:{ail_uuid}', obj)
-        r_serv_sync.ltrim(f'sync:queue:pull:{queue_uuid}:{ail_uuid}', 0, 200)
+        _add_to_sync_queue(queue_uuid, ail_uuid, obj, max_size, push=False)
 
 def resend_object_to_sync_queue(ail_uuid, queue_uuid, Obj, push=True):
     if queue_uuid is not None and Obj is not None:
         obj_dict = Obj.get_default_meta()
-        pull = not push
-        add_object_to_sync_queue(queue_uuid, ail_uuid, obj_dict, push=push, pull=pull)
+        # head of the queue
+        r_serv_sync.lpush(get_sync_queue_key(queue_uuid, ail_uuid, push=push), json.dumps(obj_dict))
+
+#### SYNC QUEUE SPILL ####
+#
+#   Objects over the queue max size are appended to segments files:
+#       SYNC_SPILL_DIR/<sync mode>/<queue uuid>/<ail uuid>/<time_ns>.jsonl
+#   The oldest segment is loaded in the queue when the queue is drained.
+#   The segments are locked (flock), a segment loaded by a sync client is unlinked.
+
+def _get_spill_segments(spill_dir):
+    try:
+        return sorted(f for f in os.listdir(spill_dir) if f.endswith('.jsonl'))
+    except FileNotFoundError:
+        return []
+
+def spill_sync_queue_objects(spill_dir, objs):
+    os.makedirs(spill_dir, exist_ok=True)
+    segments = _get_spill_segments(spill_dir)
+    while True:
+        filename = None
+        if segments:
+            filename = os.path.join(spill_dir, segments[-1])
+            try:
+                if os.path.getsize(filename) >= SYNC_SPILL_SEGMENT_SIZE:
+                    filename = None
+            except FileNotFoundError:
+                filename = None
+        if not filename:
+            filename = os.path.join(spill_dir, f'{time.time_ns()}.jsonl')
+        with open(filename, 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            # segment loaded by a sync client, create a new one
+            if os.fstat(f.fileno()).st_nlink == 0:
+                segments = []
+                continue
+            f.write(''.join(f'{obj}\n' for obj in objs))
+        return
+
+def refill_sync_queue(queue_uuid, ail_uuid, push=True):
+    """
+    Load the oldest spilled segment in the sync queue
+
+    :return: number of objects loaded
+    """
+    spill_dir = get_sync_queue_spill_dir(queue_uuid, ail_uuid, push=push)
+    segments = _get_spill_segments(spill_dir)
+    if not segments:
+        return 0
+    filename = os.path.join(spill_dir, segments[0])
+    try:
+        with open(filename, 'r') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            objs = [obj for obj in f.read().splitlines() if obj]
+            if objs:
+                r_serv_sync.rpush(get_sync_queue_key(queue_uuid, ail_uuid, push=push), *objs)
+            os.remove(filename)
+    except FileNotFoundError:
+        return 0
+    return len(objs)
+
+def get_sync_queue_nb_spilled_segments(queue_uuid, ail_uuid, push=True):
+    return len(_get_spill_segments(get_sync_queue_spill_dir(queue_uuid, ail_uuid, push=push)))
+
+#### SYNC BATCH ####
+#
+#   sync:queue:seq:<sync mode>:<ail uuid>       => last batch sequence number
+#   sync:queue:pending:<sync mode>:<ail uuid>   => sequence number => batch not acknowledged
+
+def get_sync_queue_batch(ail_uuid, push=True, batch_size=SYNC_BATCH_SIZE):
+    """
+    Pop a batch of objects from the sync queues of an AIL instance.
+    The batch is pending until acknowledged by the remote AIL.
+
+    :return: sequence number, list of (queue_uuid, obj_dict)
+    """
+    sync_mode = 'push' if push else 'pull'
+    objs = []
+    popped = []
+    for queue_uuid in get_ail_instance_all_sync_queue(ail_uuid):
+        nb_objs = batch_size - len(objs)
+        if nb_objs <= 0:
+            break
+        key = get_sync_queue_key(queue_uuid, ail_uuid, push=push)
+        if r_serv_sync.llen(key) < nb_objs:
+            refill_sync_queue(queue_uuid, ail_uuid, push=push)
+        res = r_serv_sync.lrange(key, 0, nb_objs - 1)
+        if res:
+            objs.extend((queue_uuid, obj) for obj in res)
+            popped.append((key, len(res)))
+    if not objs:
+        return None, []
+
+    # one sync client by AIL instance and sync mode, new objects are pushed at the tail
+    seq = r_serv_sync.incr(f'sync:queue:seq:{sync_mode}:{ail_uuid}')
+    pipe = r_serv_sync.pipeline(transaction=False)
+    pipe.hset(f'sync:queue:pending:{sync_mode}:{ail_uuid}', seq, json.dumps(objs))
+    for key, nb_objs in popped:
+        pipe.ltrim(key, nb_objs, -1)
+    pipe.execute()
+    return seq, [(queue_uuid, json.loads(obj)) for queue_uuid, obj in objs]
+
+def ack_sync_queue_batch(ail_uuid, seq, push=True):
+    sync_mode = 'push' if push else 'pull'
+    return r_serv_sync.hdel(f'sync:queue:pending:{sync_mode}:{ail_uuid}', seq)
+
+def get_sync_queue_nb_pending_batch(ail_uuid, push=True):
+    sync_mode = 'push' if push else 'pull'
+    return r_serv_sync.hlen(f'sync:queue:pending:{sync_mode}:{ail_uuid}')
+
+def requeue_sync_queue_pending(ail_uuid, push=True):
+    """
+    Push back the batches not acknowledged at the head of their queues
+    """
+    sync_mode = 'push' if push else 'pull'
+    pending_key = f'sync:queue:pending:{sync_mode}:{ail_uuid}'
+    pending = r_serv_sync.hgetall(pending_key)
+    if not pending:
+        return 0
+    pipe = r_serv_sync.pipeline(transaction=False)
+    nb_objs = 0
+    for seq in sorted(pending, key=int, reverse=True):
+        for queue_uuid, obj in reversed(json.loads(pending[seq])):
+            pipe.lpush(get_sync_queue_key(queue_uuid, ail_uuid, push=push), obj)
+            nb_objs += 1
+    pipe.delete(pending_key)
+    pipe.execute()
+    return nb_objs
+
+def create_ail_streams_batch(objs):
+    ail_streams = []
+    for queue_uuid, obj_dict in objs:
+        # # REVIEW: # TODO: create by obj type
+        obj = Item(obj_dict['id'])
+        try:
+            ail_streams.append(create_ail_stream(obj))
+        # deleted object
+        except FileNotFoundError:
+            print(f'object not found: {obj_dict["id"]}')
+    return ail_streams
 
 # # TODO: # REVIEW: USE CACHE ????? USE QUEUE FACTORY ?????
 def get_sync_importer_ail_stream():
     return r_serv_sync.spop('sync:queue:importer')
 
+def get_sync_importer_queue_size():
+    return r_serv_sync.scard('sync:queue:importer')
+
 def add_ail_stream_to_sync_importer(ail_stream):
     ail_stream = json.dumps(ail_stream)
     r_serv_sync.sadd('sync:queue:importer', ail_stream)
 
+def add_ail_streams_to_sync_importer(ail_streams):
+    if ail_streams:
+        r_serv_sync.sadd('sync:queue:importer', *[json.dumps(ail_stream) for ail_stream in ail_streams])
+
 #############################
 #                           #
 #### AIL EXCHANGE FORMAT ####
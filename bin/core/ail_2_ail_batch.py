@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# -*-coding:UTF-8 -*
+
+"""
+AIL 2 AIL batch protocol
+========================
+
+Sync stream used by the push and pull sync modes (path /<sync mode>/batch/<ail uuid>):
+
+- the sender sends binary frames: a batch of AIL streams, zlib compressed
+  JSON {'seq': <sequence number>, 'objs': [<ail stream>, ...]}
+- the receiver grants credits (JSON {'credits': <nb>}), the sender has at most
+  <credits> batches not acknowledged in flight
+- the receiver acknowledges a batch once saved in the sync importer queue
+  (JSON {'ack': <seq>, 'credits': 1}). The acknowledgement is delayed while
+  the importer queue is full: the sender runs out of credits.
+
+A batch is removed from the sync queues on acknowledgement only, the batches
+not acknowledged are resent on the next connection.
+
+The sync queues and spilled segments (Redis and files) are read and written
+outside of the event loop (executor).
+"""
+
+import asyncio
+import json
+import os
+import sys
+import zlib
+
+sys.path.append(os.environ['AIL_BIN'])
+##################################
+# Import Project packages
+##################################
+from core import ail_2_ail
+
+def encode_batch(seq, ail_streams):
+    return zlib.compress(json.dumps({'seq': seq, 'objs': ail_streams}).encode())
+
+def decode_batch(frame):
+    batch = json.loads(zlib.decompress(frame))
+    return batch['seq'], batch['objs']
+
+class SyncBatchSender(object):
+    """
+    Send the sync queues of an AIL instance
+
+    :param push: push or pull sync queues
+    """
+
+    def __init__(self, websocket, ail_uuid, push=True, batch_size=ail_2_ail.SYNC_BATCH_SIZE):
+        self.websocket = websocket
+        self.ail_uuid = ail_uuid
+        self.push = push
+        self.batch_size = batch_size
+
+        self.credits = 0
+        self.in_flight = set()
+        self.event = asyncio.Event()
+        self.ack_task = None
+
+    async def _recv_acks(self):
+        loop = asyncio.get_event_loop()
+        async for message in self.websocket:
+            message = json.loads(message)
+            seq = message.get('ack')
+            if seq is not None:
+                await loop.run_in_executor(None, ail_2_ail.ack_sync_queue_batch, self.ail_uuid, seq, self.push)
+                self.in_flight.discard(seq)
+            self.credits += int(message.get('credits', 0))
+            self.event.set()
+
+    async def _wait(self, timeout):
+        """
+        Wait for an acknowledgement or credits
+
+        :return: False if the connection is closed
+        """
+        self.event.clear()
+        waiter = asyncio.ensure_future(self.event.wait())
+        await asyncio.wait({waiter, self.ack_task}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        waiter.cancel()
+        if self.ack_task.done():
+            # raise connection errors
+            self.ack_task.result()
+            return False
+        return True
+
+    async def run(self, keep_alive=False):
+        """
+        :param keep_alive: wait for new objects, else return when the sync
+                           queues are empty and all the batches acknowledged
+        """
+        loop = asyncio.get_event_loop()
+        # resend the batches not acknowledged by the previous connection
+        await loop.run_in_executor(None, ail_2_ail.requeue_sync_queue_pending, self.ail_uuid, self.push)
+
+        self.ack_task = asyncio.ensure_future(self._recv_acks())
+        try:
+            while True:
+                if self.credits <= 0:
+                    if not await self._wait(None):
+                        return
+                    continue
+
+                # sync queues + spilled segments
+                seq, objs = await loop.run_in_executor(None, ail_2_ail.get_sync_queue_batch,
+                                                       self.ail_uuid, self.push, self.batch_size)
+                if not objs:
+                    if not keep_alive and not self.in_flight:
+                        return
+                    if not await self._wait(1 if self.in_flight else 10):
+                        return
+                    continue
+
+                # read the objects content outside of the event loop
+                ail_streams = await loop.run_in_executor(None, ail_2_ail.create_ail_streams_batch, objs)
+                self.in_flight.add(seq)
+                self.credits -= 1
+                await self.websocket.send(encode_batch(seq, ail_streams))
+        finally:
+            self.ack_task.cancel()
+
+async def send_batches(websocket, ail_uuid, push=True, keep_alive=False):
+    sender = SyncBatchSender(websocket, ail_uuid, push=push)
+    await sender.run(keep_alive=keep_alive)
+
+async def receive_batches(websocket, credits=ail_2_ail.SYNC_BATCH_CREDITS,
+                          importer_max_size=ail_2_ail.SYNC_IMPORTER_MAX_SIZE):
+    """
+    Receive the batches and save them in the sync importer queue
+    """
+    loop = asyncio.get_event_loop()
+    await websocket.send(json.dumps({'credits': credits}))
+    async for frame in websocket:
+        seq, ail_streams = decode_batch(frame)
+        await loop.run_in_executor(None, ail_2_ail.add_ail_streams_to_sync_importer, ail_streams)
+
+        # backpressure: importer queue full, delay the acknowledgement
+        while await loop.run_in_executor(None, ail_2_ail.get_sync_importer_queue_size) > importer_max_size:
+            await asyncio.sleep(1)
+        await websocket.send(json.dumps({'ack': seq, 'credits': 1}))
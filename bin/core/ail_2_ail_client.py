@@ -20,6 +20,7 @@ sys.path.append(os.environ['AIL_BIN'])
 # Import Project packages
 ##################################
 from core import ail_2_ail
+from core import ail_2_ail_batch
 from lib.ConfigLoader import ConfigLoader
 
 config_loader = ConfigLoader()
@@ -105,8 +106,13 @@ async def ail_to_ail_client(ail_uuid, sync_mode, api, ail_key=None, client_id=No
     ail_url = ail_2_ail.get_ail_instance_url(ail_uuid)
     local_ail_uuid = ail_2_ail.get_ail_uuid()
 
+    batch = False
     if sync_mode == 'api':
         uri = f"{ail_url}/{sync_mode}/{api}/{local_ail_uuid}"
+    # batch protocol
+    elif ail_2_ail.is_ail_server_sync_batch(ail_uuid):
+        batch = True
+        uri = f"{ail_url}/{sync_mode}/batch/{local_ail_uuid}"
     else:
         uri = f"{ail_url}/{sync_mode}/{local_ail_uuid}"
     #print(uri)
@@ -126,10 +132,16 @@ async def ail_to_ail_client(ail_uuid, sync_mode, api, ail_key=None, client_id=No
             ail_2_ail.clear_save_ail_server_error(ail_uuid)
 
             if sync_mode == 'pull':
-                await pull(websocket, ail_uuid)
+                if batch:
+                    await ail_2_ail_batch.receive_batches(websocket)
+                else:
+                    await pull(websocket, ail_uuid)
 
             elif sync_mode == 'push':
-                await push(websocket, ail_uuid)
+                if batch:
+                    await ail_2_ail_batch.send_batches(websocket, ail_uuid, push=True, keep_alive=True)
+                else:
+                    await push(websocket, ail_uuid)
                 await websocket.close()
 
             elif sync_mode == 'api':
@@ -17,6 +17,7 @@ sys.path.append(os.environ['AIL_BIN'])
 ##################################
 from pubsublogger import publisher
 from core import ail_2_ail
+from core import ail_2_ail_batch
 from lib.ConfigLoader import ConfigLoader
 
 config_loader = ConfigLoader()
@@ -183,6 +184,8 @@ async def ail_to_ail_serv(websocket, path):
     remote_address = websocket.remote_address
     path = unpack_path(path)
     sync_mode = path['sync_mode']
+    # batch protocol: /<sync mode>/batch/<ail uuid>
+    batch = 'batch' in path['api']
 
     # # TODO: check if it works
     # # DEBUG:
@@ -193,13 +196,19 @@ async def ail_to_ail_serv(websocket, path):
     await register(websocket)
     try:
         if sync_mode == 'pull':
-            await pull(websocket, websocket.ail_uuid)
+            if batch:
+                await ail_2_ail_batch.send_batches(websocket, websocket.ail_uuid, push=False)
+            else:
+                await pull(websocket, websocket.ail_uuid)
             await websocket.close()
             redis_logger.info(f'Connection closed: {ail_uuid} {remote_address}')
             print(f'Connection closed: {ail_uuid} {remote_address}')
 
         elif sync_mode == 'push':
-            await push(websocket, websocket.ail_uuid)
+            if batch:
+                await ail_2_ail_batch.receive_batches(websocket)
+            else:
+                await push(websocket, websocket.ail_uuid)
 
         elif sync_mode == 'api':
             await api(websocket, websocket.ail_uuid, path['api'])
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*-coding:UTF-8 -*
+
+"""
+Benchmark: Duplicates brute-force comparison vs similarity index
+================================================================
+
+Fill an empty ARDB db with the ssdeep/tlsh hashes of generated items (with
+near-duplicates), then compare the Duplicates brute-force loop (compare
+with all HASHS_<hash_type>) to the similarity index candidates search.
+
+The keys created by the benchmark are deleted at the end.
+
+Usage: benchmark_duplicates.py -d <empty ARDB db> [-n 5000] [-q 200]
+"""
+
+import argparse
+import os
+import random
+import redis
+import string
+import sys
+import time
+
+import ssdeep
+import tlsh
+
+sys.path.append(os.environ['AIL_BIN'])
+##################################
+# Import Project packages
+##################################
+from lib.ConfigLoader import ConfigLoader
+from lib.similarity_index import SimilarityIndex
+
+THRESHOLDS = {'ssdeep': 50, 'tlsh': 52}
+
+def generate_item(base=None):
+    if base:
+        # near-duplicate: replace some lines
+        lines = base.splitlines()
+        for _ in range(max(len(lines) // 10, 1)):
+            lines[random.randrange(len(lines))] = ''.join(random.choices(string.ascii_letters, k=60))
+        return '\n'.join(lines)
+    lines = []
+    for _ in range(random.randint(50, 300)):
+        lines.append(' '.join(''.join(random.choices(string.ascii_lowercase, k=random.randint(2, 10))) for _ in range(8)))
+    return '\n'.join(lines)
+
+def get_hashs(content):
+    content = content.encode()
+    return {'ssdeep': ssdeep.hash(content), 'tlsh': tlsh.hash(content)}
+
+def is_similar(hash_type, hash1, hash2):
+    try:
+        if hash_type == 'ssdeep':
+            return 100 - ssdeep.compare(hash1, hash2) < THRESHOLDS['ssdeep']
+        else:
+            return min(tlsh.diffxlen(hash1, hash2), 100) < THRESHOLDS['tlsh']
+    except Exception:
+        return False
+
+def brute_force(r_serv, hash_type, paste_hash):
+    return {h for h in r_serv.smembers(f'HASHS_{hash_type}') if is_similar(hash_type, h, paste_hash)}
+
+def indexed(sim_index, hash_type, paste_hash):
+    return {h for h in sim_index.get_candidates(hash_type, paste_hash) if is_similar(hash_type, h, paste_hash)}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Duplicates benchmark: brute-force vs similarity index')
+    parser.add_argument('-d', '--db', type=int, required=True, help='empty ARDB db used by the benchmark')
+    parser.add_argument('-n', '--nb_items', type=int, default=5000, help='number of stored items')
+    parser.add_argument('-q', '--nb_queries', type=int, default=200, help='number of queries')
+    args = parser.parse_args()
+
+    config_loader = ConfigLoader()
+    r_serv = redis.StrictRedis(host=config_loader.get_config_str('ARDB_DB', 'host'),
+                               port=config_loader.get_config_int('ARDB_DB', 'port'),
+                               db=args.db,
+                               decode_responses=True)
+    if r_serv.exists('HASHS_ssdeep') or r_serv.exists('HASHS_tlsh'):
+        print(f'ERROR: db {args.db} is not empty')
+        sys.exit(1)
+    sim_index = SimilarityIndex(r_serv)
+
+    print(f'Generating {args.nb_items} items ...')
+    items = []
+    for i in range(args.nb_items):
+        base = random.choice(items) if items and random.random() < 0.2 else None
+        items.append(generate_item(base))
+
+    start = time.time()
+    for content in items:
+        for hash_type, paste_hash in get_hashs(content).items():
+            if paste_hash and paste_hash != 'TNULL':
+                r_serv.sadd(f'HASHS_{hash_type}', paste_hash)
+                sim_index.add(hash_type, paste_hash)
+    print(f'Insert (hashs + index): {time.time() - start:.2f}s')
+
+    queries = [get_hashs(generate_item(random.choice(items))) for _ in range(args.nb_queries)]
+
+    results = {}
+    for name, search in (('brute-force', lambda t, h: brute_force(r_serv, t, h)),
+                         ('index', lambda t, h: indexed(sim_index, t, h))):
+        start = time.time()
+        results[name] = []
+        for paste_hashes in queries:
+            for hash_type, paste_hash in paste_hashes.items():
+                results[name].append(search(hash_type, paste_hash))
+        duration = time.time() - start
+        print(f'{name}: {duration:.2f}s, {duration * 1000 / args.nb_queries:.2f}ms by item')
+
+    nb_found = sum(len(res) for res in results['brute-force'])
+    nb_index = sum(len(res & bf) for res, bf in zip(results['index'], results['brute-force']))
+    if nb_found:
+        print(f'index recall: {nb_index}/{nb_found} ({nb_index * 100 / nb_found:.1f}%)')
+
+    # cleanup
+    sim_index.drop()
+    r_serv.delete('HASHS_ssdeep', 'HASHS_tlsh')
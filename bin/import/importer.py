@@ -7,6 +7,8 @@ The JSON Receiver Module
 Recieve Json Items (example: Twitter feeder)
 
 """
+import base64
+import binascii
 import os
 import importlib
 import json
@@ -14,8 +16,12 @@ import redis
 import sys
 import time
 
+sys.path.append(os.environ['AIL_BIN'])
+from lib.exceptions import InvalidGzipError
+
 sys.path.append(os.path.join(os.environ['AIL_BIN'], 'lib/'))
 import ConfigLoader
+import item_basic
 
 # Import all receiver
 #from all_json_receiver import *
@@ -83,17 +89,35 @@ def get_json_source(json_item):
 
 def process_json(importer_obj, process):
     item_id = importer_obj.get_item_id()
+    relay_message = get_item_relay_message(item_id, importer_obj.get_item_gzip64encoded_content())
+    if not relay_message:
+        return
+    # local ingest: the item can be saved with another id (filename used by another content)
+    item_id = relay_message.split(' ', 1)[0]
     if 'meta' in importer_obj.get_json_file():
         importer_obj.process_json_meta(process, item_id)
 
     # send data to queue
-    send_item_to_ail_queue(item_id, importer_obj.get_item_gzip64encoded_content(), importer_obj.get_feeder_name(), process)
-
-def send_item_to_ail_queue(item_id, gzip64encoded_content, feeder_name, process):
+    send_item_to_ail_queue(relay_message, importer_obj.get_feeder_name(), process)
+
+def get_item_relay_message(item_id, gzip64encoded_content):
+    """
+    :return: message of the item, None if invalid or duplicate (local ingest)
+    """
+    if item_basic.LOCAL_INGEST:
+        try:
+            payload = base64.standard_b64decode(gzip64encoded_content)
+            return item_basic.get_ingest_message(item_id, payload)
+        except (binascii.Error, InvalidGzipError) as e:
+            print(f'Invalid item: {item_id}, {e}')
+            return None
+    else:
+        return "{0} {1}".format(item_id, gzip64encoded_content)
+
+def send_item_to_ail_queue(relay_message, feeder_name, process):
     # Send item to queue
     # send paste to Global
-    relay_message = "{0} {1}".format(item_id, gzip64encoded_content)
-    process.populate_set_out(relay_message, 'Mixer')
+    item_basic.send_ingest_message(process, relay_message)
 
     # increase nb of paste by feeder name
     server_cache.hincrby("mixer_cache:list_feeder", feeder_name, 1)
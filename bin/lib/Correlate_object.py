@@ -10,6 +10,7 @@ from flask import url_for
 
 sys.path.append(os.path.join(os.environ['AIL_BIN'], 'lib/'))
 import ConfigLoader
+import correlation_graph
 import Decoded
 import Domain
 import Screenshot
@@ -25,6 +26,9 @@ r_serv_metadata = config_loader.get_redis_conn("ARDB_Metadata")
 baseurl = config_loader.get_config_str("Notifications", "ail_domain")
 config_loader = None
 
+# graph: correlations with a subtype
+GRAPH_CORRELATIONS = {'pgp': Pgp.pgp, 'cryptocurrency': Cryptocurrency.cryptocurrency, 'username': Username.correlation}
+
 def is_valid_object_type(object_type):
     return object_type in [
         'domain',
@@ -322,101 +326,25 @@ def create_node_id(correlation_name, value, correlation_type=''):
 
 # # TODO: filter by correlation type => bitcoin, mail, ...
 def get_graph_node_object_correlation(object_type, root_value, mode, correlation_names, correlation_objects, max_nodes=300, requested_correl_type=None, flask_context=True):
-    links = set()
+    if not correlation_names:
+        correlation_names = get_all_correlation_names()
+    if not correlation_objects:
+        correlation_objects = get_all_correlation_objects()
+
+    root = correlation_graph.get_node(object_type, requested_correl_type, root_value)
+    cache_key = correlation_graph.get_graph_cache_key(root, mode, correlation_names, correlation_objects, max_nodes, flask_context)
+    if graph := correlation_graph.get_cached_graph(cache_key):
+        return graph
+
+    nodes, links = correlation_graph.get_correlation_graph(root, mode, correlation_names, correlation_objects,
+                                                           GRAPH_CORRELATIONS, max_nodes=max_nodes)
     root_node_id = create_node_id(object_type, root_value, requested_correl_type)
-    nodes = {root_node_id}
-    root_correlation = get_object_correlation(object_type, root_value, correlation_names, correlation_objects, requested_correl_type=requested_correl_type)
-    for correl in root_correlation:
-        if correl in ('pgp', 'cryptocurrency', 'username'):
-            for correl_type in root_correlation[correl]:
-                for correl_val in root_correlation[correl][correl_type]:
-
-                    # add correlation
-                    correl_node_id = create_node_id(correl, correl_val, correl_type)
-
-                    if mode=="union":
-                        if len(nodes) > max_nodes:
-                            break
-                        nodes.add(correl_node_id)
-                        links.add((root_node_id, correl_node_id))
-
-                    if res := get_object_correlation(
-                        correl,
-                        correl_val,
-                        correlation_names,
-                        correlation_objects,
-                        requested_correl_type=correl_type,
-                    ):
-                        for corr_obj in res:
-                            for correl_key_val in res[corr_obj]:
-                                #filter root value
-                                if correl_key_val == root_value:
-                                    continue
-
-                                if len(nodes) > max_nodes:
-                                    break
-                                new_corel_1 = create_node_id(corr_obj, correl_key_val)
-                                new_corel_2 = create_node_id(correl, correl_val, correl_type)
-                                nodes.add(new_corel_1)
-                                nodes.add(new_corel_2)
-                                links.add((new_corel_1, new_corel_2))
-
-                                if mode=="inter":
-                                    nodes.add(correl_node_id)
-                                    links.add((root_node_id, correl_node_id))
-        if correl in ('decoded', 'screenshot', 'domain', 'paste'):
-            for correl_val in root_correlation[correl]:
-
-                correl_node_id = create_node_id(correl, correl_val)
-                if mode=="union":
-                    if len(nodes) > max_nodes:
-                        break
-                    nodes.add(correl_node_id)
-                    links.add((root_node_id, correl_node_id))
-
-                if res := get_object_correlation(
-                    correl, correl_val, correlation_names, correlation_objects
-                ):
-                    for corr_obj in res:
-                        if corr_obj in ('decoded', 'domain', 'paste', 'screenshot'):
-                            for correl_key_val in res[corr_obj]:
-                                #filter root value
-                                if correl_key_val == root_value:
-                                    continue
-
-                                if len(nodes) > max_nodes:
-                                    break
-                                new_corel_1 = create_node_id(corr_obj, correl_key_val)
-                                new_corel_2 = create_node_id(correl, correl_val)
-                                nodes.add(new_corel_1)
-                                nodes.add(new_corel_2)
-                                links.add((new_corel_1, new_corel_2))
-
-                                if mode=="inter":
-                                    nodes.add(correl_node_id)
-                                    links.add((root_node_id, correl_node_id))
-
-                        if corr_obj in ('pgp', 'cryptocurrency', 'username'):
-                            for correl_key_type in res[corr_obj]:
-                                for correl_key_val in res[corr_obj][correl_key_type]:
-                                    #filter root value
-                                    if correl_key_val == root_value:
-                                        continue
-
-                                    if len(nodes) > max_nodes:
-                                        break
-                                    new_corel_1 = create_node_id(corr_obj, correl_key_val, correl_key_type)
-                                    new_corel_2 = create_node_id(correl, correl_val)
-                                    nodes.add(new_corel_1)
-                                    nodes.add(new_corel_2)
-                                    links.add((new_corel_1, new_corel_2))
-
-                                    if mode=="inter":
-                                        nodes.add(correl_node_id)
-                                        links.add((root_node_id, correl_node_id))
-
-
-    return {"nodes": create_graph_nodes(nodes, root_node_id, flask_context=flask_context), "links": create_graph_links(links)}
+    nodes_id = {node: create_node_id(node[0], node[2], node[1]) for node in nodes}
+    nodes_id[root] = root_node_id
+    graph = {"nodes": create_graph_nodes(nodes_id.values(), root_node_id, flask_context=flask_context),
+             "links": create_graph_links((nodes_id[node1], nodes_id[node2]) for node1, node2 in links)}
+    correlation_graph.save_cached_graph(cache_key, graph, nodes)
+    return graph
 
 
 def get_obj_global_id(obj_type, obj_id, obj_sub_type=None):
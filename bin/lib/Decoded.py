@@ -17,6 +17,7 @@ sys.path.append(os.path.join(os.environ['AIL_BIN'], 'lib'))
 
 
 import ConfigLoader
+import correlation_graph
 
 config_loader = ConfigLoader.ConfigLoader()
 r_serv_metadata = config_loader.get_redis_conn("ARDB_Metadata")
@@ -236,6 +237,7 @@ def save_item_relationship(sha1_string, item_id):
         print('error, unknow sha1_string')
 
     item_date = Item.get_item_date(item_id)
+    correlation_graph.delete_graph_cache([('decoded', None, sha1_string), ('item', None, item_id)])
 
     r_serv_metadata.zincrby(f'hash_date:{item_date}', sha1_string, 1)
 
@@ -259,6 +261,7 @@ def save_item_relationship(sha1_string, item_id):
 
 def delete_item_relationship(sha1_string, item_id):
     item_date = Item.get_item_date(item_id)
+    correlation_graph.delete_graph_cache([('decoded', None, sha1_string), ('item', None, item_id)])
 
     #update_decoded_daterange(sha1_string, item_date) 3 # TODO:
     r_serv_metadata.srem(f'hash_paste:{item_id}', sha1_string)
@@ -282,10 +285,12 @@ def delete_item_relationship(sha1_string, item_id):
         r_serv_metadata.zrem(f'nb_seen_hash:{sha1_string}', item_id)
 
 def save_domain_relationship(domain, sha1_string):
+    correlation_graph.delete_graph_cache([('decoded', None, sha1_string), ('domain', None, domain)])
     r_serv_metadata.sadd(f'hash_domain:{domain}', sha1_string)
     r_serv_metadata.sadd(f'domain_hash:{sha1_string}', domain)
 
 def delete_domain_relationship(domain, sha1_string):
+    correlation_graph.delete_graph_cache([('decoded', None, sha1_string), ('domain', None, domain)])
     r_serv_metadata.srem(f'hash_domain:{domain}', sha1_string)
     r_serv_metadata.srem(f'domain_hash:{sha1_string}', domain)
 
@@ -361,6 +366,107 @@ def save_decoded_file_content(sha1_string, file_content, date_from, date_to=None
 
     return True
 
+def _get_new_daterange(first_seen, last_seen, date):
+    date_str = f'{date[:4]}/{date[4:6]}/{date[6:8]}'
+    if not first_seen:
+        return date_str, date_str
+    if int(date) < int(first_seen.replace('/', '')):
+        first_seen = date_str
+    if int(date) > int(last_seen.replace('/', '')):
+        last_seen = date_str
+    return first_seen, last_seen
+
+def save_item_decoded(item_id, decoded_list):
+    '''
+    Save the files decoded in an item and their metadata, same as
+    save_decoded_file_content + save_item_relationship + create_decoder_matadata
+    for each decoded file, but the metadata are read and written in two pipelines.
+
+    :param decoded_list: list of (sha1_string, decoder_type, mimetype, file_content)
+    '''
+    item_date = Item.get_item_date(item_id)
+    sha1_list = list(dict.fromkeys(decoded[0] for decoded in decoded_list))
+
+    pipe = r_serv_metadata.pipeline(transaction=False)
+    for sha1_string in sha1_list:
+        pipe.hmget(f'metadata_hash:{sha1_string}', 'estimated_type', 'first_seen', 'last_seen')
+        pipe.zscore(f'nb_seen_hash:{sha1_string}', item_id)
+    decoder_hash = list(dict.fromkeys((sanitize_decoder_name(decoded[1]), decoded[0]) for decoded in decoded_list))
+    for decoder_type, sha1_string in decoder_hash:
+        pipe.zscore(f'{decoder_type}_hash:{sha1_string}', item_id)
+    res = pipe.execute()
+
+    # sha1_string: [estimated_type, first_seen, last_seen]
+    metadata = {}
+    seen_in_item = set()
+    for i, sha1_string in enumerate(sha1_list):
+        metadata[sha1_string] = res[i * 2]
+        if res[i * 2 + 1] is not None:
+            seen_in_item.add(sha1_string)
+    res = res[len(sha1_list) * 2:]
+    decoder_seen_in_item = {decoder_hash[i] for i in range(len(decoder_hash)) if res[i] is not None}
+
+    if Item.is_crawled(item_id):
+        domain = Item.get_item_domain(item_id)
+    else:
+        domain = None
+
+    graph_objs = [('item', None, item_id)] + [('decoded', None, sha1_string) for sha1_string in sha1_list]
+    if domain:
+        graph_objs.append(('domain', None, domain))
+    correlation_graph.delete_graph_cache(graph_objs)
+
+    pipe = r_serv_metadata.pipeline(transaction=False)
+    for sha1_string, decoder_type, mimetype, file_content in decoded_list:
+        decoder_type = sanitize_decoder_name(decoder_type)
+        estimated_type, first_seen, last_seen = metadata[sha1_string]
+
+        # save_decoded_file_content
+        filepath = get_decoded_filepath(sha1_string, mimetype=mimetype)
+        if not os.path.isfile(filepath):
+            dirname = os.path.dirname(filepath)
+            if not os.path.exists(dirname):
+                os.makedirs(dirname)
+            with open(filepath, 'wb') as f:
+                f.write(file_content)
+            pipe.hset(f'metadata_hash:{sha1_string}', 'size', len(file_content))
+            pipe.hset(f'metadata_hash:{sha1_string}', 'estimated_type', mimetype)
+            pipe.sadd('hash_all_type', mimetype)
+            estimated_type = mimetype
+        if not estimated_type:
+            print('error, unknow sha1_string')
+
+        # save_item_relationship
+        pipe.zincrby(f'hash_date:{item_date}', sha1_string, 1)
+        new_first_seen, new_last_seen = _get_new_daterange(first_seen, last_seen, item_date)
+        if new_first_seen != first_seen:
+            pipe.hset(f'metadata_hash:{sha1_string}', 'first_seen', new_first_seen)
+        if new_last_seen != last_seen:
+            pipe.hset(f'metadata_hash:{sha1_string}', 'last_seen', new_last_seen)
+        metadata[sha1_string] = [estimated_type, new_first_seen, new_last_seen]
+
+        # first time we see this hash (all encoding) on this item
+        if sha1_string not in seen_in_item:
+            pipe.hincrby(f'metadata_hash:{sha1_string}', 'nb_seen_in_all_pastes', 1)
+            seen_in_item.add(sha1_string)
+        pipe.zincrby(f'nb_seen_hash:{sha1_string}', item_id, 1)
+        pipe.sadd(f'hash_paste:{item_id}', sha1_string)
+        if domain:
+            pipe.sadd(f'hash_domain:{domain}', sha1_string)
+            pipe.sadd(f'domain_hash:{sha1_string}', domain)
+
+        # create_decoder_matadata
+        pipe.incrby(f'{decoder_type}_decoded:{item_date}', 1)
+        pipe.zincrby(f'{decoder_type}_date:{item_date}', sha1_string, 1)
+        # first time we see this hash encoding on this item
+        if (decoder_type, sha1_string) not in decoder_seen_in_item:
+            pipe.sadd(f'hash_{decoder_type}_all_type', estimated_type)
+            decoder_seen_in_item.add((decoder_type, sha1_string))
+        pipe.hincrby(f'metadata_hash:{sha1_string}', f'{decoder_type}_decoder', 1)
+        pipe.zincrby(f'{decoder_type}_type:{estimated_type}', item_date, 1)
+        pipe.zincrby(f'{decoder_type}_hash:{sha1_string}', item_id, 1)
+    pipe.execute()
+
 def delete_decoded_file(obj_id):
     filepath = get_decoded_filepath(obj_id)
     if not os.path.isfile(filepath):
@@ -421,3 +527,6 @@ def delete_decoded(obj_id):
     ###
 
     r_serv_metadata.delete(f'metadata_hash:{obj_id}')
+
+    # cached graphs containing this decoded
+    correlation_graph.delete_graph_cache([('decoded', None, obj_id)])
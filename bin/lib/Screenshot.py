@@ -1,12 +1,10 @@
 #!/usr/bin/env python3
 # -*-coding:UTF-8 -*
 
-import base64
 import os
 import sys
 import redis
 
-from hashlib import sha256
 from io import BytesIO
 
 sys.path.append(os.path.join(os.environ['AIL_BIN'], 'packages'))
@@ -16,6 +14,8 @@ import Tag
 
 import Correlate_object
 import ConfigLoader
+import correlation_graph
+import crawler_artifacts
 
 config_loader = ConfigLoader.ConfigLoader()
 r_serv_onion = config_loader.get_redis_conn("ARDB_Onion")
@@ -23,6 +23,9 @@ r_serv_metadata = config_loader.get_redis_conn("ARDB_Metadata")
 SCREENSHOT_FOLDER = config_loader.get_files_directory('screenshot')
 config_loader = None
 
+# max perceptual hash distance of two similar screenshots
+PHASH_MAX_DISTANCE = 3
+
 # get screenshot relative path
 def get_screenshot_rel_path(sha256_string, add_extension=False):
     screenshot_path = os.path.join(
@@ -129,6 +132,7 @@ def get_screenshot_correlated_object(sha256_string, correlation_objects=[]):
     return decoded_correlation
 
 def save_item_relationship(obj_id, item_id):
+    correlation_graph.delete_graph_cache([('screenshot', None, obj_id), ('item', None, item_id)])
     r_serv_metadata.hset(f'paste_metadata:{item_id}', 'screenshot', obj_id)
     r_serv_onion.sadd(f'screenshot:{obj_id}', item_id)
     if Item.is_crawled(item_id):
@@ -136,14 +140,17 @@ def save_item_relationship(obj_id, item_id):
         save_domain_relationship(obj_id, domain)
 
 def delete_item_relationship(obj_id, item_id):
+    correlation_graph.delete_graph_cache([('screenshot', None, obj_id), ('item', None, item_id)])
     r_serv_metadata.hdel(f'paste_metadata:{item_id}', 'screenshot', obj_id)
     r_serv_onion.srem(f'screenshot:{obj_id}', item_id)
 
 def save_domain_relationship(obj_id, domain):
+    correlation_graph.delete_graph_cache([('screenshot', None, obj_id), ('domain', None, domain)])
     r_serv_onion.sadd(f'domain_screenshot:{domain}', obj_id)
     r_serv_onion.sadd(f'screenshot_domain:{obj_id}', domain)
 
 def delete_domain_relationship(obj_id, domain):
+    correlation_graph.delete_graph_cache([('screenshot', None, obj_id), ('domain', None, domain)])
     r_serv_onion.srem(f'domain_screenshot:{domain}', obj_id)
     r_serv_onion.sadd(f'screenshot_domain:{obj_id}', domain)
 
@@ -165,23 +172,96 @@ def get_screenshot_file_content(sha256_string):
         file_content = BytesIO(f.read())
     return file_content
 
+## Perceptual hash ##
+
+def get_screenshot_phash(sha256_string):
+    return r_serv_onion.hget('screenshot:phash', sha256_string)
+
+def get_screenshot_by_pixels_digest(pixels_digest):
+    return r_serv_onion.get(f'screenshot:pixels:{pixels_digest}')
+
+def add_screenshot_phash(sha256_string, phash, pixels_digest):
+    pipe = r_serv_onion.pipeline(transaction=False)
+    pipe.hset('screenshot:phash', sha256_string, phash)
+    pipe.hset('screenshot:pixels', sha256_string, pixels_digest)
+    pipe.set(f'screenshot:pixels:{pixels_digest}', sha256_string, nx=True)
+    pipe.sadd(f'screenshot:phash:{phash}', sha256_string)
+    for i, band in enumerate(crawler_artifacts.get_phash_bands(phash)):
+        pipe.sadd(f'screenshot:phash:band:{i}:{band}', phash)
+    pipe.execute()
+
+def delete_screenshot_phash(sha256_string):
+    phash = get_screenshot_phash(sha256_string)
+    if not phash:
+        return
+    pixels_digest = r_serv_onion.hget('screenshot:pixels', sha256_string)
+    pipe = r_serv_onion.pipeline(transaction=False)
+    pipe.hdel('screenshot:phash', sha256_string)
+    pipe.hdel('screenshot:pixels', sha256_string)
+    if pixels_digest and get_screenshot_by_pixels_digest(pixels_digest) == sha256_string:
+        pipe.delete(f'screenshot:pixels:{pixels_digest}')
+    pipe.srem(f'screenshot:phash:{phash}', sha256_string)
+    pipe.execute()
+    if not r_serv_onion.scard(f'screenshot:phash:{phash}'):
+        for i, band in enumerate(crawler_artifacts.get_phash_bands(phash)):
+            r_serv_onion.srem(f'screenshot:phash:band:{i}:{band}', phash)
+
+def get_similar_screenshots(sha256_string, max_distance=PHASH_MAX_DISTANCE):
+    '''
+    Get the screenshots visually similar to a screenshot
+
+    :return: list of (sha256, perceptual hash distance), sorted by distance
+    '''
+    phash = get_screenshot_phash(sha256_string)
+    if not phash:
+        return []
+    # candidates: same band
+    pipe = r_serv_onion.pipeline(transaction=False)
+    for i, band in enumerate(crawler_artifacts.get_phash_bands(phash)):
+        pipe.smembers(f'screenshot:phash:band:{i}:{band}')
+    candidates = [candidate for candidate in set().union(*pipe.execute())
+                  if crawler_artifacts.get_phash_distance(phash, candidate) <= max_distance]
+
+    pipe = r_serv_onion.pipeline(transaction=False)
+    for candidate in candidates:
+        pipe.smembers(f'screenshot:phash:{candidate}')
+    similar = []
+    for candidate, screenshots in zip(candidates, pipe.execute()):
+        distance = crawler_artifacts.get_phash_distance(phash, candidate)
+        similar.extend((screenshot, distance) for screenshot in screenshots if screenshot != sha256_string)
+    return sorted(similar, key=lambda x: x[1])
+
 # if force save, ignore max_size
 def save_crawled_screeshot(b64_screenshot, max_size, f_save=False):
+    '''
+    Save a crawled screenshot, a screenshot with the same pixels as a saved
+    screenshot (other PNG encoding) is not saved: the saved one is returned.
+    The perceptual hash only indexes the similar screenshots
+
+    :return: sha256 of the screenshot, False if too large
+    '''
     screenshot_size = (len(b64_screenshot)*3) /4
     if screenshot_size < max_size or f_save:
-        image_content = base64.standard_b64decode(b64_screenshot.encode())
-        sha256_string = sha256(image_content).hexdigest()
-        filepath = get_screenshot_filepath(sha256_string)
-        if os.path.isfile(filepath):
-            #print('File already exist')
+        tmp_filepath, sha256_string = crawler_artifacts.decode_base64_to_file(b64_screenshot, SCREENSHOT_FOLDER)
+        try:
+            if exist_screenshot(sha256_string):
+                #print('File already exist')
+                return sha256_string
+            phash, pixels_digest = crawler_artifacts.get_image_hashes(tmp_filepath)
+            if pixels_digest:
+                same_screenshot = get_screenshot_by_pixels_digest(pixels_digest)
+                if same_screenshot and exist_screenshot(same_screenshot):
+                    return same_screenshot
+            filepath = get_screenshot_filepath(sha256_string)
+            # create dir
+            os.makedirs(os.path.dirname(filepath), exist_ok=True)
+            os.replace(tmp_filepath, filepath)
+            if phash:
+                add_screenshot_phash(sha256_string, phash, pixels_digest)
             return sha256_string
-        # create dir
-        dirname = os.path.dirname(filepath)
-        if not os.path.exists(dirname):
-            os.makedirs(dirname)
-        with open(filepath, 'wb') as f:
-            f.write(image_content)
-        return sha256_string
+        finally:
+            if os.path.isfile(tmp_filepath):
+                os.remove(tmp_filepath)
     return False
 
 def save_screenshot_file(sha256_string, io_content):
@@ -204,6 +284,7 @@ def delete_screenshot_file(obj_id):
         return False
     Tag.delete_obj_tags(obj_id, 'image', Tag.get_obj_tag(obj_id))
     os.remove(filepath)
+    delete_screenshot_phash(obj_id)
     return True
 
 def create_screenshot(obj_id, obj_meta, io_content):
@@ -235,4 +316,7 @@ def delete_screenshot(obj_id):
             r_serv_metadata.hdel(f'paste_metadata:{item_id}', 'screenshot')
         r_serv_onion.delete(f'screenshot:{obj_id}', item_id)
 
+    # cached graphs containing this screenshot
+    correlation_graph.delete_graph_cache([('screenshot', None, obj_id)])
+
     return True
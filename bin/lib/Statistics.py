@@ -20,3 +20,31 @@ def incr_module_timeout_statistic(module_name):
         f'paste_by_modules_timeout:{module_name}',
         1,
     )
+
+def incr_mixer_feeders_statistics(processed_by_feeder, duplicated_by_feeder):
+    curr_date = datetime.date.today().strftime("%Y%m%d")
+    pipe = r_serv_statistics.pipeline(transaction=False)
+    for feeder_name, nb in processed_by_feeder.items():
+        if nb:
+            pipe.hincrby(curr_date, f'mixer_processed:{feeder_name}', nb)
+    for feeder_name, nb in duplicated_by_feeder.items():
+        if nb:
+            pipe.hincrby(curr_date, f'mixer_duplicated:{feeder_name}', nb)
+    pipe.execute()
+
+def get_mixer_feeders_statistics(date=None):
+    """
+    Get the number of items processed and duplicated by feeder
+
+    :return: dict, feeder_name: {'processed': int, 'duplicated': int}
+    """
+    if not date:
+        date = datetime.date.today().strftime("%Y%m%d")
+    feeders = {}
+    for field, nb in r_serv_statistics.hgetall(date).items():
+        if field.startswith('mixer_'):
+            stat_type, feeder_name = field[6:].split(':', 1)
+            if feeder_name not in feeders:
+                feeders[feeder_name] = {'processed': 0, 'duplicated': 0}
+            feeders[feeder_name][stat_type] = int(nb)
+    return feeders
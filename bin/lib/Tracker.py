@@ -34,6 +34,12 @@ r_serv_tracker = config_loader.get_redis_conn("ARDB_Tracker")
 items_dir = config_loader.get_config_str("Directories", "pastes")
 if items_dir[-1] == '/':
     items_dir = items_dir[:-1]
+if config_loader.has_option("Retro_Hunt", "max_workers"):
+    retro_hunt_max_workers = config_loader.get_config_int("Retro_Hunt", "max_workers")
+    retro_hunt_default_workers = config_loader.get_config_int("Retro_Hunt", "default_workers")
+else:
+    retro_hunt_max_workers = 4
+    retro_hunt_default_workers = 1
 config_loader = None
 
 email_regex = r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,6}'
@@ -819,6 +825,9 @@ def get_yara_rule_content_restapi(request_dict):
 #                                               timeout
 #                                               date
 #                                               type
+#                                               nb_workers
+
+## tracker:retro_hunt:task:shards:{task_uuid}   shard (source day dir) => last item analyzed or 'done'
 
 ## ? ? ?
 # set tags
@@ -901,6 +910,11 @@ def get_retro_hunt_task_timeout(task_uuid):
     else:
         return 30 # # TODO: FIXME use instance limit
 
+def get_retro_hunt_task_nb_workers(task_uuid):
+    res = r_serv_tracker.hget(f'tracker:retro_hunt:task:{task_uuid}', 'nb_workers')
+    nb_workers = int(res) if res else retro_hunt_default_workers
+    return max(1, min(nb_workers, retro_hunt_max_workers))
+
 def get_retro_hunt_task_date_from(task_uuid):
     return r_serv_tracker.hget(f'tracker:retro_hunt:task:{task_uuid}', 'date_from')
 
@@ -979,6 +993,61 @@ def set_cache_retro_hunt_task_id(task_uuid, id):
 def clear_retro_hunt_task_cache(task_uuid):
     r_cache.delete(f'tracker:retro_hunt:task:{task_uuid}')
 
+# Shards: one shard by source and day
+
+RETRO_HUNT_SHARD_DONE = 'done'
+
+def get_retro_hunt_task_shards(task_uuid, sources=[]):
+    '''
+    Get all the shards of a task (source day directories), sorted by date and source
+
+    :return: list of shards
+    '''
+    if not sources:
+        sources = get_retro_hunt_task_sources(task_uuid, r_sort=True)
+    shards = []
+    for date in Date.substract_date(get_retro_hunt_task_date_from(task_uuid), get_retro_hunt_task_date_to(task_uuid)):
+        date = f'{date[0:4]}/{date[4:6]}/{date[6:8]}'
+        for source in sources:
+            shards.append(os.path.join(source, date))
+    return shards
+
+def get_retro_hunt_shards_checkpoints(task_uuid):
+    '''
+    :return: dict, shard => last item analyzed or RETRO_HUNT_SHARD_DONE
+    '''
+    return r_serv_tracker.hgetall(f'tracker:retro_hunt:task:shards:{task_uuid}')
+
+def set_retro_hunt_shard_checkpoint(task_uuid, shard, last_id):
+    r_serv_tracker.hset(f'tracker:retro_hunt:task:shards:{task_uuid}', shard, last_id)
+
+def set_retro_hunt_shard_done(task_uuid, shard):
+    r_serv_tracker.hset(f'tracker:retro_hunt:task:shards:{task_uuid}', shard, RETRO_HUNT_SHARD_DONE)
+
+def delete_retro_hunt_shards_checkpoints(task_uuid):
+    r_serv_tracker.delete(f'tracker:retro_hunt:task:shards:{task_uuid}')
+
+def init_retro_hunt_shards_checkpoints(task_uuid, shards):
+    '''
+    Create the checkpoints of a task paused before the shards: the shards
+    before the last analyzed item are done
+    '''
+    if r_serv_tracker.exists(f'tracker:retro_hunt:task:shards:{task_uuid}'):
+        return None
+    last = get_retro_hunt_last_analyzed(task_uuid)
+    if not last:
+        return None
+    last_shard = os.path.dirname(last)
+    if last_shard not in shards:
+        return None
+    checkpoints = {}
+    for shard in shards:
+        if shard == last_shard:
+            checkpoints[shard] = last
+            break
+        checkpoints[shard] = RETRO_HUNT_SHARD_DONE
+    r_serv_tracker.hmset(f'tracker:retro_hunt:task:shards:{task_uuid}', checkpoints)
+
 # Others
 
 #                                               date
@@ -989,7 +1058,7 @@ def clear_retro_hunt_task_cache(task_uuid):
 # description
 
 # # # TODO: TYPE
-def create_retro_hunt_task(name, rule, date_from, date_to, creator, sources=[], tags=[], mails=[], timeout=30, description=None, task_uuid=None):
+def create_retro_hunt_task(name, rule, date_from, date_to, creator, sources=[], tags=[], mails=[], timeout=30, description=None, nb_workers=None, task_uuid=None):
     if not task_uuid:
         task_uuid = str(uuid.uuid4())
 
@@ -1006,6 +1075,8 @@ def create_retro_hunt_task(name, rule, date_from, date_to, creator, sources=[],
         r_serv_tracker.hset(f'tracker:retro_hunt:task:{task_uuid}', 'description', description)
     if timeout:
         r_serv_tracker.hset(f'tracker:retro_hunt:task:{task_uuid}', 'timeout', int(timeout))
+    if nb_workers:
+        r_serv_tracker.hset(f'tracker:retro_hunt:task:{task_uuid}', 'nb_workers', int(nb_workers))
     for source in sources:
         r_serv_tracker.sadd(f'tracker:retro_hunt:task:sources:{task_uuid}', escape(source))
     for tag in tags:
@@ -1029,6 +1100,7 @@ def delete_retro_hunt_task(task_uuid):
     r_serv_tracker.delete(f'tracker:retro_hunt:task:sources:{task_uuid}')
     r_serv_tracker.delete(f'tracker:retro_hunt:task:tags:{task_uuid}')
     r_serv_tracker.delete(f'tracker:retro_hunt:task:mails:{task_uuid}')
+    delete_retro_hunt_shards_checkpoints(task_uuid)
 
     for item_date in get_retro_hunt_all_item_dates(task_uuid):
         r_serv_tracker.delete(f'tracker:retro_hunt:task:item:{task_uuid}:{item_date}')
@@ -1112,6 +1184,13 @@ def get_items_to_analyze(dir, last=None):
         return []
 
 def compute_retro_hunt_task_progress(task_uuid, date_from=None, date_to=None, sources=[], curr_date=None, nb_src_done=0):
+    # shards checkpoints
+    if not curr_date:
+        if checkpoints := get_retro_hunt_shards_checkpoints(task_uuid):
+            nb_shards = len(get_retro_hunt_task_shards(task_uuid, sources=sources))
+            nb_shards_done = sum(1 for checkpoint in checkpoints.values() if checkpoint == RETRO_HUNT_SHARD_DONE)
+            return int(nb_shards_done * 100 / nb_shards) if nb_shards else 0
+
     # get nb days
     if not date_from:
         date_from = get_retro_hunt_task_date_from(task_uuid)
@@ -1301,6 +1380,15 @@ def api_create_retro_hunt_task(dict_input, creator):
     if res:
         return res
 
+    nb_workers = dict_input.get('nb_workers', None)
+    if nb_workers:
+        try:
+            nb_workers = int(nb_workers)
+        except (TypeError, ValueError):
+            return ({"status": "error", "reason": "Invalid number of workers"}, 400)
+        if not 1 <= nb_workers <= retro_hunt_max_workers:
+            return ({"status": "error", "reason": f"Invalid number of workers, max: {retro_hunt_max_workers}"}, 400)
+
     task_uuid = str(uuid.uuid4())
 
     # RULE
@@ -1308,7 +1396,8 @@ def api_create_retro_hunt_task(dict_input, creator):
     task_type = 'yara'
 
     task_uuid = create_retro_hunt_task(name, rule, date_from, date_to, creator, sources=sources,
-                                        tags=tags, mails=mails, timeout=30, description=description, task_uuid=task_uuid)
+                                        tags=tags, mails=mails, timeout=30, description=description,
+                                        nb_workers=nb_workers, task_uuid=task_uuid)
 
     return ({'name': name, 'rule': rule, 'type': task_type, 'uuid': task_uuid}, 200)
 
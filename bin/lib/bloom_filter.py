@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*-coding:UTF-8 -*
+
+"""
+Time windowed Bloom filter
+==========================
+
+Bloom filter split in generations: a new generation is started every
+window / (nb_generations - 1) seconds and the oldest one is dropped. A key
+added at time t is found until at least t + window, and re-adding a key
+extends its window (rolling window).
+
+No false negative in the window, false positives must be checked against the
+source of truth (ex: Redis).
+
+The filter can be saved to disk (checkpoint) and reloaded after a restart.
+"""
+
+import math
+import os
+import struct
+import time
+from hashlib import blake2b
+
+# magic, nb_bits, nb_hashs, period, nb_generations
+CHECKPOINT_HEADER = struct.Struct('<4sQIdI')
+CHECKPOINT_MAGIC = b'AILB'
+
+class TimeWindowBloomFilter(object):
+    """
+    :param capacity: number of keys added in a window
+    :param error_rate: false positive rate
+    :param window: window in seconds
+    """
+
+    def __init__(self, capacity, error_rate=0.001, window=86400, nb_generations=4):
+        self.nb_generations = max(nb_generations, 2)
+        self.period = window / (self.nb_generations - 1)
+        # a key is searched in all the generations
+        error_rate = error_rate / self.nb_generations
+        self.nb_bits = max(int(-capacity * math.log(error_rate) / (math.log(2) ** 2)), 8)
+        self.nb_hashs = max(int(round(self.nb_bits / capacity * math.log(2))), 1)
+        # list of [start time, bits], oldest first
+        self.generations = []
+        self._rotate(time.time())
+
+    def _new_generation(self, start):
+        return [start, bytearray(self.nb_bits // 8 + 1)]
+
+    def _rotate(self, now):
+        if not self.generations or now - self.generations[-1][0] >= self.period * self.nb_generations:
+            self.generations = [self._new_generation(now)]
+            return
+        while now - self.generations[-1][0] >= self.period:
+            self.generations.append(self._new_generation(self.generations[-1][0] + self.period))
+            if len(self.generations) > self.nb_generations:
+                self.generations.pop(0)
+
+    def _get_bits_index(self, key):
+        if isinstance(key, str):
+            key = key.encode()
+        digest = blake2b(key, digest_size=16).digest()
+        # double hashing
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.nb_bits for i in range(self.nb_hashs)]
+
+    def _add_index(self, bits_index):
+        bits = self.generations[-1][1]
+        for index in bits_index:
+            bits[index >> 3] |= 1 << (index & 7)
+
+    def _contains_index(self, bits_index):
+        for generation in self.generations:
+            bits = generation[1]
+            if all(bits[index >> 3] & (1 << (index & 7)) for index in bits_index):
+                return True
+        return False
+
+    def add(self, key):
+        self._rotate(time.time())
+        self._add_index(self._get_bits_index(key))
+
+    def __contains__(self, key):
+        self._rotate(time.time())
+        return self._contains_index(self._get_bits_index(key))
+
+    def check_and_add(self, key):
+        """
+        Add a key to the filter
+
+        :return: True if the key was possibly already added in the window
+        """
+        self._rotate(time.time())
+        bits_index = self._get_bits_index(key)
+        exists = self._contains_index(bits_index)
+        self._add_index(bits_index)
+        return exists
+
+    def save(self, filepath):
+        """
+        Checkpoint the filter to disk (atomic replace)
+        """
+        dirname = os.path.dirname(filepath)
+        if dirname and not os.path.exists(dirname):
+            os.makedirs(dirname)
+        tmp_filepath = f'{filepath}.tmp'
+        with open(tmp_filepath, 'wb') as f:
+            f.write(CHECKPOINT_HEADER.pack(CHECKPOINT_MAGIC, self.nb_bits, self.nb_hashs, self.period, len(self.generations)))
+            for start, bits in self.generations:
+                f.write(struct.pack('<d', start))
+                f.write(bits)
+        os.replace(tmp_filepath, filepath)
+
+    def load(self, filepath):
+        """
+        Load a checkpoint, the checkpoint is ignored if the filter settings changed
+
+        :return: True if the checkpoint is loaded
+        """
+        try:
+            with open(filepath, 'rb') as f:
+                magic, nb_bits, nb_hashs, period, nb_generations = CHECKPOINT_HEADER.unpack(f.read(CHECKPOINT_HEADER.size))
+                if (magic, nb_bits, nb_hashs, period) != (CHECKPOINT_MAGIC, self.nb_bits, self.nb_hashs, self.period):
+                    return False
+                generations = []
+                for _ in range(nb_generations):
+                    start = struct.unpack('<d', f.read(8))[0]
+                    bits = bytearray(f.read(self.nb_bits // 8 + 1))
+                    if len(bits) != self.nb_bits // 8 + 1:
+                        return False
+                    generations.append([start, bits])
+        except (OSError, struct.error):
+            return False
+        if not generations:
+            return False
+        self.generations = generations[-self.nb_generations:]
+        self._rotate(time.time())
+        return True
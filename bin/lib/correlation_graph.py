@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+# -*-coding:UTF-8 -*
+
+"""
+Correlation Graph
+=================
+
+Breadth-first expansion of the correlation graph of an object:
+
+- the graph is expanded level by level, the neighbours of all the nodes of a
+  level are fetched in one pipeline by database
+- max_nodes is a budget: the lookups are bounded by the number of nodes left
+  and no node is added once the budget is spent
+- the rendered graphs are cached, the cached graphs of a node are deleted
+  when a correlation of this node is saved or deleted
+
+A node is a tuple (object type, subtype, value), subtype = '' if the object
+has no subtype.
+"""
+
+import json
+import os
+import sys
+
+from hashlib import sha1
+
+sys.path.append(os.path.join(os.environ['AIL_BIN'], 'lib/'))
+import ConfigLoader
+
+config_loader = ConfigLoader.ConfigLoader()
+r_cache = config_loader.get_redis_conn("Redis_Cache")
+r_serv_metadata = config_loader.get_redis_conn("ARDB_Metadata")
+r_serv_onion = config_loader.get_redis_conn("ARDB_Onion")
+config_loader = None
+
+GRAPH_CACHE_TTL = 3600
+
+# object type/correlation name => node type
+NODE_TYPES = {'item': 'paste', 'image': 'screenshot', 'pgpdump': 'pgp'}
+
+def get_node(obj_type, subtype, value):
+    return NODE_TYPES.get(obj_type, obj_type), subtype or '', value
+
+## Neighbours ##
+
+def _queue_lookup(lookups, pipes, parent, db, cmd, key, node_type, node_subtype, limit):
+    pipe = pipes[db]
+    if cmd == 'set':
+        pipe.srandmember(key, limit)
+    elif cmd == 'zset':
+        pipe.zrange(key, 0, limit - 1)
+    # item screenshot
+    else:
+        pipe.hget(key, 'screenshot')
+    lookups.append((parent, db, node_type, node_subtype))
+
+def get_level_neighbours(frontier, correlation_names, correlation_objects, correlations, limit):
+    '''
+    Get the neighbours of all the nodes of a level, one pipeline by database.
+
+    :param frontier: list of nodes
+    :param correlations: dict, object type => Correlation (pgp, cryptocurrency, username)
+    :param limit: max number of neighbours by node and correlation
+
+    :return: dict, node => list of neighbours
+    :rtype: dict
+    '''
+    pipes = {'metadata': r_serv_metadata.pipeline(transaction=False),
+             'onion': r_serv_onion.pipeline(transaction=False)}
+    lookups = []
+    for node in frontier:
+        node_type, node_subtype, value = node
+        if node_type in ('domain', 'paste'):
+            prefix = 'domain' if node_type == 'domain' else 'item'
+            for correl in correlation_names:
+                if correl in correlations:
+                    correlation = correlations[correl]
+                    for correl_type in correlation.get_all_correlation_types():
+                        _queue_lookup(lookups, pipes, node, 'metadata', 'set',
+                                      f'{prefix}_{correlation.correlation_name}_{correl_type}:{value}',
+                                      correl, correl_type, limit)
+                elif correl == 'decoded':
+                    key = f'hash_domain:{value}' if node_type == 'domain' else f'hash_paste:{value}'
+                    _queue_lookup(lookups, pipes, node, 'metadata', 'set', key, 'decoded', '', limit)
+                elif correl == 'screenshot':
+                    if node_type == 'domain':
+                        _queue_lookup(lookups, pipes, node, 'onion', 'set', f'domain_screenshot:{value}',
+                                      'screenshot', '', limit)
+                    else:
+                        _queue_lookup(lookups, pipes, node, 'metadata', 'hget', f'paste_metadata:{value}',
+                                      'screenshot', '', limit)
+        else:
+            for correl in correlation_objects:
+                if node_type in correlations:
+                    correlation_name = correlations[node_type].correlation_name
+                    if correl == 'paste':
+                        key = f'set_{correlation_name}_{node_subtype}:{value}'
+                    elif correl == 'domain':
+                        key = f'set_domain_{correlation_name}_{node_subtype}:{value}'
+                    else:
+                        continue
+                    _queue_lookup(lookups, pipes, node, 'metadata', 'set', key, correl, '', limit)
+                elif node_type == 'decoded':
+                    if correl == 'paste':
+                        _queue_lookup(lookups, pipes, node, 'metadata', 'zset', f'nb_seen_hash:{value}',
+                                      correl, '', limit)
+                    elif correl == 'domain':
+                        _queue_lookup(lookups, pipes, node, 'metadata', 'set', f'domain_hash:{value}',
+                                      correl, '', limit)
+                elif node_type == 'screenshot':
+                    if correl == 'paste':
+                        key = f'screenshot:{value}'
+                    elif correl == 'domain':
+                        key = f'screenshot_domain:{value}'
+                    else:
+                        continue
+                    _queue_lookup(lookups, pipes, node, 'onion', 'set', key, correl, '', limit)
+
+    results = {db: iter(pipe.execute()) for db, pipe in pipes.items()}
+    neighbours = {node: [] for node in frontier}
+    for parent, db, node_type, node_subtype in lookups:
+        res = next(results[db])
+        if not res:
+            continue
+        if isinstance(res, str):
+            res = [res]
+        for value in res:
+            neighbours[parent].append((node_type, node_subtype, value))
+    return neighbours
+
+## Graph ##
+
+def get_correlation_graph(root, mode, correlation_names, correlation_objects, correlations, max_nodes=300, depth=2):
+    '''
+    Level-synchronous BFS of the correlation graph
+
+    :param root: root node
+    :param mode: union: all the nodes, inter: remove the first level nodes only linked to the root
+    :param max_nodes: max number of nodes
+    :param depth: number of levels
+
+    :return: set of nodes, set of links
+    :rtype: tuple
+    '''
+    root_value = root[2]
+    nodes = {root}
+    links = set()
+    levels = [[root]]
+    frontier = [root]
+    for _ in range(depth):
+        if not frontier or len(nodes) >= max_nodes:
+            break
+        # +1: the parent of a node is one of its neighbours
+        neighbours = get_level_neighbours(frontier, correlation_names, correlation_objects, correlations,
+                                          max_nodes - len(nodes) + 1)
+        next_frontier = []
+        for node in frontier:
+            for neighbour in neighbours[node]:
+                # filter root value
+                if neighbour[2] == root_value:
+                    continue
+                if neighbour not in nodes:
+                    if len(nodes) >= max_nodes:
+                        continue
+                    nodes.add(neighbour)
+                    next_frontier.append(neighbour)
+                if (neighbour, node) not in links:
+                    links.add((node, neighbour))
+        frontier = next_frontier
+        levels.append(frontier)
+
+    if mode == 'inter' and len(levels) > 1:
+        linked = set()
+        for node1, node2 in links:
+            if root not in (node1, node2):
+                linked.add(node1)
+                linked.add(node2)
+        for node in levels[1]:
+            if node not in linked:
+                nodes.discard(node)
+                links.discard((root, node))
+    return nodes, links
+
+## Cache ##
+
+def get_node_cache_index_key(node):
+    return 'correlation_graph:node:{};{};{}'.format(*node)
+
+def get_graph_cache_key(root, mode, correlation_names, correlation_objects, max_nodes, flask_context):
+    filters = json.dumps([list(root), mode, sorted(correlation_names), sorted(correlation_objects), max_nodes, flask_context])
+    return f'correlation_graph:{sha1(filters.encode()).hexdigest()}'
+
+def get_cached_graph(cache_key):
+    graph = r_cache.get(cache_key)
+    if graph:
+        return json.loads(graph)
+    return None
+
+def save_cached_graph(cache_key, graph, nodes):
+    '''
+    Cache a rendered graph, the cache key is indexed by node
+    '''
+    pipe = r_cache.pipeline(transaction=False)
+    pipe.setex(cache_key, GRAPH_CACHE_TTL, json.dumps(graph))
+    for node in nodes:
+        index_key = get_node_cache_index_key(node)
+        pipe.sadd(index_key, cache_key)
+        pipe.expire(index_key, GRAPH_CACHE_TTL)
+    pipe.execute()
+
+def delete_graph_cache(objs):
+    '''
+    Delete the cached graphs containing one of these objects
+
+    :param objs: list of (object type, subtype, value)
+    '''
+    index_keys = [get_node_cache_index_key(get_node(*obj)) for obj in objs]
+    pipe = r_cache.pipeline(transaction=False)
+    for index_key in index_keys:
+        pipe.smembers(index_key)
+    cache_keys = set().union(*pipe.execute())
+    if cache_keys:
+        r_cache.delete(*cache_keys, *index_keys)
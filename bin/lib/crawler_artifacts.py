@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+# -*-coding:UTF-8 -*
+
+"""
+Crawler Artifacts
+=================
+
+Files saved by the crawler for each crawled item:
+
+- HAR: gzip compressed JSON, <har directory>/<date>/<item>.json.gz, one HAR
+  entry by line. The response bodies larger than HAR_BODY_MIN_SIZE are saved
+  once in a content addressed store (<har directory>/bodies/, by sha256) and
+  replaced in the HAR by a reference: {'_ail_body': <sha256>}, a body
+  repeated across HARs (scripts, css, images) is stored once
+- screenshots: the base64 PNG is decoded by chunks in a temporary file. The
+  screenshots with the same pixels (same image, other PNG encoding) share the
+  same file. A perceptual hash (dHash, 64 bits) is computed to find the
+  similar screenshots, never to share files (see Screenshot)
+- reads: the HAR are read entry by entry, the HAR bodies are restored one by
+  one
+
+The HAR saved before (uncompressed <item>.json, compressed HAR in one line)
+are still read.
+"""
+
+import base64
+import gzip
+import json
+import os
+import sys
+
+from hashlib import sha256
+from uuid import uuid4
+
+from PIL import Image
+
+sys.path.append(os.path.join(os.environ['AIL_BIN'], 'lib/'))
+import ConfigLoader
+
+config_loader = ConfigLoader.ConfigLoader()
+HAR_FOLDER = config_loader.get_files_directory('har')
+HAR_FOLDER_REALPATH = os.path.join(os.path.realpath(HAR_FOLDER), '')
+CRAWLED_FOLDER_NAME = config_loader.get_config_str("Directories", "crawled")
+if config_loader.has_option("Crawler", "har_body_min_size"):
+    HAR_BODY_MIN_SIZE = config_loader.get_config_int("Crawler", "har_body_min_size")
+else:
+    HAR_BODY_MIN_SIZE = 1024
+config_loader = None
+
+CHUNK_SIZE = 64 * 1024
+# multiple of 4: base64 decoded by chunks
+B64_CHUNK_SIZE = 4 * 16 * 1024
+HAR_BODY_REF = '_ail_body'
+HAR_FOOTER = ']}}'
+
+def iter_file(filepath, chunk_size=CHUNK_SIZE):
+    with open(filepath, 'rb') as f:
+        while chunk := f.read(chunk_size):
+            yield chunk
+
+def _save_file(filepath, write_func):
+    """
+    Write a file atomically: temporary file + rename
+    """
+    dirname = os.path.dirname(filepath)
+    os.makedirs(dirname, exist_ok=True)
+    tmp_filepath = os.path.join(dirname, f'.{uuid4()}.tmp')
+    try:
+        write_func(tmp_filepath)
+        os.replace(tmp_filepath, filepath)
+    finally:
+        if os.path.isfile(tmp_filepath):
+            os.remove(tmp_filepath)
+
+## HAR ##
+
+def _get_har_rel_path(item_id):
+    # crawled/<date>/<item> => <date>/<item>
+    if item_id.startswith(f'{CRAWLED_FOLDER_NAME}/'):
+        item_id = item_id.replace(f'{CRAWLED_FOLDER_NAME}/', '', 1)
+    return item_id
+
+def get_har_filepath(item_id):
+    return os.path.realpath(f'{os.path.join(HAR_FOLDER, _get_har_rel_path(item_id))}.json.gz')
+
+def get_har_legacy_filepath(item_id):
+    return os.path.realpath(f'{os.path.join(HAR_FOLDER, _get_har_rel_path(item_id))}.json')
+
+def _is_valid_filepath(filepath):
+    # path traversal
+    return filepath.startswith(HAR_FOLDER_REALPATH)
+
+def exist_har(item_id):
+    return any(os.path.isfile(filepath) and _is_valid_filepath(filepath)
+               for filepath in (get_har_filepath(item_id), get_har_legacy_filepath(item_id)))
+
+def _get_body_filepath(body_sha256):
+    return os.path.join(HAR_FOLDER, 'bodies', body_sha256[:2], body_sha256[2:4], f'{body_sha256}.gz')
+
+def _save_body(body):
+    """
+    :return: sha256 of the body
+    """
+    body = body.encode()
+    body_sha256 = sha256(body).hexdigest()
+    filepath = _get_body_filepath(body_sha256)
+    if not os.path.isfile(filepath):
+        def write_body(tmp_filepath):
+            with open(tmp_filepath, 'wb') as f:
+                f.write(gzip.compress(body))
+        _save_file(filepath, write_body)
+    return body_sha256
+
+def _get_body(body_sha256):
+    try:
+        with gzip.open(_get_body_filepath(body_sha256), 'rb') as f:
+            return f.read().decode()
+    except FileNotFoundError:
+        return None
+
+def save_har(item_id, har_content):
+    """
+    Save the HAR of a crawled item, the large response bodies are deduplicated
+
+    :param har_content: HAR dict (Splash)
+    """
+    for entry in har_content.get('log', {}).get('entries', []):
+        content = entry.get('response', {}).get('content')
+        if content and len(content.get('text') or '') >= HAR_BODY_MIN_SIZE:
+            content[HAR_BODY_REF] = _save_body(content.pop('text'))
+
+    def write_har(tmp_filepath):
+        with gzip.open(tmp_filepath, 'wt') as f:
+            # one entry by line: read entry by entry
+            f.write(f'{_get_har_header(har_content)}\n')
+            for i, entry in enumerate(har_content.get('log', {}).get('entries', [])):
+                entry = json.dumps(entry)
+                f.write(f', {entry}\n' if i else f'{entry}\n')
+            f.write(f'{HAR_FOOTER}\n')
+    _save_file(get_har_filepath(item_id), write_har)
+
+def _restore_body(entry):
+    content = entry.get('response', {}).get('content')
+    if content and HAR_BODY_REF in content:
+        body = _get_body(content.pop(HAR_BODY_REF))
+        if body is not None:
+            content['text'] = body
+    return entry
+
+def iter_har(item_id):
+    """
+    Read a HAR entry by entry (JSON chunks), the response bodies are restored
+    one by one
+
+    :return: iterator of str, None if no HAR
+    """
+    filepath = get_har_filepath(item_id)
+    if not _is_valid_filepath(filepath):
+        return None
+    if not os.path.isfile(filepath):
+        filepath = get_har_legacy_filepath(item_id)
+        if os.path.isfile(filepath) and _is_valid_filepath(filepath):
+            return (chunk.decode() for chunk in iter_file(filepath))
+        return None
+
+    return _iter_har_file(filepath)
+
+def _get_har_header(har):
+    # {"log": {..., "entries": [...]}}
+    log = {key: value for key, value in har.get('log', {}).items() if key != 'entries'}
+    header = json.dumps({**har, 'log': log})[:-2]
+    return f'{header}, "entries": [' if log else f'{header}"entries": ['
+
+def _iter_har_file(filepath):
+    with gzip.open(filepath, 'rt') as f:
+        header = f.readline().rstrip('\n')
+        # HAR saved in one line (before the entries by line)
+        if not header.endswith('"entries": ['):
+            yield from _iter_har_entries(json.loads(header + f.read()))
+            return
+        yield header
+        for line in f:
+            line = line.rstrip('\n')
+            if line == HAR_FOOTER:
+                break
+            if line.startswith(', '):
+                yield f', {json.dumps(_restore_body(json.loads(line[2:])))}'
+            else:
+                yield json.dumps(_restore_body(json.loads(line)))
+        yield HAR_FOOTER
+
+def _iter_har_entries(har):
+    yield _get_har_header(har)
+    for i, entry in enumerate(har.get('log', {}).get('entries', [])):
+        entry = json.dumps(_restore_body(entry))
+        yield f', {entry}' if i else entry
+    yield HAR_FOOTER
+
+## SCREENSHOT ##
+
+def decode_base64_to_file(b64_content, dirname):
+    """
+    Decode a base64 content by chunks in a temporary file
+
+    :return: temporary filepath, sha256 of the decoded content
+    """
+    os.makedirs(dirname, exist_ok=True)
+    tmp_filepath = os.path.join(dirname, f'.{uuid4()}.tmp')
+    h = sha256()
+    with open(tmp_filepath, 'wb') as f:
+        for start in range(0, len(b64_content), B64_CHUNK_SIZE):
+            chunk = base64.standard_b64decode(b64_content[start:start + B64_CHUNK_SIZE])
+            h.update(chunk)
+            f.write(chunk)
+    return tmp_filepath, h.hexdigest()
+
+def _get_pixels_digest(img, nb_rows=256):
+    # by rows: the pixels are not copied in one bytes object
+    h = sha256(f'{img.mode}:{img.width}x{img.height}:'.encode())
+    for top in range(0, img.height, nb_rows):
+        h.update(img.crop((0, top, img.width, min(top + nb_rows, img.height))).tobytes())
+    return h.hexdigest()
+
+def get_image_hashes(filepath, hash_size=8):
+    """
+    Hashes of an image:
+    - perceptual hash (dHash): gradients of a grayscale thumbnail, similar images
+    - pixels digest: sha256 of the decoded pixels, identical images
+
+    :return: 64 bits perceptual hash (hex), pixels digest or None, None if not an image
+    """
+    try:
+        with Image.open(filepath) as img:
+            img = img.convert('RGBA')
+            pixels_digest = _get_pixels_digest(img)
+            pixels = list(img.convert('L').resize((hash_size + 1, hash_size), Image.BILINEAR).getdata())
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None, None
+    phash = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            left = pixels[row * (hash_size + 1) + col]
+            right = pixels[row * (hash_size + 1) + col + 1]
+            phash = (phash << 1) | (left > right)
+    phash = f'{phash:0{hash_size * hash_size // 4}x}'
+    return phash, pixels_digest
+
+def get_phash_bands(phash, nb_bands=4):
+    """
+    Split a perceptual hash: two hashes at a distance < nb_bands share a band
+    """
+    band_size = len(phash) // nb_bands
+    return [phash[i * band_size:(i + 1) * band_size] for i in range(nb_bands)]
+
+def get_phash_distance(phash1, phash2):
+    return bin(int(phash1, 16) ^ int(phash2, 16)).count('1')
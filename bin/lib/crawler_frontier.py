@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+# -*-coding:UTF-8 -*
+
+"""
+Crawler Frontier
+================
+
+Queues of the urls to crawl, by queue type (onion, regular, splash name):
+
+- priority classes, served in order: priority (manual/auto), discovery
+  (new domains), default
+- fair queueing: a class is a round robin of FIFO queues by source (feeder
+  of the item, manual, auto), a source flooding a class can't starve the
+  others
+- politeness: a domain of the discovery and default classes is crawled at
+  most once every DOMAIN_CRAWL_DELAY seconds, the messages of a domain
+  crawled too recently are delayed
+- delayed index: sorted set of the delayed messages by due epoch, the next
+  due epoch is used to wake up the crawlers
+- members: set of the messages of a class (queued or delayed), membership
+  checks
+
+A message is '<url>;<item id or crawler mode>', the queued elements are
+'<enqueue epoch>;<message>' (queue wait time).
+"""
+
+import os
+import sys
+import time
+
+from urllib.parse import urlsplit
+
+sys.path.append(os.path.join(os.environ['AIL_BIN'], 'lib/'))
+import ConfigLoader
+
+config_loader = ConfigLoader.ConfigLoader()
+r_serv_onion = config_loader.get_redis_conn("ARDB_Onion")
+if config_loader.has_option("Crawler", "domain_crawl_delay"):
+    DOMAIN_CRAWL_DELAY = config_loader.get_config_int("Crawler", "domain_crawl_delay")
+else:
+    DOMAIN_CRAWL_DELAY = 60
+config_loader = None
+
+QUEUES_NAMES = ['priority', 'discovery', 'default']
+# requested crawls are not delayed
+POLITENESS_QUEUES = {'discovery', 'default'}
+
+def get_message_source(message):
+    item_id = message.rsplit(';', 1)[-1]
+    return item_id.split('/', 1)[0]
+
+def get_message_domain(message):
+    url = message.rsplit(';', 1)[0]
+    if '://' not in url:
+        url = f'http://{url}'
+    try:
+        return urlsplit(url).hostname
+    except ValueError:
+        return None
+
+def _get_sources_key(queue_type, queue_name):
+    return f'crawler:frontier:{queue_type}:{queue_name}:sources'
+
+def _get_source_key(queue_type, queue_name, source):
+    return f'crawler:frontier:{queue_type}:{queue_name}:source:{source}'
+
+def _get_members_key(queue_type, queue_name):
+    return f'crawler:frontier:{queue_type}:{queue_name}:members'
+
+def _get_delayed_key(queue_type):
+    return f'crawler:frontier:delayed:{queue_type}'
+
+def _get_stats_key(queue_type):
+    return f'crawler:frontier:stats:{queue_type}'
+
+def _register_source(queue_type, queue_name, source):
+    if r_serv_onion.sadd(f'{_get_sources_key(queue_type, queue_name)}:set', source):
+        r_serv_onion.rpush(_get_sources_key(queue_type, queue_name), source)
+
+def _unregister_source(queue_type, queue_name, source):
+    r_serv_onion.srem(f'{_get_sources_key(queue_type, queue_name)}:set', source)
+    r_serv_onion.lrem(_get_sources_key(queue_type, queue_name), 0, source)
+    # message pushed meanwhile
+    if r_serv_onion.llen(_get_source_key(queue_type, queue_name, source)):
+        _register_source(queue_type, queue_name, source)
+
+def get_queue_sources(queue_type, queue_name):
+    return r_serv_onion.lrange(_get_sources_key(queue_type, queue_name), 0, -1)
+
+## PUSH ##
+
+def push(queue_type, queue_name, message, epoch=None):
+    if epoch is None:
+        epoch = int(time.time())
+    source = get_message_source(message)
+    pipe = r_serv_onion.pipeline(transaction=False)
+    pipe.rpush(_get_source_key(queue_type, queue_name, source), f'{epoch};{message}')
+    pipe.sadd(_get_members_key(queue_type, queue_name), message)
+    pipe.execute()
+    _register_source(queue_type, queue_name, source)
+
+def delay(queue_type, queue_name, message, epoch, due_epoch):
+    r_serv_onion.zadd(_get_delayed_key(queue_type), due_epoch, f'{queue_name};{epoch};{message}')
+
+def promote_delayed(queue_type):
+    """
+    Push back the delayed messages due
+    """
+    delayed_key = _get_delayed_key(queue_type)
+    for elem in r_serv_onion.zrangebyscore(delayed_key, '-inf', int(time.time())):
+        # popped by another crawler
+        if not r_serv_onion.zrem(delayed_key, elem):
+            continue
+        queue_name, epoch, message = elem.split(';', 2)
+        push(queue_type, queue_name, message, epoch=epoch)
+
+def get_next_due_epoch(l_queue_type):
+    """
+    :return: epoch of the next delayed message due, None if no delayed message
+    """
+    pipe = r_serv_onion.pipeline(transaction=False)
+    for queue_type in l_queue_type:
+        pipe.zrange(_get_delayed_key(queue_type), 0, 0, withscores=True)
+    next_due = [res[0][1] for res in pipe.execute() if res]
+    if next_due:
+        return min(next_due)
+    return None
+
+## POP ##
+
+def _is_domain_crawl_allowed(domain):
+    """
+    Politeness: reserve the domain for DOMAIN_CRAWL_DELAY seconds
+
+    :return: 0 if allowed, else number of seconds to wait
+    """
+    if not domain or DOMAIN_CRAWL_DELAY <= 0:
+        return 0
+    key = f'crawler:frontier:politeness:{domain}'
+    if r_serv_onion.set(key, int(time.time()), ex=DOMAIN_CRAWL_DELAY, nx=True):
+        return 0
+    return max(r_serv_onion.ttl(key), 1)
+
+def pop(queue_type, queue_name):
+    """
+    Pop the next message of a class, the sources are served in round robin
+
+    :return: message, wait time in seconds or None, None
+    """
+    sources_key = _get_sources_key(queue_type, queue_name)
+    for _ in range(r_serv_onion.llen(sources_key)):
+        # rotate sources
+        source = r_serv_onion.rpoplpush(sources_key, sources_key)
+        if source is None:
+            break
+        source_key = _get_source_key(queue_type, queue_name, source)
+        elem = r_serv_onion.lpop(source_key)
+        if elem is None:
+            _unregister_source(queue_type, queue_name, source)
+            continue
+        epoch, message = elem.split(';', 1)
+
+        if queue_name in POLITENESS_QUEUES:
+            wait_delay = _is_domain_crawl_allowed(get_message_domain(message))
+            if wait_delay:
+                delay(queue_type, queue_name, message, epoch, int(time.time()) + wait_delay)
+                continue
+
+        wait = max(int(time.time()) - int(epoch), 0)
+        pipe = r_serv_onion.pipeline(transaction=False)
+        pipe.srem(_get_members_key(queue_type, queue_name), message)
+        pipe.hincrby(_get_stats_key(queue_type), f'{queue_name}:nb', 1)
+        pipe.hincrby(_get_stats_key(queue_type), f'{queue_name}:wait', wait)
+        pipe.execute()
+        return message, wait
+    return None, None
+
+def pop_by_queue_types(l_queue_type):
+    """
+    :return: queue_type, queue_name, message, wait time or None
+    """
+    for queue_type in l_queue_type:
+        promote_delayed(queue_type)
+    for queue_name in QUEUES_NAMES:
+        for queue_type in l_queue_type:
+            message, wait = pop(queue_type, queue_name)
+            if message:
+                return queue_type, queue_name, message, wait
+    return None
+
+## MEMBERSHIP / DELETE ##
+
+def _get_source_elems(queue_type, queue_name, message):
+    source_key = _get_source_key(queue_type, queue_name, get_message_source(message))
+    return source_key, [elem for elem in r_serv_onion.lrange(source_key, 0, -1)
+                        if elem.split(';', 1)[1] == message]
+
+def contains(queue_type, message, queue_name=None):
+    queues_names = [queue_name] if queue_name else QUEUES_NAMES
+    pipe = r_serv_onion.pipeline(transaction=False)
+    for queue_name in queues_names:
+        pipe.sismember(_get_members_key(queue_type, queue_name), message)
+    return any(pipe.execute())
+
+def remove(queue_type, queue_name, message):
+    # not queued
+    if not r_serv_onion.srem(_get_members_key(queue_type, queue_name), message):
+        return
+    source_key, elems = _get_source_elems(queue_type, queue_name, message)
+    for elem in elems:
+        r_serv_onion.lrem(source_key, 1, elem)
+    delayed_key = _get_delayed_key(queue_type)
+    for elem in r_serv_onion.zrange(delayed_key, 0, -1):
+        d_queue_name, _, d_message = elem.split(';', 2)
+        if d_queue_name == queue_name and d_message == message:
+            r_serv_onion.zrem(delayed_key, elem)
+
+def clear(queue_type):
+    for queue_name in QUEUES_NAMES:
+        for source in get_queue_sources(queue_type, queue_name):
+            r_serv_onion.delete(_get_source_key(queue_type, queue_name, source))
+        r_serv_onion.delete(_get_sources_key(queue_type, queue_name))
+        r_serv_onion.delete(f'{_get_sources_key(queue_type, queue_name)}:set')
+        r_serv_onion.delete(_get_members_key(queue_type, queue_name))
+    r_serv_onion.delete(_get_delayed_key(queue_type))
+
+## STATS ##
+
+def get_queue_depth(queue_type, queue_name):
+    pipe = r_serv_onion.pipeline(transaction=False)
+    for source in get_queue_sources(queue_type, queue_name):
+        pipe.llen(_get_source_key(queue_type, queue_name, source))
+    return sum(pipe.execute())
+
+def get_stats(queue_type):
+    """
+    Depth and wait times of the classes of a queue type
+
+    :return: dict, queue name => {'depth', 'nb_sources', 'oldest_wait', 'avg_wait', 'nb_popped'}
+             + 'delayed' => nb delayed messages
+    """
+    now = int(time.time())
+    stats = r_serv_onion.hgetall(_get_stats_key(queue_type))
+    dict_stats = {}
+    for queue_name in QUEUES_NAMES:
+        sources = get_queue_sources(queue_type, queue_name)
+        pipe = r_serv_onion.pipeline(transaction=False)
+        for source in sources:
+            source_key = _get_source_key(queue_type, queue_name, source)
+            pipe.llen(source_key)
+            pipe.lindex(source_key, 0)
+        res = pipe.execute()
+        depth = sum(res[0::2])
+        heads = [int(elem.split(';', 1)[0]) for elem in res[1::2] if elem]
+        nb_popped = int(stats.get(f'{queue_name}:nb', 0))
+        total_wait = int(stats.get(f'{queue_name}:wait', 0))
+        dict_stats[queue_name] = {'depth': depth, 'nb_sources': len(sources),
+                                  'oldest_wait': now - min(heads) if heads else 0,
+                                  'avg_wait': round(total_wait / nb_popped, 2) if nb_popped else 0,
+                                  'nb_popped': nb_popped}
+    dict_stats['delayed'] = r_serv_onion.zcard(_get_delayed_key(queue_type))
+    return dict_stats
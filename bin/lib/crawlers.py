@@ -6,7 +6,6 @@ API Helper
 
 
 """
-import base64
 import gzip
 import json
 import os
@@ -33,6 +32,9 @@ import git_status
 
 sys.path.append(os.path.join(os.environ['AIL_BIN'], 'lib/'))
 import ConfigLoader
+import crawler_artifacts
+import crawler_frontier
+import item_basic
 
 sys.path.append(os.path.join(os.environ['AIL_BIN'], 'core/'))
 import screen
@@ -630,14 +632,19 @@ def add_auto_crawler_in_queue(domain, domain_type, port, epoch, delta, message):
 
 def update_auto_crawler_queue():
     current_epoch = int(time.time())
-    current_epoch = 1631096842
     # check if current_epoch > domain_next_epoch
     l_queue = r_serv_onion.zrangebyscore('crawler_auto_queue', 0, current_epoch)
     for elem in l_queue:
+        # popped by another crawler
+        if not r_serv_onion.zrem('crawler_auto_queue', elem):
+            continue
         mess, domain_type = elem.rsplit(';', 1)
-        print(domain_type)
-        print(mess)
-        r_serv_onion.sadd(f'{domain_type}_crawler_priority_queue', mess)
+        crawler_frontier.push(domain_type, 'priority', mess)
+
+def get_auto_crawler_next_due_epoch():
+    if res := r_serv_onion.zrange('crawler_auto_queue', 0, 0, withscores=True):
+        return res[0][1]
+    return None
 
 
 ##-- AUTOMATIC CRAWLER --##
@@ -708,10 +715,8 @@ def save_crawler_config(crawler_mode, crawler_type, crawler_config, domain, url=
         )
 
 def send_url_to_crawl_in_queue(crawler_mode, crawler_type, url):
-    print(f'{crawler_type}_crawler_priority_queue', f'{url};{crawler_mode}')
-    r_serv_onion.sadd(
-        f'{crawler_type}_crawler_priority_queue', f'{url};{crawler_mode}'
-    )
+    print(f'{crawler_type} priority queue', f'{url};{crawler_mode}')
+    crawler_frontier.push(crawler_type, 'priority', f'{url};{crawler_mode}')
 
     # add auto crawled url for user UI
     if crawler_mode == 'auto':
@@ -829,20 +834,18 @@ def create_item_id(item_dir, domain):
     return os.path.join(item_dir, UUID)
 
 def save_crawled_item(item_id, item_content):
+    """
+    :return: Mixer message, None if duplicate, False if error
+    """
     try:
-        gzipencoded = gzip.compress(item_content.encode())
-        return base64.standard_b64encode(gzipencoded).decode()
+        content = item_content.encode()
+        return item_basic.get_ingest_message(item_id, gzip.compress(content), content=content)
     except:
         print(f"file error: {item_id}")
         return False
 
-def save_har(har_dir, item_id, har_content):
-    if not os.path.exists(har_dir):
-        os.makedirs(har_dir)
-    item_id = item_id.split('/')[-1]
-    filename = os.path.join(har_dir, f'{item_id}.json')
-    with open(filename, 'w') as f:
-        f.write(json.dumps(har_content))
+def save_har(item_id, har_content):
+    crawler_artifacts.save_har(item_id, har_content)
 
 # # TODO: FIXME
 def api_add_crawled_item(dict_crawled):
@@ -876,37 +879,31 @@ def get_queue_key_by_name(queue_name):
 
 def get_stats_elem_to_crawl_by_queue_type(queue_type):
     return {
-        queue_name: r_serv_onion.scard(
-            get_queue_key_by_name(queue_name).format(queue_type)
-        )
+        queue_name: crawler_frontier.get_queue_depth(queue_type, queue_name)
+        + r_serv_onion.scard(get_queue_key_by_name(queue_name).format(queue_type))
         for queue_name in get_all_queues_names()
     }
 
 def get_all_queues_stats():
-    print(get_all_crawlers_queues_types())
+    """
+    Depth and wait time metrics by queue type
+
+    :return: dict, queue type => crawler_frontier.get_stats
+    """
     dict_stats = {
-        queue_type: get_stats_elem_to_crawl_by_queue_type(queue_type)
+        queue_type: crawler_frontier.get_stats(queue_type)
         for queue_type in get_crawler_all_types()
     }
 
     for queue_type in get_all_splash():
-        dict_stats[queue_type] = get_stats_elem_to_crawl_by_queue_type(queue_type)
+        dict_stats[queue_type] = crawler_frontier.get_stats(queue_type)
     return dict_stats
 
 def is_domain_in_queue(queue_type, domain):
     return r_serv_onion.sismember(f'{queue_type}_domain_crawler_queue', domain)
 
 def is_item_in_queue(queue_type, url, item_id, queue_name=None):
-    if queue_name is None:
-        queues = get_all_queues_keys()
-    else:
-        queues = get_queue_key_by_name(queue_name)
-
-    key = f'{url};{item_id}'
-    return any(
-        r_serv_onion.sismember(queue.format(queue_type), key)
-        for queue in queues
-    )
+    return crawler_frontier.contains(queue_type, f'{url};{item_id}', queue_name=queue_name)
 
 def add_item_to_discovery_queue(queue_type, domain, subdomain, url, item_id):
     date_month = datetime.now().strftime("%Y%m")
@@ -920,24 +917,23 @@ def add_item_to_discovery_queue(queue_type, domain, subdomain, url, item_id):
     if len(subdomain.split('.')) > 3:
         subdomain = f'{subdomain[-3]}.{subdomain[-2]}.{queue_type}'
 
-    if (
-        not r_serv_onion.sismember(
-            f'month_{queue_type}_up:{date_month}', subdomain
-        )
-        and not r_serv_onion.sismember(f'{queue_type}_down:{date}', subdomain)
-        and not r_serv_onion.sismember(
-            f'{queue_type}_domain_crawler_queue', subdomain
-        )
-    ):
-        r_serv_onion.sadd(f'{queue_type}_domain_crawler_queue', subdomain)
+    # membership checks in one round trip
+    pipe = r_serv_onion.pipeline(transaction=False)
+    pipe.sismember(f'month_{queue_type}_up:{date_month}', subdomain)
+    pipe.sismember(f'{queue_type}_down:{date}', subdomain)
+    pipe.hexists(f'{queue_type}_metadata:{subdomain}', 'first_seen')
+    is_up, is_down, is_seen = pipe.execute()
+
+    # SADD: domain already in queue
+    if not is_up and not is_down and r_serv_onion.sadd(f'{queue_type}_domain_crawler_queue', subdomain):
         msg = f'{url};{item_id}'
         # First time we see this domain => Add to discovery queue (priority=2)
-        if not r_serv_onion.hexists(f'{queue_type}_metadata:{subdomain}', 'first_seen'):
-            r_serv_onion.sadd(f'{queue_type}_crawler_discovery_queue', msg)
+        if not is_seen:
+            crawler_frontier.push(queue_type, 'discovery', msg)
             print(f'sent to priority queue: {subdomain}')
         # Add to default queue (priority=3)
         else:
-            r_serv_onion.sadd(f'{queue_type}_crawler_queue', msg)
+            crawler_frontier.push(queue_type, 'default', msg)
             print(f'sent to queue: {subdomain}')
 
 def queue_test_clean_up(queue_type, domain, item_id):
@@ -949,6 +945,8 @@ def queue_test_clean_up(queue_type, domain, item_id):
     msg = f'{domain};{item_id}'
     r_serv_onion.srem(f'{queue_type}_crawler_discovery_queue', msg)
     r_serv_onion.srem(f'{queue_type}_crawler_queue', msg)
+    crawler_frontier.remove(queue_type, 'discovery', f'http://{msg}')
+    crawler_frontier.remove(queue_type, 'default', f'http://{msg}')
 
 
 def remove_task_from_crawler_queue(queue_name, queue_type, key_to_remove):
@@ -956,16 +954,14 @@ def remove_task_from_crawler_queue(queue_name, queue_type, key_to_remove):
 
 # # TODO: keep auto crawler ?
 def clear_crawler_queues():
-    for queue_key in get_all_queues_keys():
-        for queue_type in get_crawler_all_types():
+    for queue_type in get_crawler_all_types():
+        for queue_key in get_all_queues_keys():
             r_serv_onion.delete(queue_key.format(queue_type))
+        crawler_frontier.clear(queue_type)
 
 ###################################################################################
 def get_nb_elem_to_crawl_by_type(queue_type): # # TODO: rename me
-    nb = r_serv_onion.scard(f'{queue_type}_crawler_priority_queue')
-    nb += r_serv_onion.scard(f'{queue_type}_crawler_discovery_queue')
-    nb += r_serv_onion.scard(f'{queue_type}_crawler_queue')
-    return nb
+    return sum(get_stats_elem_to_crawl_by_queue_type(queue_type).values())
 ###################################################################################
 
 def get_all_crawlers_queues_types():
@@ -998,29 +994,54 @@ def get_crawler_type_by_url(url):
     return 'onion' if tld == 'onion' else 'regular'
 
 
+def _unpack_message_to_crawl(message, queue_type, queue_name, wait=None):
+    splitted = message.rsplit(';', 1)
+    if len(splitted) == 2:
+        url, item_id = splitted
+        item_id = item_id.replace(f'{PASTES_FOLDER}/', '')
+    else:
+    # # TODO: to check/refractor
+        item_id = None
+        url = message
+    crawler_type = get_crawler_type_by_url(url)
+    return {'url': url, 'paste': item_id, 'type_service': crawler_type, 'queue_type': queue_type,
+            'queue_name': queue_name, 'wait': wait, 'original_message': message}
+
 def get_elem_to_crawl_by_queue_type(l_queue_type):
     ## queues priority:
     # 1 - priority queue
     # 2 - discovery queue
     # 3 - normal queue
     ##
+    if res := crawler_frontier.pop_by_queue_types(l_queue_type):
+        queue_type, queue_name, message, wait = res
+        return _unpack_message_to_crawl(message, queue_type, queue_name, wait=wait)
 
-    for queue_key in get_all_queues_keys():
+    # queues created before the crawler frontier
+    for queue_name in get_all_queues_names():
+        queue_key = get_queue_key_by_name(queue_name)
         for queue_type in l_queue_type:
             if message := r_serv_onion.spop(queue_key.format(queue_type)):
-                dict_to_crawl = {}
-                splitted = message.rsplit(';', 1)
-                if len(splitted) == 2:
-                    url, item_id = splitted
-                    item_id = item_id.replace(f'{PASTES_FOLDER}/', '')
-                else:
-                # # TODO: to check/refractor
-                    item_id = None
-                    url = message
-                crawler_type = get_crawler_type_by_url(url)
-                return {'url': url, 'paste': item_id, 'type_service': crawler_type, 'queue_type': queue_type, 'original_message': message}
+                return _unpack_message_to_crawl(message, queue_type, queue_name)
+    return None
+
+def get_crawler_queues_next_due_epoch(l_queue_type):
+    """
+    :return: epoch of the next auto crawl or delayed domain due, None if nothing scheduled
+    """
+    l_due = [crawler_frontier.get_next_due_epoch(l_queue_type), get_auto_crawler_next_due_epoch()]
+    l_due = [due for due in l_due if due is not None]
+    if l_due:
+        return min(l_due)
     return None
 
+def send_message_back_in_queue(type_service, domain, message):
+    """
+    Crawl error: send the message back in the priority queue
+    """
+    if r_serv_onion.sadd(f'{type_service}_domain_crawler_queue', domain):
+        crawler_frontier.push(type_service, 'priority', message)
+
 #### ---- ####
 
 # # # # # # # # # # # #
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*-coding:UTF-8 -*
+
+"""
+DNS Resolver
+============
+
+Resolve the DNS records of a set of domains (by default A, AAAA, SOA, MX,
+CNAME), all the queries are sent concurrently (asyncio, bounded number of
+queries in flight). The records are returned in the passive DNS format of
+DomainClassifier:
+
+timestamp||dns-client||dns-server||RR class||Query||Query Type||Answer||TTL||Count
+
+The results are cached in Redis: the records of the valid domains for
+DNS_CACHE_TTL, the invalid domains (NXDOMAIN, no answer, invalid name) for
+DNS_NEGATIVE_CACHE_TTL. Timeouts and server failures are not cached. The
+records are cached without timestamp, the timestamp is the lookup time.
+
+The resolvers of other record types use their own cache prefix (see
+mx_resolver).
+"""
+
+import asyncio
+import json
+import time
+
+import dns.asyncresolver
+import dns.exception
+import dns.name
+import dns.resolver
+
+DNS_RTYPES = ('A', 'AAAA', 'SOA', 'MX', 'CNAME')
+DNS_CACHE_TTL = 3600
+DNS_NEGATIVE_CACHE_TTL = 3600
+
+class DNSResolver(object):
+    """
+    :param r_cache: Redis cache
+    :param nameservers: list of DNS servers
+    :param port: DNS port
+    :param max_concurrent: maximum number of queries in flight
+    :param rtypes: record types resolved
+    :param cache_prefix: prefix of the Redis cache keys, one by set of record types
+    """
+
+    def __init__(self, r_cache, nameservers, port=53, lifetime=1.0, max_concurrent=100,
+                 ttl=DNS_CACHE_TTL, negative_ttl=DNS_NEGATIVE_CACHE_TTL, rtypes=DNS_RTYPES,
+                 cache_prefix='dns:records'):
+        self.r_cache = r_cache
+        self.nameservers = nameservers
+        self.port = port
+        self.lifetime = lifetime
+        self.max_concurrent = max_concurrent
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.rtypes = tuple(rtypes)
+        self.cache_prefix = cache_prefix
+
+    def _get_resolver(self):
+        resolver = dns.asyncresolver.Resolver(configure=False)
+        resolver.nameservers = self.nameservers
+        resolver.port = self.port
+        resolver.timeout = self.lifetime
+        resolver.lifetime = self.lifetime
+        return resolver
+
+    async def _resolve(self, resolver, semaphore, domain, rtype):
+        """
+        :return: list of records (without timestamp), [] if no record, None if unknown (timeout, ...)
+        """
+        async with semaphore:
+            try:
+                answers = await resolver.resolve(domain, rdtype=rtype)
+            except (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer):
+                return []
+            except (dns.name.EmptyLabel, dns.name.LabelTooLong, dns.name.NameTooLong):
+                return []
+            except (dns.resolver.NoNameservers, dns.exception.Timeout):
+                return None
+            except Exception as e:
+                print(e)
+                return None
+        records = []
+        for dns_resp in answers.rrset.to_text().splitlines():
+            dns_resp = dns_resp.split()
+            records.append(f'127.0.0.1||{self.nameservers[0]}||{dns_resp[2]}||{domain}||{rtype}||{dns_resp[4]}||{answers.ttl}||1\n')
+        return records
+
+    async def _resolve_all(self, domains):
+        resolver = self._get_resolver()
+        semaphore = asyncio.Semaphore(self.max_concurrent)
+        return await asyncio.gather(*(self._resolve(resolver, semaphore, domain, rtype)
+                                      for domain in domains for rtype in self.rtypes))
+
+    def get_records(self, domains):
+        """
+        Get the DNS records of a set of domains, without timestamp
+
+        :param domains: set of domains
+        :return: dict, valid domain => list of records
+        """
+        domains = list(domains)
+        if not domains:
+            return {}
+
+        valid_domains = {}
+        to_resolve = []
+        cached = self.r_cache.mget([f'{self.cache_prefix}:{domain}' for domain in domains])
+        for domain, res in zip(domains, cached):
+            if res is None:
+                to_resolve.append(domain)
+            elif res := json.loads(res):
+                valid_domains[domain] = res
+
+        if to_resolve:
+            results = asyncio.run(self._resolve_all(to_resolve))
+            nb_rtypes = len(self.rtypes)
+            pipe = self.r_cache.pipeline(transaction=False)
+            for i, domain in enumerate(to_resolve):
+                domain_results = results[i * nb_rtypes:(i + 1) * nb_rtypes]
+                records = [record for res in domain_results if res for record in res]
+                if records:
+                    valid_domains[domain] = records
+                    pipe.setex(f'{self.cache_prefix}:{domain}', self.ttl, json.dumps(records))
+                # invalid domain
+                elif None not in domain_results:
+                    pipe.setex(f'{self.cache_prefix}:{domain}', self.negative_ttl, json.dumps([]))
+            pipe.execute()
+        return valid_domains
+
+    def get_passive_dns_records(self, domains):
+        """
+        Get the passive DNS records of a set of domains
+
+        :param domains: set of domains
+        :return: dict, valid domain => list of passive DNS records
+        """
+        timestamp = time.time()
+        return {domain: [f'{timestamp}||{record}' for record in records]
+                for domain, records in self.get_records(domains).items()}
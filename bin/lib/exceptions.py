@@ -13,3 +13,9 @@ class UpdateInvestigationError(AIL_ERROR):
 
 class NewTagError(AIL_ERROR):
     pass
+
+class InvalidGzipError(AIL_ERROR):
+    pass
+
+class IncompleteGzipError(InvalidGzipError):
+    pass
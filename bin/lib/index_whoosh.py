@@ -1,12 +1,20 @@
 #!/usr/bin/env python3
 # -*-coding:UTF-8 -*
 
+import heapq
 import os
 import sys
+import time
 import redis
 
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
 from shutil import rmtree
 
+from whoosh import index
+from whoosh.qparser import QueryParser
+
 sys.path.append(os.path.join(os.environ['AIL_BIN'], 'lib/'))
 import ConfigLoader
 
@@ -15,6 +23,14 @@ INDEX_PATH = os.path.join(os.environ['AIL_HOME'], config_loader.get_config_str("
 all_index_file = os.path.join(INDEX_PATH, 'all_index.txt')
 config_loader = None
 
+# Search
+SEARCH_NB_PROCESS = 4
+SEARCH_CACHE_SIZE = 100
+SEARCH_CACHE_TTL = 60
+
+# all_index.txt, reloaded if modified
+_all_index_cache = {'mtime': None, 'all_index': []}
+
 def get_first_index_name():
     with open(all_index_file) as f:
         first_index = f.readline().replace('\n', '')
@@ -28,12 +44,19 @@ def get_last_index_name():
     return last_index
 
 def get_all_index():
-    all_index = []
-    with open(all_index_file) as f:
-        for line in f:
-            if line := line.replace('\n', ''):
-                all_index.append(line)
-    return all_index
+    try:
+        mtime = os.stat(all_index_file).st_mtime_ns
+    except FileNotFoundError:
+        return []
+    if mtime != _all_index_cache['mtime']:
+        all_index = []
+        with open(all_index_file) as f:
+            for line in f:
+                if line := line.replace('\n', ''):
+                    all_index.append(line)
+        _all_index_cache['all_index'] = all_index
+        _all_index_cache['mtime'] = mtime
+    return list(_all_index_cache['all_index'])
 
 def get_index_full_path(index_name):
     return os.path.join(INDEX_PATH, index_name)
@@ -97,5 +120,108 @@ def delete_older_index(number_of_index_to_keep):
 
 ##-- DATA RETENTION  --##
 
+#### SEARCH ####
+
+# Searchers opened in the search process, by index name
+_opened_searchers = {}
+
+def _get_searcher(index_name):
+    searcher = _opened_searchers.get(index_name)
+    if searcher is None:
+        ix = index.open_dir(get_index_full_path(index_name))
+        searcher = ix.searcher()
+    else:
+        # reopen only if the index changed
+        searcher = searcher.refresh()
+    _opened_searchers[index_name] = searcher
+    return searcher
+
+def _search_index(index_name, query, limit):
+    """
+    Search an index (shard), executed in the search processes
+
+    :return: estimated number of results, list of (score, index_name, path) sorted by score
+    """
+    try:
+        searcher = _get_searcher(index_name)
+    except Exception as e:
+        # deleted or invalid index
+        _opened_searchers.pop(index_name, None)
+        print(f'Error: index {index_name}: {e}')
+        return 0, []
+    q = QueryParser("content", searcher.schema).parse(query)
+    results = searcher.search(q, limit=limit)
+    hits = [(hit.score, index_name, hit['path']) for hit in results]
+    return results.estimated_length(), hits
+
+class IndexSearcher(object):
+    """
+    Full-text search across the rotated indexes
+
+    The query is sent to all the selected indexes in a process pool (the
+    indexes readers are kept open in the processes). Each index only returns
+    its page * pagelen best results, merged by score.
+    The results are cached and the cache is cleared when all_index.txt
+    changes (index rotation or deletion).
+    """
+
+    def __init__(self, nb_process=SEARCH_NB_PROCESS, cache_size=SEARCH_CACHE_SIZE, cache_ttl=SEARCH_CACHE_TTL):
+        self.pool = ProcessPoolExecutor(max_workers=nb_process)
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self.cache = OrderedDict()
+        self.all_index = None
+
+    def _get_cached(self, key, limit):
+        cached = self.cache.get(key)
+        if cached:
+            timestamp, cached_limit, nb_results, hits = cached
+            if time.time() - timestamp < self.cache_ttl and (cached_limit >= limit or len(hits) < cached_limit):
+                self.cache.move_to_end(key)
+                return nb_results, hits
+        return None
+
+    def _set_cached(self, key, limit, nb_results, hits):
+        self.cache[key] = (time.time(), limit, nb_results, hits)
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    def search(self, query, page=1, pagelen=50, index_names=None):
+        """
+        Search a page of results
+
+        :param index_names: list of index name, all indexes by default
+        :return: estimated number of results, list of (score, index_name, path)
+        """
+        all_index = get_all_index()
+        # index rotated or deleted
+        if all_index != self.all_index:
+            self.cache.clear()
+            self.all_index = all_index
+        if index_names is None:
+            index_names = all_index
+
+        limit = page * pagelen
+        key = (query, tuple(index_names))
+        res = self._get_cached(key, limit)
+        if res is None:
+            futures = [self.pool.submit(_search_index, index_name, query, limit) for index_name in index_names]
+            nb_results = 0
+            all_hits = []
+            for future in futures:
+                nb, hits = future.result()
+                nb_results += nb
+                all_hits.append(hits)
+            # each list is sorted by score, stop at the end of the page
+            hits = list(islice(heapq.merge(*all_hits, key=lambda x: x[0], reverse=True), limit))
+            self._set_cached(key, limit, nb_results, hits)
+        else:
+            nb_results, hits = res
+        return nb_results, hits[(page - 1) * pagelen:limit]
+
+    def close(self):
+        self.pool.shutdown()
+
 # if __name__ == '__main__':
 #     delete_older_index(3)
@@ -1,10 +1,15 @@
 #!/usr/bin/env python3
 # -*-coding:UTF-8 -*
 
+import base64
 import os
 import sys
+import codecs
 import gzip
 
+from collections import OrderedDict
+from hashlib import sha1
+
 import magic
 
 sys.path.append(os.path.join(os.environ['AIL_BIN'], 'packages/'))
@@ -12,6 +17,7 @@ import Tag
 
 sys.path.append(os.path.join(os.environ['AIL_BIN'], 'lib/'))
 import ConfigLoader
+import item_store
 
 config_loader = ConfigLoader.ConfigLoader()
 # get and sanityze PASTE DIRECTORY
@@ -19,7 +25,17 @@ PASTES_FOLDER = os.path.join(os.environ['AIL_HOME'], config_loader.get_config_st
 PASTES_FOLDER = os.path.join(os.path.realpath(PASTES_FOLDER), '')
 
 r_cache = config_loader.get_redis_conn("Redis_Cache")
+r_queues = config_loader.get_redis_conn("Redis_Queues")
 r_serv_metadata = config_loader.get_redis_conn("ARDB_Metadata")
+# the local producers save the items, only the item id is queued
+if config_loader.has_option("Global", "local_ingest"):
+    LOCAL_INGEST = config_loader.get_config_boolean("Global", "local_ingest")
+else:
+    LOCAL_INGEST = True
+if config_loader.has_option("Global", "fsync"):
+    LOCAL_INGEST_FSYNC = config_loader.get_config_boolean("Global", "fsync")
+else:
+    LOCAL_INGEST_FSYNC = True
 config_loader = None
 
 def exist_item(item_id):
@@ -51,24 +67,199 @@ def is_crawled(item_id):
 def get_item_domain(item_id):
     return item_id[19:-36]
 
-def get_item_content(item_id):
-    item_full_path = os.path.join(PASTES_FOLDER, item_id)
+#### INGEST ####
+
+# Local items queues: the local producers send the local items to the Mixer
+# (dedup), the Mixer sends the new ones to Global. Only the local processes
+# write in them: the local items received on the Mixer channel (feeders, sync)
+# are rejected
+MIXER_LOCAL_INGEST_QUEUE = 'Mixer:local_ingest'
+GLOBAL_LOCAL_INGEST_QUEUE = 'Global:local_ingest'
+
+class LocalItemMessage(str):
+    """Message of a local item, popped from a local ingest queue"""
+
+def get_ingest_message(item_id, payload, content=None):
+    """
+    Mixer message of a new item. Local ingest: the item is saved by the
+    producer, only the item id and the content digest are queued
+
+    :param payload: gzip payload
+    :param content: decompressed content (bytes), skip the gzip check
+    :return: message, None if the item is a duplicate
+    """
+    if not LOCAL_INGEST:
+        return f'{item_id} {base64.standard_b64encode(payload).decode()}'
+    digest = sha1(content).hexdigest() if content is not None else None
+    item_id, digest = item_store.save_local_item(PASTES_FOLDER, item_id, payload, content_digest=digest,
+                                                 fsync=LOCAL_INGEST_FSYNC)
+    if item_id:
+        return item_store.create_local_item_message(item_id, digest)
+    return None
+
+def send_ingest_message(process, relay_message):
+    """
+    Send a new item: a local item to the Mixer local ingest queue, else on
+    the Mixer channel
+    """
+    if item_store.is_local_item_message(relay_message.split(' ', 1)[-1]):
+        add_local_ingest_message(MIXER_LOCAL_INGEST_QUEUE, relay_message)
+    else:
+        process.populate_set_out(relay_message, 'Mixer')
+
+def add_local_ingest_message(queue, message):
+    r_queues.sadd(queue, message)
+
+def pop_local_ingest_messages(queue, count):
+    """
+    :return: list of LocalItemMessage
+    """
+    messages = r_queues.execute_command('SPOP', queue, count)
+    return [LocalItemMessage(message) for message in messages or []]
+
+def get_local_ingest_queue_size(queue):
+    return r_queues.scard(queue)
+
+def delete_local_item(item_id):
+    """
+    Delete a local item duplicate, saved by a local producer
+
+    :return: True if deleted
+    """
+    filepath = item_store.get_item_filepath(PASTES_FOLDER, item_id)
+    if filepath and os.path.isfile(filepath):
+        os.remove(filepath)
+        return True
+    return False
+
+#### CONTENT ####
+
+# Items content are cached in a local LRU (by process), only the small items
+# are pushed in the shared Redis cache
+CONTENT_CACHE_MAX_SIZE = 64 * 1024 * 1024
+REDIS_CACHE_MAX_ITEM_SIZE = 256 * 1024
+REDIS_CACHE_TTL = 300
+CONTENT_CHUNK_SIZE = 64 * 1024
+
+class ContentLRUCache(object):
+    """
+    Local LRU cache of items content, bounded by the total content size
+    """
+
+    def __init__(self, max_size=CONTENT_CACHE_MAX_SIZE):
+        self.max_size = max_size
+        self.size = 0
+        self.cache = OrderedDict()
+
+    def get(self, key):
+        content = self.cache.get(key)
+        if content is not None:
+            self.cache.move_to_end(key)
+        return content
+
+    def set(self, key, content):
+        # don't evict the whole cache for a huge item
+        if len(content) > self.max_size // 4:
+            return
+        if key in self.cache:
+            self.size -= len(self.cache.pop(key))
+        self.cache[key] = content
+        self.size += len(content)
+        while self.size > self.max_size:
+            _, old_content = self.cache.popitem(last=False)
+            self.size -= len(old_content)
+
+    def delete(self, key):
+        if key in self.cache:
+            self.size -= len(self.cache.pop(key))
+
+content_cache = ContentLRUCache()
+
+def _get_redis_cached_content(item_full_path):
     try:
-        item_content = r_cache.get(item_full_path)
+        return r_cache.get(item_full_path)
     except UnicodeDecodeError:
-        item_content = None
+        return None
     except Exception as e:
-        item_content = None
+        return None
+
+def get_item_content_binary(item_id):
+    """
+    Get the decompressed content of an item, without decoding it to str
+
+    :return: bytes
+    """
+    item_full_path = os.path.join(PASTES_FOLDER, item_id)
+    item_content = content_cache.get(('bytes', item_full_path))
+    if item_content is None:
+        try:
+            with gzip.open(item_full_path, 'rb') as f:
+                item_content = f.read()
+        except Exception as e:
+            print(e)
+            return b''
+        content_cache.set(('bytes', item_full_path), item_content)
+    return item_content
+
+def get_item_content(item_id):
+    item_full_path = os.path.join(PASTES_FOLDER, item_id)
+    item_content = content_cache.get(('str', item_full_path))
+    if item_content is not None:
+        return item_content
+
+    item_content = _get_redis_cached_content(item_full_path)
     if item_content is None:
         try:
             with gzip.open(item_full_path, 'r') as f:
                 item_content = f.read().decode()
-                r_cache.set(item_full_path, item_content)
-                r_cache.expire(item_full_path, 300)
         except Exception as e:
             print(e)
-            item_content = ''
-    return str(item_content)
+            return ''
+        # only small items are shared between modules
+        if len(item_content) <= REDIS_CACHE_MAX_ITEM_SIZE:
+            r_cache.set(item_full_path, item_content)
+            r_cache.expire(item_full_path, REDIS_CACHE_TTL)
+    item_content = str(item_content)
+    content_cache.set(('str', item_full_path), item_content)
+    return item_content
+
+def iter_item_content(item_id, chunk_size=CONTENT_CHUNK_SIZE, decode=True):
+    """
+    Stream the content of an item, chunk by chunk, without reading the whole
+    gzip file
+
+    :param decode: yield str chunks (utf-8 incremental decoding) or bytes
+    """
+    item_full_path = os.path.join(PASTES_FOLDER, item_id)
+    decoder = codecs.getincrementaldecoder('utf-8')() if decode else None
+    try:
+        with gzip.open(item_full_path, 'rb') as f:
+            while chunk := f.read(chunk_size):
+                yield decoder.decode(chunk) if decoder else chunk
+    except Exception as e:
+        print(e)
+        return
+    if decoder:
+        if last_chunk := decoder.decode(b'', final=True):
+            yield last_chunk
+
+def iter_item_lines(item_id, decode=True):
+    """
+    Stream the lines of an item
+    """
+    item_full_path = os.path.join(PASTES_FOLDER, item_id)
+    try:
+        with gzip.open(item_full_path, 'rb') as f:
+            for line in f:
+                yield line.decode() if decode else line
+    except Exception as e:
+        print(e)
+
+def clear_item_content_cache(item_id):
+    item_full_path = os.path.join(PASTES_FOLDER, item_id)
+    content_cache.delete(('str', item_full_path))
+    content_cache.delete(('bytes', item_full_path))
+    r_cache.delete(item_full_path)
 
 def get_item_mimetype(item_id):
     return magic.from_buffer(get_item_content(item_id), mime=True)
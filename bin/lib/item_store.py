@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+# -*-coding:UTF-8 -*
+
+"""
+Item Store
+==========
+
+Storage of the gzipped items received by Global:
+
+- the gzip payload is validated by streaming it through zlib (the CRC32 and
+  the size of the gzip trailer are checked), the content is never kept
+- the items are compared with a digest of the raw gzip payload: a file
+  already saved with the same payload is a duplicate, the contents are only
+  decompressed if the payloads differ
+- the items of a batch are written together: the directories are created
+  once and the files/directories are fsync at the end of the batch
+- local ingest: the producers running on the AIL host (crawler, submitted
+  items, JSON importer) save the gzip file themselves, only the item id and
+  the content digest are sent to the Mixer: '<item id> local:<sha1>'
+"""
+
+import os
+import sys
+import zlib
+
+from hashlib import md5, sha1
+from uuid import uuid4
+
+sys.path.append(os.environ['AIL_BIN'])
+##################################
+# Import Project packages
+##################################
+from lib.exceptions import InvalidGzipError, IncompleteGzipError
+
+CHUNK_SIZE = 64 * 1024
+LOCAL_ITEM_MARKER = 'local:'
+
+def get_payload_digest(payload):
+    """
+    Digest of the raw gzip payload
+    """
+    return sha1(payload).hexdigest()
+
+def get_file_payload_digest(filepath):
+    h = sha1()
+    with open(filepath, 'rb') as f:
+        while chunk := f.read(CHUNK_SIZE):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _iter_gunzip(payload, chunk_size=CHUNK_SIZE):
+    """
+    Iterate over the decompressed chunks of a gzip payload (multiple members),
+    the payload is decompressed by chunks: the memory used is bounded
+
+    :raises: InvalidGzipError, IncompleteGzipError
+    """
+    payload = memoryview(payload)
+    if not payload:
+        raise IncompleteGzipError('Empty gzip payload')
+    while True:
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        end = len(payload)
+        try:
+            for start in range(0, len(payload), chunk_size):
+                data = payload[start:start + chunk_size]
+                while data and not decompressor.eof:
+                    if chunk := decompressor.decompress(data, chunk_size):
+                        yield chunk
+                    data = decompressor.unconsumed_tail
+                if decompressor.eof:
+                    end = start + chunk_size
+                    break
+        except zlib.error as e:
+            raise InvalidGzipError(f'Invalid gzip payload: {e}')
+        if not decompressor.eof:
+            raise IncompleteGzipError('Compressed file ended before the end-of-stream marker was reached')
+        # next member
+        payload = decompressor.unused_data + payload[end:]
+        # trailing garbage: zero padding
+        if not payload.strip(b'\x00'):
+            break
+        payload = memoryview(payload)
+
+def check_gzip(payload):
+    """
+    Check a gzip payload (CRC32 and size of the decompressed content)
+
+    :return: size of the decompressed content
+    :raises: InvalidGzipError, IncompleteGzipError
+    """
+    return sum(len(chunk) for chunk in _iter_gunzip(payload))
+
+def get_content_md5(payload):
+    """
+    md5 of the decompressed content of a gzip payload
+
+    :raises: InvalidGzipError, IncompleteGzipError
+    """
+    h = md5()
+    for chunk in _iter_gunzip(payload):
+        h.update(chunk)
+    return h.hexdigest()
+
+def get_content_sha1(payload):
+    """
+    sha1 of the decompressed content of a gzip payload (Mixer digest)
+
+    :raises: InvalidGzipError, IncompleteGzipError
+    """
+    h = sha1()
+    for chunk in _iter_gunzip(payload):
+        h.update(chunk)
+    return h.hexdigest()
+
+def get_file_content_md5(filepath):
+    """
+    md5 of the decompressed content of a gzip file
+
+    :raises: InvalidGzipError, IncompleteGzipError
+    """
+    with open(filepath, 'rb') as f:
+        return get_content_md5(f.read())
+
+def _fsync_dir(dirname):
+    fd = os.open(dirname, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def write_items(items, fsync=True):
+    """
+    Write a batch of gzip files, the directories are created once and
+    the fsync are done at the end of the batch
+
+    :param items: list of (filepath, payload)
+    """
+    dirs = set(os.path.dirname(filepath) for filepath, _ in items)
+    for dirname in dirs:
+        os.makedirs(dirname, exist_ok=True)
+
+    files = []
+    try:
+        for filepath, payload in items:
+            f = open(filepath, 'wb')
+            files.append(f)
+            f.write(payload)
+        if fsync:
+            for f in files:
+                f.flush()
+                os.fsync(f.fileno())
+    finally:
+        for f in files:
+            f.close()
+    if fsync:
+        for dirname in dirs:
+            _fsync_dir(dirname)
+
+## Filenames ##
+
+def get_item_filepath(pastes_folder, item_id):
+    """
+    Filepath of an item, the filenames longer than 255 chars are shortened
+
+    :param pastes_folder: realpath of the pastes directory, with a trailing /
+    :return: filepath, None if outside of the pastes directory (path traversal)
+    """
+    # Remove PASTES_FOLDER from item path (crawled item + submited)
+    if pastes_folder in item_id:
+        item_id = item_id.replace(pastes_folder, '', 1)
+
+    file_name_item = item_id.split('/')[-1]
+    if len(file_name_item) > 255:
+        new_file_name_item = f'{file_name_item[:215]}{str(uuid4())}.gz'
+        item_id = new_file_name_item.join(item_id.rsplit(file_name_item, 1))
+
+    filepath = os.path.realpath(os.path.join(pastes_folder, item_id))
+    if os.path.commonprefix([filepath, pastes_folder]) != pastes_folder:
+        return None
+    return filepath
+
+def check_filename(filepath, payload, pending_items=None):
+    """
+    Check if an item is not a duplicate. The raw gzip payloads are compared
+    first, the decompressed contents are only compared if the payloads are
+    different
+
+    :param pending_items: items not saved yet, filepath: payload
+    :return: filepath, filepath_<content md5> if this filepath is used by
+             another content, None if duplicate
+    :raises: InvalidGzipError, IncompleteGzipError: invalid saved file
+    """
+    if pending_items is None:
+        pending_items = {}
+    if filepath not in pending_items and not os.path.isfile(filepath):
+        return filepath
+
+    if filepath in pending_items:
+        curr_payload_digest = get_payload_digest(pending_items[filepath])
+    else:
+        curr_payload_digest = get_file_payload_digest(filepath)
+    # Same gzip payload
+    if curr_payload_digest == get_payload_digest(payload):
+        return None
+
+    if filepath in pending_items:
+        curr_content_md5 = get_content_md5(pending_items[filepath])
+    else:
+        curr_content_md5 = get_file_content_md5(filepath)
+    new_content_md5 = get_content_md5(payload)
+    # Same content
+    if new_content_md5 == curr_content_md5:
+        return None
+
+    if filepath.endswith('.gz'):
+        filepath = f'{filepath[:-3]}_{new_content_md5}.gz'
+    else:
+        filepath = f'{filepath}_{new_content_md5}'
+    if filepath in pending_items or os.path.isfile(filepath):
+        return None
+    return filepath
+
+## Local ingest ##
+
+def is_local_item_message(payload_field):
+    return payload_field.startswith(LOCAL_ITEM_MARKER)
+
+def create_local_item_message(item_id, content_digest):
+    return f'{item_id} {LOCAL_ITEM_MARKER}{content_digest}'
+
+def save_local_item(pastes_folder, item_id, payload, content_digest=None, fsync=True):
+    """
+    Save an item in the pastes directory, the file is created atomically:
+    written in a temporary file then linked, never overwritten
+
+    :param content_digest: sha1 of the content, computed if None (gzip check)
+    :return: item id saved, content digest or None, None if invalid or duplicate
+    :raises: InvalidGzipError, IncompleteGzipError
+    """
+    filepath = get_item_filepath(pastes_folder, item_id)
+    if not filepath:
+        return None, None
+    if content_digest is None:
+        content_digest = get_content_sha1(payload)
+
+    dirname = os.path.dirname(filepath)
+    os.makedirs(dirname, exist_ok=True)
+    tmp_filepath = os.path.join(dirname, f'.{uuid4()}.tmp')
+    with open(tmp_filepath, 'wb') as f:
+        f.write(payload)
+        if fsync:
+            f.flush()
+            os.fsync(f.fileno())
+    try:
+        while filepath := check_filename(filepath, payload):
+            try:
+                os.link(tmp_filepath, filepath)
+                break
+            # saved by another producer, check again
+            except FileExistsError:
+                continue
+    finally:
+        os.unlink(tmp_filepath)
+    if not filepath:
+        return None, None
+    if fsync:
+        _fsync_dir(dirname)
+    return filepath.replace(pastes_folder, '', 1), content_digest
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# -*-coding:UTF-8 -*
+
+"""
+Module Telemetry
+================
+
+Heartbeat of the module processes. Each process publishes one compact record
+every HEARTBEAT_INTERVAL seconds (background thread) in the hash
+MODULES_HEARTBEATS of the queues Redis:
+
+- throughput (messages/s since the previous heartbeat) and total processed
+- p50/p99 compute latency (ms), measured between two messages fetch
+- last message, start time of the current message, error count
+- the extra stats of the module (ex: slowest regexes), add_stats()
+
+A record older than HEARTBEAT_TTL seconds is a dead process: it is filtered
+out and deleted by the readers, no KEYS scan. The fleet view (queues sizes +
+all the records) is fetched in one pipeline.
+"""
+
+import json
+import threading
+import time
+
+from collections import deque
+
+MODULES_HEARTBEATS = 'modules:heartbeats'
+HEARTBEAT_INTERVAL = 5
+HEARTBEAT_TTL = 60
+NB_LATENCIES = 1000
+
+def _percentile(sorted_values, percent):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(int(len(sorted_values) * percent / 100), len(sorted_values) - 1)]
+
+class ModuleTelemetry(object):
+    """
+    Telemetry of a module process
+
+    :param r_queues: queues Redis
+    :param module_name: module/queue name
+    :param pid: process id
+    """
+
+    def __init__(self, r_queues, module_name, pid, interval=HEARTBEAT_INTERVAL):
+        self.r_queues = r_queues
+        self.module_name = module_name
+        self.pid = pid
+        self.worker_id = f'{module_name}:{pid}'
+        self.interval = interval
+
+        self.lock = threading.Lock()
+        self.start_time = int(time.time())
+        self.nb_processed = 0
+        self.nb_errors = 0
+        # latency by message, in seconds
+        self.latencies = deque(maxlen=NB_LATENCIES)
+        self.last_message = None
+        self.last_message_path = None
+        self.last_message_time = None
+        # current messages
+        self._messages_start = None
+        self._nb_messages = 0
+
+        self._last_heartbeat = time.time()
+        self._last_nb_processed = 0
+        self._thread = None
+        # record field: function returning the stats (JSON serializable)
+        self._stats = {}
+
+    def start(self):
+        """
+        Start the heartbeat thread
+        """
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='heartbeat', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.heartbeat()
+            # Redis unavailable, retry on next heartbeat
+            except Exception as e:
+                print(f'heartbeat error: {e}')
+            time.sleep(self.interval)
+
+    def start_messages(self, last_message, last_message_path, nb_messages=1):
+        """
+        Messages fetched from the queue: the previous messages are processed
+        """
+        with self.lock:
+            self._end_messages()
+            self._messages_start = time.perf_counter()
+            self._nb_messages = nb_messages
+            self.last_message = last_message
+            self.last_message_path = last_message_path
+            self.last_message_time = int(time.time())
+
+    def end_messages(self):
+        """
+        Empty queue: the previous messages are processed
+        """
+        with self.lock:
+            self._end_messages()
+
+    def _end_messages(self):
+        if self._messages_start is not None:
+            self.latencies.append((time.perf_counter() - self._messages_start) / self._nb_messages)
+            self.nb_processed += self._nb_messages
+            self._messages_start = None
+
+    def add_stats(self, name, get_stats):
+        """
+        Add extra stats to the heartbeat record, get_stats() is called by the
+        heartbeat thread
+        """
+        self._stats[name] = get_stats
+
+    def incr_errors(self):
+        with self.lock:
+            self.nb_errors += 1
+
+    def get_record(self):
+        now = time.time()
+        with self.lock:
+            latencies = sorted(self.latencies)
+            elapsed = now - self._last_heartbeat
+            rate = (self.nb_processed - self._last_nb_processed) / elapsed if elapsed > 0 else 0.0
+            self._last_heartbeat = now
+            self._last_nb_processed = self.nb_processed
+            record = {'module': self.module_name, 'pid': self.pid, 'time': int(now), 'start': self.start_time,
+                      'processed': self.nb_processed, 'rate': round(rate, 2),
+                      'p50': round(_percentile(latencies, 50) * 1000, 2),
+                      'p99': round(_percentile(latencies, 99) * 1000, 2),
+                      'errors': self.nb_errors, 'busy': self._messages_start is not None,
+                      'last': self.last_message, 'last_path': self.last_message_path,
+                      'last_time': self.last_message_time}
+        for name, get_stats in list(self._stats.items()):
+            record[name] = get_stats()
+        return record
+
+    def heartbeat(self):
+        self.r_queues.hset(MODULES_HEARTBEATS, self.worker_id, json.dumps(self.get_record()))
+
+    def delete(self):
+        self.r_queues.hdel(MODULES_HEARTBEATS, self.worker_id)
+
+## Fleet view ##
+
+def get_fleet(r_queues, ttl=HEARTBEAT_TTL):
+    """
+    Get the queues sizes and the heartbeats of all the live module processes
+    in one round trip, the dead processes are deleted
+
+    :return: dict queue name => nb messages, list of heartbeat records sorted by module and pid
+    """
+    pipe = r_queues.pipeline(transaction=False)
+    pipe.hgetall('queues')
+    pipe.hgetall(MODULES_HEARTBEATS)
+    queues, heartbeats = pipe.execute()
+
+    now = time.time()
+    workers = []
+    dead = []
+    for worker_id, record in heartbeats.items():
+        record = json.loads(record)
+        if now - record['time'] > ttl:
+            dead.append(worker_id)
+        else:
+            workers.append(record)
+    if dead:
+        r_queues.hdel(MODULES_HEARTBEATS, *dead)
+    workers.sort(key=lambda record: (record['module'], record['pid']))
+    return queues, workers
+
+def is_worker_alive(r_queues, module_name, pid, ttl=HEARTBEAT_TTL):
+    record = r_queues.hget(MODULES_HEARTBEATS, f'{module_name}:{pid}')
+    return bool(record) and time.time() - json.loads(record)['time'] <= ttl
+
+def delete_worker(r_queues, module_name, pid):
+    r_queues.hdel(MODULES_HEARTBEATS, f'{module_name}:{pid}')
+
+def clear_fleet(r_queues):
+    r_queues.delete(MODULES_HEARTBEATS)
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+# -*-coding:UTF-8 -*
+
+"""
+MX Resolver
+===========
+
+Check if mail domains have a MX record: DNS resolver of the MX records
+(see dns_resolver), all the domains are resolved concurrently.
+
+The results are cached in Redis: valid domains for MX_CACHE_TTL, invalid
+domains (NXDOMAIN, no MX record, invalid name) for MX_NEGATIVE_CACHE_TTL.
+Timeouts and server failures are not cached.
+"""
+
+import os
+import sys
+
+sys.path.append(os.path.join(os.environ['AIL_BIN'], 'lib/'))
+from dns_resolver import DNSResolver
+
+MX_CACHE_TTL = 86400
+MX_NEGATIVE_CACHE_TTL = 3600
+
+class MXResolver(DNSResolver):
+    """
+    :param r_cache: Redis cache
+    :param nameservers: list of DNS servers
+    :param port: DNS port
+    :param max_concurrent: maximum number of queries in flight
+    """
+
+    def __init__(self, r_cache, nameservers, port=53, lifetime=2.0, max_concurrent=100,
+                 ttl=MX_CACHE_TTL, negative_ttl=MX_NEGATIVE_CACHE_TTL):
+        super(MXResolver, self).__init__(r_cache, nameservers, port=port, lifetime=lifetime,
+                                         max_concurrent=max_concurrent, ttl=ttl, negative_ttl=negative_ttl,
+                                         rtypes=('MX',), cache_prefix='dns:mx')
+
+    def get_valid_mx_domains(self, mxdomains):
+        """
+        Check if the mail domains have a MX record
+
+        :param mxdomains: set of mail domains
+        :return: list of valid domains
+        """
+        return list(self.get_records(mxdomains))
@@ -122,6 +122,7 @@ class Item(AbstractObject):
     # TODO: DELETE ITEM CORRELATION + TAGS + METADATA + ...
     def delete(self):
         self._delete()
+        item_basic.clear_item_content_cache(self.id)
         try:
             os.remove(self.get_filename())
             return True
@@ -8,6 +8,7 @@ import datetime
 
 sys.path.append(os.path.join(os.environ['AIL_BIN'], 'lib'))
 import ConfigLoader
+import module_telemetry
 
 config_loader = ConfigLoader.ConfigLoader()
 r_serv_queues = config_loader.get_redis_conn("Redis_Queues")
@@ -24,31 +25,29 @@ def get_all_queues_with_sorted_nb_elem():
     res = sorted(res.items())
     return res
 
-def get_module_pid_by_queue_name(queue_name):
-    return r_serv_queues.smembers(f'MODULE_TYPE_{queue_name}')
+def get_modules_telemetry():
+    """
+    Fleet view: queues sizes and heartbeats of all the live module processes (one round trip)
 
-# # TODO: remove last msg part
-def get_module_last_process_start_time(queue_name, module_pid):
-    if res := r_serv_queues.get(f'MODULE_{queue_name}_{module_pid}'):
-        return res.split(',')[0]
-    return None
-
-def get_module_last_msg(queue_name, module_pid):
-    return r_serv_queues.get(f'MODULE_{queue_name}_{module_pid}_PATH')
+    :return: dict, {'queues': {queue name: nb messages}, 'modules': [heartbeat record]}
+    """
+    queues, workers = module_telemetry.get_fleet(r_serv_queues)
+    return {'queues': queues, 'modules': workers}
 
 def get_all_modules_queues_stats():
+    queues, workers = module_telemetry.get_fleet(r_serv_queues)
+    now = datetime.datetime.now()
     all_modules_queues_stats = []
-    for queue_name, nb_elem_queue in get_all_queues_with_sorted_nb_elem():
-        l_module_pid = get_module_pid_by_queue_name(queue_name)
-        for module_pid in l_module_pid:
-            if last_process_start_time := get_module_last_process_start_time(
-                queue_name, module_pid
-            ):
-                last_process_start_time = datetime.datetime.fromtimestamp(int(last_process_start_time))
-                seconds = int((datetime.datetime.now() - last_process_start_time).total_seconds())
-            else:
-                seconds = 0
-            all_modules_queues_stats.append((queue_name, nb_elem_queue, seconds, module_pid))
+    for worker in workers:
+        queue_name = worker['module']
+        if queue_name not in queues:
+            continue
+        if worker['last_time']:
+            last_process_start_time = datetime.datetime.fromtimestamp(worker['last_time'])
+            seconds = int((now - last_process_start_time).total_seconds())
+        else:
+            seconds = 0
+        all_modules_queues_stats.append((queue_name, queues[queue_name], seconds, worker['pid']))
     return all_modules_queues_stats
 
 
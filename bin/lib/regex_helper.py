@@ -3,99 +3,481 @@
 
 """
 Regex Helper
+============
+
+Run regexes on items content with a timeout.
+
+Each module owns a pool of long-lived regex workers. The item content is
+written once in a shared memory block and read by the workers, the results
+are sent back through a pipe. Only a worker hitting max_time is killed and
+respawned.
+
+The latency and the timeouts of each regex are published in the module
+heartbeat (module_telemetry, 'regex' field): the slowest regexes.
 """
 
+import atexit
 import os
 import re
 import sys
+import time
 import uuid
 
+try:
+    from re import _parser as sre_parse
+except ImportError:
+    import sre_parse
+
+from multiprocessing import Pipe
 from multiprocessing import Process as Proc
+from multiprocessing import resource_tracker
+from multiprocessing import shared_memory
 
 sys.path.append(os.environ['AIL_BIN'])
 from pubsublogger import publisher
 
 sys.path.append(os.path.join(os.environ['AIL_BIN'], 'lib'))
-import ConfigLoader
 import Statistics
 
-## LOAD CONFIG ##
-config_loader = ConfigLoader.ConfigLoader()
-r_serv_cache = config_loader.get_redis_conn("Redis_Cache")
-config_loader = None
-## -- ##
-
 publisher.port = 6380
 publisher.channel = "Script"
 
+# Default number of workers by module
+DEFAULT_POOL_SIZE = 1
+# Number of regexes published in the module heartbeat
+NB_REGEX_STATS = 10
+
 def generate_redis_cache_key(module_name):
     new_uuid = str(uuid.uuid4())
     return f'{module_name}_extracted:{new_uuid}'
 
-def _regex_findall(redis_key, regex, item_content, r_set):
-    all_items = re.findall(regex, item_content)
-    if r_set:
-        if len(all_items) > 1:
-            r_serv_cache.sadd(redis_key, *all_items)
-            r_serv_cache.expire(redis_key, 360)
-        elif all_items:
-            r_serv_cache.sadd(redis_key, all_items[0])
-            r_serv_cache.expire(redis_key, 360)
-    elif len(all_items) > 1:
-        r_serv_cache.lpush(redis_key, *all_items)
-        r_serv_cache.expire(redis_key, 360)
-    elif all_items:
-        r_serv_cache.lpush(redis_key, all_items[0])
-        r_serv_cache.expire(redis_key, 360)
+# # # # # # # # # # # #
+#                     #
+#    REGEX WORKER     #
+#                     #
+# # # # # # # # # # # #
 
-def regex_findall(module_name, redis_key, regex, item_id, item_content, max_time=30, r_set=True):
+def _to_str(match):
+    # keep the old redis cache output: str(tuple) for regex with groups
+    return match if isinstance(match, str) else str(match)
 
-    proc = Proc(target=_regex_findall, args=(redis_key, regex, item_content, r_set, ))
-    try:
-        proc.start()
-        proc.join(max_time)
-        if proc.is_alive():
-            proc.terminate()
-            Statistics.incr_module_timeout_statistic(module_name)
-            err_mess = f"{module_name}: processing timeout: {item_id}"
-            print(err_mess)
-            publisher.info(err_mess)
-            return []
+def _worker_loop(conn):
+    # cache: last shared memory block, decoded
+    shm_name = None
+    content = None
+    regex_cache = {}
+    while True:
+        try:
+            task = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        if task is None:
+            break
+        mode, pattern, flags, task_shm_name, size = task
+        start = time.time()
+        # invalid regex, ...: the error is sent back, the worker keeps running
+        try:
+            if task_shm_name != shm_name:
+                shm_name = None
+                shm = shared_memory.SharedMemory(name=task_shm_name)
+                content = bytes(shm.buf[:size]).decode()
+                shm.close()
+                shm_name = task_shm_name
+
+            regex = regex_cache.get((pattern, flags))
+            if regex is None:
+                regex = re.compile(pattern, flags)
+                regex_cache[(pattern, flags)] = regex
+
+            start = time.time()
+            if mode == 'search':
+                first_occ = regex.search(content)
+                result = first_occ.group() if first_occ else None
+            else:
+                result = [_to_str(match) for match in regex.findall(content)]
+        except Exception as e:
+            conn.send((None, time.time() - start, f'{type(e).__name__}: {e}'))
+            continue
+        conn.send((result, time.time() - start, None))
+
+class RegexWorker(object):
+    """Long-lived regex worker process"""
+
+    def __init__(self):
+        self.conn = None
+        self.proc = None
+        self.start()
+
+    def start(self):
+        self.conn, child_conn = Pipe()
+        self.proc = Proc(target=_worker_loop, args=(child_conn, ), daemon=True)
+        self.proc.start()
+        child_conn.close()
+
+    def kill(self):
+        self.proc.terminate()
+        self.proc.join()
+        self.conn.close()
+
+    def restart(self):
+        self.kill()
+        self.start()
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.proc.join(1)
+        if self.proc.is_alive():
+            self.proc.terminate()
+        self.conn.close()
+
+    def is_alive(self):
+        return self.proc.is_alive()
+
+    def submit(self, mode, regex, shm_name, size):
+        if isinstance(regex, re.Pattern):
+            pattern, flags = regex.pattern, regex.flags
         else:
-            if r_set:
-                all_items = r_serv_cache.smembers(redis_key)
+            pattern, flags = regex, 0
+        try:
+            self.conn.send((mode, pattern, flags, shm_name, size))
+        # dead worker: reported by get_result
+        except (BrokenPipeError, OSError):
+            pass
+
+    def get_result(self, max_time):
+        """
+        Wait max_time for the result of the submitted regex
+
+        :return: (result, regex execution time, error) or None on timeout
+        """
+        try:
+            if self.conn.poll(max_time):
+                return self.conn.recv()
+        except (EOFError, BrokenPipeError, OSError):
+            return None, 0.0, 'regex worker died'
+        return None
+
+class RegexPool(object):
+    """
+    Pool of timeout-enforcing regex workers
+
+    Keep the latency of each regex: get_regex_stats()
+    """
+
+    def __init__(self, module_name, size=DEFAULT_POOL_SIZE):
+        self.module_name = module_name
+        # workers share the resource tracker of the module: shared memory
+        # blocks are registered once and unlinked by the module
+        resource_tracker.ensure_running()
+        self.workers = [RegexWorker() for _ in range(size)]
+        self._shm = None
+        self._shm_size = 0
+        self._content = None
+        # pattern: [nb_calls, total_time, max_time, nb_timeouts]
+        self.regex_stats = {}
+
+    def close(self):
+        for worker in self.workers:
+            worker.stop()
+        self._release_content()
+
+    # -- Shared memory content -- #
+
+    def _release_content(self):
+        if self._shm:
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+        self._content = None
+
+    def _set_content(self, content):
+        # same item: already in shared memory
+        if content is self._content:
+            return
+        self._release_content()
+        b_content = content.encode()
+        self._shm_size = len(b_content)
+        self._shm = shared_memory.SharedMemory(create=True, size=max(self._shm_size, 1))
+        self._shm.buf[:self._shm_size] = b_content
+        self._content = content
+
+    # -- Stats -- #
+
+    def _add_regex_stat(self, regex, duration, timeout=False):
+        pattern = regex.pattern if isinstance(regex, re.Pattern) else regex
+        stats = self.regex_stats.setdefault(pattern, [0, 0.0, 0.0, 0])
+        stats[0] += 1
+        stats[1] += duration
+        if duration > stats[2]:
+            stats[2] = duration
+        if timeout:
+            stats[3] += 1
+
+    def get_regex_stats(self, nb_max=None):
+        """
+        Get the regex latencies, slowest first
+
+        :return: list of dict: pattern, nb_calls, avg_time, max_time, nb_timeouts
+        """
+        regex_stats = []
+        # read by the heartbeat thread
+        for pattern, stats in list(self.regex_stats.items()):
+            nb_calls, total_time, max_time, nb_timeouts = stats
+            regex_stats.append({'pattern': pattern, 'nb_calls': nb_calls,
+                                'avg_time': round(total_time / nb_calls, 6),
+                                'max_time': round(max_time, 6), 'nb_timeouts': nb_timeouts})
+        regex_stats.sort(key=lambda x: x['avg_time'], reverse=True)
+        if nb_max:
+            regex_stats = regex_stats[:nb_max]
+        return regex_stats
+
+    # -- Execution -- #
+
+    def _timeout(self, worker, item_id):
+        worker.restart()
+        Statistics.incr_module_timeout_statistic(self.module_name)
+        err_mess = f"{self.module_name}: processing timeout: {item_id}"
+        print(err_mess)
+        publisher.info(err_mess)
+
+    def _error(self, worker, regex, item_id, error):
+        # dead worker: respawned
+        if not worker.is_alive():
+            worker.restart()
+        pattern = regex.pattern if isinstance(regex, re.Pattern) else regex
+        err_mess = f"{self.module_name}: regex error: {pattern}: {error}: {item_id}"
+        print(err_mess)
+        publisher.error(err_mess)
+
+    def _run(self, mode, regexs, item_id, content, max_time):
+        """
+        Run a list of regex, dispatched on the pool workers
+
+        :return: list of (regex, result), result is None on timeout or error
+        """
+        self._set_content(content)
+        results = []
+        regexs = list(regexs)
+        try:
+            for i in range(0, len(regexs), len(self.workers)):
+                running = []
+                for worker, regex in zip(self.workers, regexs[i:i + len(self.workers)]):
+                    worker.submit(mode, regex, self._shm.name, self._shm_size)
+                    running.append((worker, regex))
+                start = time.time()
+                for worker, regex in running:
+                    remaining = max(max_time - (time.time() - start), 0)
+                    res = worker.get_result(remaining)
+                    if res:
+                        result, duration, error = res
+                        self._add_regex_stat(regex, duration)
+                        if error:
+                            self._error(worker, regex, item_id, error)
+                    else:
+                        result = None
+                        self._add_regex_stat(regex, max_time, timeout=True)
+                        self._timeout(worker, item_id)
+                    results.append((regex, result))
+        except KeyboardInterrupt:
+            print("Caught KeyboardInterrupt, terminating workers")
+            self.close()
+            sys.exit(0)
+        return results
+
+    def findall(self, regex, item_id, content, max_time=30, r_set=True):
+        result = self._run('findall', [regex], item_id, content, max_time)[0][1]
+        if result is None:
+            return []
+        if r_set:
+            return set(result)
+        return result
+
+    def search(self, regex, item_id, content, max_time=30):
+        return self._run('search', [regex], item_id, content, max_time)[0][1]
+
+    def findall_many(self, regexs, item_id, content, max_time=30):
+        """
+        Findall a list of regex in the same content
+
+        :return: list of (regex, list of matches or None on timeout)
+        """
+        return self._run('findall', regexs, item_id, content, max_time)
+
+    def search_many(self, regexs, item_id, content, max_time=30):
+        """
+        Search a list of regex in the same content
+
+        :return: list of (regex, first match or None)
+        """
+        return self._run('search', regexs, item_id, content, max_time)
+
+# # # # # # # # # # # #
+#                     #
+#  MULTI-REGEX MATCH  #
+#                     #
+# # # # # # # # # # # #
+
+def _get_required_literals(parsed):
+    """
+    Get a set of literals, one of them is present in every match of the regex
+
+    :return: set of casefolded literals or None
+    """
+    best = None
+    run = []
+    candidates = []
+    for op, av in list(parsed) + [(None, None)]:
+        if op is sre_parse.LITERAL and av < 128:
+            run.append(chr(av))
+            continue
+        if run:
+            candidates.append({''.join(run).casefold()})
+            run = []
+        if op is sre_parse.SUBPATTERN:
+            candidates.append(_get_required_literals(av[-1]))
+        elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT) and av[0] >= 1:
+            candidates.append(_get_required_literals(av[2]))
+        elif op is sre_parse.BRANCH:
+            branches = [_get_required_literals(branch) for branch in av[1]]
+            if all(branches):
+                candidates.append(set().union(*branches))
+    for literals in candidates:
+        if literals:
+            if best is None or min(map(len, literals)) > min(map(len, best)):
+                best = literals
+    return best
+
+class MultiRegexMatcher(object):
+    """
+    Match a dict of regex in one pass over the content
+
+    1. literal prefilter: one scan with a combined alternation of the literals
+       required by the regexs (overlapping matches with a lookahead)
+    2. only the candidate regexs are searched, with the per-regex timeout of
+       the regex pool
+
+    Regexs without a required literal are always candidates.
+    """
+
+    def __init__(self, dict_regex, regex_pool, min_literal_size=3):
+        self.dict_regex = dict_regex
+        self.regex_pool = regex_pool
+        # regex key: set of literals
+        self.regex_literals = {}
+        self.always_candidates = []
+        all_literals = set()
+        for key, regex in dict_regex.items():
+            if isinstance(regex, re.Pattern):
+                pattern, flags = regex.pattern, regex.flags
             else:
-                all_items = r_serv_cache.lrange(redis_key, 0 ,-1)
-            r_serv_cache.delete(redis_key)
-            proc.terminate()
-            return all_items
-    except KeyboardInterrupt:
-        print("Caught KeyboardInterrupt, terminating workers")
-        proc.terminate()
-        sys.exit(0)
-
-def _regex_search(redis_key, regex, item_content):
-    if first_occ := regex.search(item_content):
-        r_serv_cache.set(redis_key, first_occ)
+                pattern, flags = regex, 0
+            try:
+                literals = _get_required_literals(sre_parse.parse(pattern, flags))
+            except Exception:
+                literals = None
+            if literals and min(map(len, literals)) >= min_literal_size:
+                self.regex_literals[key] = literals
+                all_literals.update(literals)
+            else:
+                self.always_candidates.append(key)
 
-def regex_search(module_name, redis_key, regex, item_id, item_content, max_time=30):
-    proc = Proc(target=_regex_search, args=(redis_key, regex, item_content, ))
-    try:
-        proc.start()
-        proc.join(max_time)
-        if proc.is_alive():
-            proc.terminate()
-            Statistics.incr_module_timeout_statistic(module_name)
-            err_mess = f"{module_name}: processing timeout: {item_id}"
-            print(err_mess)
-            publisher.info(err_mess)
-            return None
+        # literal: all literals found if this literal is found
+        self.literals_closure = {}
+        for literal in all_literals:
+            self.literals_closure[literal] = {l for l in all_literals if l in literal}
+
+        if all_literals:
+            # longest first: the longest literal starting at a position is reported
+            alternation = '|'.join(re.escape(l) for l in sorted(all_literals, key=len, reverse=True))
+            self.prefilter_regex = re.compile(f'(?=({alternation}))', re.IGNORECASE)
         else:
-            first_occ = r_serv_cache.get(redis_key)
-            r_serv_cache.delete(redis_key)
-            proc.terminate()
-            return first_occ
-    except KeyboardInterrupt:
-        print("Caught KeyboardInterrupt, terminating workers")
-        proc.terminate()
-        sys.exit(0)
+            self.prefilter_regex = None
+
+    def get_candidates(self, item_id, content, max_time=30):
+        candidates = list(self.always_candidates)
+        if not self.regex_literals:
+            return candidates
+        res = self.regex_pool.findall_many([self.prefilter_regex], item_id, content, max_time=max_time)[0][1]
+        # prefilter timeout: fallback on all regexs
+        if res is None:
+            return list(self.dict_regex)
+        found = set()
+        for literal in set(res):
+            found.update(self.literals_closure.get(literal.casefold(), ()))
+        for key, literals in self.regex_literals.items():
+            if not found.isdisjoint(literals):
+                candidates.append(key)
+        return candidates
+
+    def match(self, item_id, content, max_time=30):
+        """
+        Get all the regex keys matching the content
+
+        :return: list of regex keys
+        """
+        candidates = self.get_candidates(item_id, content, max_time=max_time)
+        if not candidates:
+            return []
+        regexs = [self.dict_regex[key] for key in candidates]
+        res = self.regex_pool.search_many(regexs, item_id, content, max_time=max_time)
+        return [key for key, (regex, matched) in zip(candidates, res) if matched is not None]
+
+def _trie_to_regex(node):
+    end = '' in node
+    branches = [re.escape(char) + _trie_to_regex(child) for char, child in sorted(node.items()) if char != '']
+    if not branches:
+        return ''
+    if len(branches) == 1 and not end:
+        return branches[0]
+    regex = f'(?:{"|".join(branches)})'
+    if end:
+        regex = f'{regex}?'
+    return regex
+
+def trie_regex(words):
+    """
+    Build a regex matching a list of literals, as a trie:
+    the longest literal is matched at a position
+
+    :return: regex pattern (str)
+    """
+    trie = {}
+    for word in words:
+        if not word:
+            continue
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = True
+    return _trie_to_regex(trie)
+
+## Pool by module ##
+_regex_pools = {}
+
+def get_regex_pool(module_name, size=DEFAULT_POOL_SIZE):
+    regex_pool = _regex_pools.get(module_name)
+    if regex_pool is None:
+        regex_pool = RegexPool(module_name, size=size)
+        _regex_pools[module_name] = regex_pool
+        atexit.register(regex_pool.close)
+    return regex_pool
+
+def get_regex_stats(module_name, nb_max=NB_REGEX_STATS):
+    """
+    Get the slowest regexes of a module, [] if no regex executed
+    """
+    regex_pool = _regex_pools.get(module_name)
+    if regex_pool is None:
+        return []
+    return regex_pool.get_regex_stats(nb_max=nb_max)
+
+def regex_findall(module_name, redis_key, regex, item_id, item_content, max_time=30, r_set=True):
+    # redis_key: deprecated, results are not stored in the Redis cache anymore
+    return get_regex_pool(module_name).findall(regex, item_id, item_content, max_time=max_time, r_set=r_set)
+
+def regex_search(module_name, redis_key, regex, item_id, item_content, max_time=30):
+    # redis_key: deprecated, results are not stored in the Redis cache anymore
+    return get_regex_pool(module_name).search(regex, item_id, item_content, max_time=max_time)
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*-coding:UTF-8 -*
+
+"""
+Sentiment Scorer
+================
+
+VADER sentiment scorer: the lexicon is loaded once, the sentences are scored
+by batch. The sentences of big items can be scored by a pool of processes
+(each process loads the lexicon once).
+"""
+
+import concurrent.futures
+
+from nltk.sentiment.vader import SentimentIntensityAnalyzer
+
+## Process pool ##
+_analyzer = None
+
+def _init_worker(lexicon_file):
+    global _analyzer
+    _analyzer = SentimentIntensityAnalyzer(lexicon_file)
+
+def _score_sentences(sentences):
+    return [_analyzer.polarity_scores(sentence) for sentence in sentences]
+
+## -- ##
+
+def get_avg_score(scores):
+    """
+    Average of the sentences scores, the compound is split in positive and
+    negative sentences
+
+    :return: dict, {'neg', 'neu', 'pos', 'compoundPos', 'compoundNeg'}
+    """
+    avg_score = {'neg': 0.0, 'neu': 0.0, 'pos': 0.0, 'compoundPos': 0.0, 'compoundNeg': 0.0}
+    neg_line = 0
+    pos_line = 0
+    for ss in scores:
+        for k in sorted(ss):
+            if k == 'compound':
+                if ss['neg'] > ss['pos']:
+                    avg_score['compoundNeg'] += ss[k]
+                    neg_line += 1
+                else:
+                    avg_score['compoundPos'] += ss[k]
+                    pos_line += 1
+            else:
+                avg_score[k] += ss[k]
+
+    for k in avg_score:
+        if k == 'compoundPos':
+            avg_score[k] = avg_score[k] / (pos_line if pos_line > 0 else 1)
+        elif k == 'compoundNeg':
+            avg_score[k] = avg_score[k] / (neg_line if neg_line > 0 else 1)
+        else:
+            avg_score[k] = avg_score[k] / (len(scores) if scores else 1)
+    return avg_score
+
+class SentimentScorer(object):
+    """
+    Long lived VADER scorer
+
+    :param lexicon_file: VADER lexicon
+    :param nb_process: size of the process pool, 0: no pool
+    :param min_pool_sentences: minimum number of sentences scored by the pool
+    """
+
+    def __init__(self, lexicon_file, nb_process=0, min_pool_sentences=2000, chunk_size=500):
+        self.lexicon_file = lexicon_file
+        self.analyzer = SentimentIntensityAnalyzer(lexicon_file)
+        self.nb_process = nb_process
+        self.min_pool_sentences = min_pool_sentences
+        self.chunk_size = chunk_size
+        self.pool = None
+        # futures of the sentences being scored
+        self.futures = []
+
+    def _get_pool(self):
+        if self.pool is None:
+            self.pool = concurrent.futures.ProcessPoolExecutor(max_workers=self.nb_process,
+                                                               initializer=_init_worker,
+                                                               initargs=(self.lexicon_file,))
+        return self.pool
+
+    def score_sentences(self, sentences):
+        """
+        Score a list of sentences
+
+        :return: list of VADER scores, {'neg', 'neu', 'pos', 'compound'}
+        """
+        if self.nb_process < 1 or len(sentences) < self.min_pool_sentences:
+            return [self.analyzer.polarity_scores(sentence) for sentence in sentences]
+
+        chunks = [sentences[i:i + self.chunk_size] for i in range(0, len(sentences), self.chunk_size)]
+        self.futures = [self._get_pool().submit(_score_sentences, chunk) for chunk in chunks]
+        scores = []
+        try:
+            for future in self.futures:
+                scores.extend(future.result())
+        # timeout, ...
+        except BaseException:
+            self._cancel_futures()
+            raise
+        self.futures = []
+        return scores
+
+    def _cancel_futures(self):
+        # shutdown(cancel_futures=True): python >= 3.9
+        for future in self.futures:
+            future.cancel()
+        self.futures = []
+
+    def get_avg_score(self, sentences):
+        return get_avg_score(self.score_sentences(sentences))
+
+    def close(self):
+        if self.pool:
+            self._cancel_futures()
+            self.pool.shutdown(wait=False)
+            self.pool = None
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*-coding:UTF-8 -*
+
+"""
+Similarity Index
+================
+
+Candidate search for the Duplicates module, instead of comparing a new hash
+with every hash stored in a month.
+
+ssdeep: two hashes have a non zero score only if they share a 7 characters
+substring at the same block size. Each signature is indexed by its 7-grams
+(after the ssdeep reduction of repeated characters) and its block size.
+
+tlsh: the 64 hex characters body is split in bands, two hashes sharing a band
+are candidates (LSH). Only plausible candidates are returned: two hashes with
+differences in every band are missed, most of the hashes under the
+Duplicates threshold share at least one band.
+
+The index of a month is stored in the ARDB db of this month (monthly
+partition) and can be dropped when the month is out of the duplicates range.
+"""
+
+import re
+
+SSDEEP_ROLLING_WINDOW = 7
+# hex characters by band: 21 bands of 12 bits (6 buckets)
+TLSH_BAND_SIZE = 3
+
+KEY_PREFIX = 'SIMIDX'
+
+# ssdeep: sequences of more than 3 identical characters are reduced to 3
+regex_ssdeep_repeat = re.compile(r'(.)\1{3,}')
+
+def _ssdeep_reduce(signature):
+    return regex_ssdeep_repeat.sub(r'\1\1\1', signature)
+
+def _ssdeep_grams(signature):
+    signature = _ssdeep_reduce(signature)
+    return {signature[i:i + SSDEEP_ROLLING_WINDOW] for i in range(len(signature) - SSDEEP_ROLLING_WINDOW + 1)}
+
+def get_ssdeep_index_keys(ssdeep_hash):
+    try:
+        block_size, sig1, sig2 = ssdeep_hash.split(':', 2)
+        block_size = int(block_size)
+    except ValueError:
+        return set()
+    # sig2 is computed with a block size of 2 * block_size
+    keys = {f'{KEY_PREFIX}:ssdeep:{block_size}:{gram}' for gram in _ssdeep_grams(sig1)}
+    keys.update(f'{KEY_PREFIX}:ssdeep:{block_size * 2}:{gram}' for gram in _ssdeep_grams(sig2.split(',', 1)[0]))
+    return keys
+
+def get_tlsh_index_keys(tlsh_hash, band_size=TLSH_BAND_SIZE):
+    # TLSH 4: 'T1' version prefix
+    if tlsh_hash.startswith('T1'):
+        tlsh_hash = tlsh_hash[2:]
+    # header: checksum, lvalue, q1 q2 ratios
+    body = tlsh_hash[6:]
+    if len(body) != 64:
+        return set()
+    nb_bands = len(body) // band_size
+    return {f'{KEY_PREFIX}:tlsh:{i}:{body[i * band_size:(i + 1) * band_size]}' for i in range(nb_bands)}
+
+def get_index_keys(hash_type, paste_hash):
+    if hash_type == 'ssdeep':
+        return get_ssdeep_index_keys(paste_hash)
+    elif hash_type == 'tlsh':
+        return get_tlsh_index_keys(paste_hash)
+    else:
+        return set()
+
+class SimilarityIndex(object):
+    """
+    Similarity index of a month
+
+    :param r_serv: redis connection of the monthly db
+    """
+
+    def __init__(self, r_serv):
+        self.r_serv = r_serv
+
+    def is_built(self):
+        return self.r_serv.exists(f'{KEY_PREFIX}:built')
+
+    def build(self, hash_types=('ssdeep', 'tlsh')):
+        """
+        Index the hashs already saved in HASHS_<hash_type>
+        """
+        for hash_type in hash_types:
+            pipe = self.r_serv.pipeline(transaction=False)
+            for i, paste_hash in enumerate(self.r_serv.sscan_iter(f'HASHS_{hash_type}', count=1000)):
+                for key in get_index_keys(hash_type, paste_hash):
+                    pipe.sadd(key, paste_hash)
+                if i % 1000 == 999:
+                    pipe.execute()
+            pipe.execute()
+        self.r_serv.set(f'{KEY_PREFIX}:built', 1)
+
+    def add(self, hash_type, paste_hash):
+        keys = get_index_keys(hash_type, paste_hash)
+        if keys:
+            pipe = self.r_serv.pipeline(transaction=False)
+            for key in keys:
+                pipe.sadd(key, paste_hash)
+            pipe.execute()
+
+    def get_candidates(self, hash_type, paste_hash):
+        """
+        Get the hashs that can be similar to paste_hash
+
+        :return: set of hashs
+        """
+        keys = get_index_keys(hash_type, paste_hash)
+        pipe = self.r_serv.pipeline(transaction=False)
+        # identical hash
+        pipe.sismember(f'HASHS_{hash_type}', paste_hash)
+        if keys:
+            pipe.sunion(*keys)
+        res = pipe.execute()
+        candidates = set(res[1]) if keys else set()
+        if res[0]:
+            candidates.add(paste_hash)
+        return candidates
+
+    def drop(self):
+        """
+        Delete the index of this month
+        """
+        keys = []
+        for key in self.r_serv.scan_iter(match=f'{KEY_PREFIX}:*', count=1000):
+            keys.append(key)
+            if len(keys) >= 1000:
+                self.r_serv.delete(*keys)
+                keys = []
+        if keys:
+            self.r_serv.delete(*keys)
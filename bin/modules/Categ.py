@@ -18,6 +18,10 @@ this word will be pushed to this specific channel.
 
 ..note:: The channel will have the name of the file created.
 
+All the categories words are compiled in one regex (trie of literals), one
+scan of the content returns the words found by category. The categories
+files are reloaded when they are modified.
+
 Implementing modules can start here, create your own category file,
 and then create your own module to treat the specific paste matching this
 category.
@@ -37,6 +41,7 @@ import argparse
 import os
 import re
 import sys
+import time
 
 sys.path.append(os.environ['AIL_BIN'])
 ##################################
@@ -44,6 +49,7 @@ sys.path.append(os.environ['AIL_BIN'])
 ##################################
 from modules.abstract_module import AbstractModule
 from packages.Item import Item
+from lib import regex_helper
 
 
 class Categ(AbstractModule):
@@ -62,20 +68,79 @@ class Categ(AbstractModule):
         # default = 1 string
         self.matchingThreshold = self.process.config.getint("Categ", "matchingThreshold")
 
+        self.categories = ['CreditCards', 'Mail', 'Onion', 'Urls', 'Credential', 'Cve', 'ApiKey']
+        # Time in seconds between two checks of the categories files
+        self.reload_check_period = 10
+        self.last_reload_check = 0
+        self.categ_files_mtime = {}
+
         self.reload_categ_words()
         self.redis_logger.info("Script Categ started")
 
-    # # TODO: trigger reload on change ( save last reload time, ...)
+    def get_categ_files_mtime(self):
+        return {categ: os.stat(os.path.join(self.categ_files_dir, categ)).st_mtime_ns for categ in self.categories}
+
+    def check_categ_files(self):
+        """
+        Reload the categories words if a file was modified
+        """
+        if time.time() - self.last_reload_check < self.reload_check_period:
+            return
+        self.last_reload_check = time.time()
+        try:
+            categ_files_mtime = self.get_categ_files_mtime()
+        except OSError as e:
+            self.redis_logger.warning(f'Categ: {e}')
+            return
+        if categ_files_mtime != self.categ_files_mtime:
+            self.reload_categ_words()
+            self.redis_logger.info('Categ: categories words reloaded')
+            print('Categories words reloaded')
+
     def reload_categ_words(self):
-        categories = ['CreditCards', 'Mail', 'Onion', 'Urls', 'Credential', 'Cve', 'ApiKey']
-        tmp_dict = {}
-        for filename in categories:
-            bname = os.path.basename(filename)
-            tmp_dict[bname] = []
-            with open(os.path.join(self.categ_files_dir, filename), 'r') as f:
-                patterns = [f'{re.escape(s.strip())}' for s in f]
-                tmp_dict[bname] = re.compile('|'.join(patterns), re.IGNORECASE)
-        self.categ_words = tmp_dict.items()
+        self.categ_files_mtime = self.get_categ_files_mtime()
+        # word: {category: index of the word in the category file}
+        words_categ = {}
+        for categ in self.categories:
+            with open(os.path.join(self.categ_files_dir, categ), 'r') as f:
+                for index, word in enumerate(f):
+                    if word := word.strip().lower():
+                        words_categ.setdefault(word, {}).setdefault(categ, index)
+
+        # prefixes: all the words starting at a position are found with the
+        #           longest one (matched by the trie)
+        # word: {category: length of the word matched}, as with one regex by
+        #       category: the first word of the category file is matched
+        self.words_match = {}
+        for word in words_categ:
+            categ_match = {}
+            for prefix in words_categ:
+                if word.startswith(prefix):
+                    for categ, index in words_categ[prefix].items():
+                        if categ not in categ_match or index < categ_match[categ][0]:
+                            categ_match[categ] = (index, len(prefix))
+            self.words_match[word] = {categ: length for categ, (index, length) in categ_match.items()}
+
+        # lookahead: overlapping words are all found
+        self.categ_regex = re.compile(f'(?=({regex_helper.trie_regex(words_categ)}))', re.IGNORECASE)
+
+    def get_categ_words_found(self, content):
+        """
+        Get the unique words found in the content by category, one scan
+
+        :return: dict, category: set of words
+        """
+        categ_found = {}
+        # non-overlapping matches by category
+        categ_end = {}
+        for match in self.categ_regex.finditer(content):
+            start = match.start()
+            word = match.group(1)
+            for categ, word_len in self.words_match.get(word.lower(), {}).items():
+                if categ_end.get(categ, 0) <= start:
+                    categ_end[categ] = start + word_len
+                    categ_found.setdefault(categ, set()).add(word[:word_len])
+        return categ_found
 
     def compute(self, message, r_result=False):
         # Create Item Object
@@ -84,11 +149,13 @@ class Categ(AbstractModule):
         content = item.get_content()
         categ_found = []
 
+        self.check_categ_files()
+        categ_words_found = self.get_categ_words_found(content)
+
         # Search for pattern categories in item content
-        for categ, pattern in self.categ_words:
+        for categ in self.categories:
 
-            found = set(re.findall(pattern, content))
-            lenfound = len(found)
+            lenfound = len(categ_words_found.get(categ, ()))
             if lenfound >= self.matchingThreshold:
                 categ_found.append(categ)
                 msg = f'{item.get_id()} {lenfound}'
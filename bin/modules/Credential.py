@@ -162,50 +162,76 @@ class Credential(AbstractModule):
                     print(f"=======> Probably on : {discovered_sites}")
 
                 date = datetime.now().strftime("%Y%m")
+                # count by mail domain, decode each domain once
+                maildomains = {}
                 for cred in all_credentials:
-                    maildomains = re.findall("@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,20}", cred.lower())[0]
-                    self.faup.decode(maildomains)
+                    maildomain = re.findall("@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,20}", cred.lower())[0]
+                    maildomains[maildomain] = maildomains.get(maildomain, 0) + 1
+                tlds = {}
+                for maildomain, nb in maildomains.items():
+                    self.faup.decode(maildomain)
                     tld = self.faup.get()['tld']
                     ## TODO: # FIXME: remove me
                     try:
                         tld = tld.decode()
                     except:
                         pass
-                    self.server_statistics.hincrby(f'credential_by_tld:{date}', tld, 1)
+                    tlds[tld] = tlds.get(tld, 0) + nb
+                pipe = self.server_statistics.pipeline(transaction=False)
+                for tld, nb in tlds.items():
+                    pipe.hincrby(f'credential_by_tld:{date}', tld, nb)
+                pipe.execute()
             else:
                 self.redis_logger.info(to_print)
                 print(f'found {nb_cred} credentials')
 
             # For searching credential in termFreq
-            for cred in all_credentials:
-                cred = cred.split('@')[0] #Split to ignore mail address
-
-                # unique number attached to unique path
-                uniq_num_path = self.server_cred.incr(Credential.REDIS_KEY_NUM_PATH)
-                self.server_cred.hmset(Credential.REDIS_KEY_ALL_PATH_SET, {item.get_id(): uniq_num_path})
-                self.server_cred.hmset(Credential.REDIS_KEY_ALL_PATH_SET_REV, {uniq_num_path: item.get_id()})
-
-                # unique number attached to unique username
-                uniq_num_cred = self.server_cred.hget(Credential.REDIS_KEY_ALL_CRED_SET, cred)
-                if uniq_num_cred is None:
-                    # cred do not exist, create new entries
-                    uniq_num_cred = self.server_cred.incr(Credential.REDIS_KEY_NUM_USERNAME)
-                    self.server_cred.hmset(Credential.REDIS_KEY_ALL_CRED_SET, {cred: uniq_num_cred})
-                    self.server_cred.hmset(Credential.REDIS_KEY_ALL_CRED_SET_REV, {uniq_num_cred: cred})
-
-                # Add the mapping between the credential and the path
-                self.server_cred.sadd(
-                    f'{Credential.REDIS_KEY_MAP_CRED_TO_PATH}_{str(uniq_num_cred)}',
-                    uniq_num_path,
-                )
-
-
-                # Split credentials on capital letters, numbers, dots and so on
-                # Add the split to redis, each split point towards its initial credential unique number
-                splitedCred = re.findall(Credential.REGEX_CRED, cred)
-                for partCred in splitedCred:
-                    if len(partCred) > self.minimumLengthThreshold:
-                        self.server_cred.sadd(partCred, uniq_num_cred)
+            self.save_usernames(item.get_id(), all_credentials)
+
+
+    def save_usernames(self, item_id, all_credentials):
+        """
+        Index the usernames and their parts (search by username)
+        The item is saved in one transaction
+        """
+        usernames = list(dict.fromkeys(cred.split('@')[0] for cred in all_credentials)) #Split to ignore mail address
+
+        # unique number attached to unique username
+        uniq_nums = self.server_cred.hmget(Credential.REDIS_KEY_ALL_CRED_SET, usernames)
+        new_usernames = [username for username, uniq_num in zip(usernames, uniq_nums) if uniq_num is None]
+
+        # reserve the unique numbers of the path and of the new usernames
+        last_num = self.server_cred.incrby(Credential.REDIS_KEY_NUM_PATH, len(new_usernames) + 1)
+        uniq_num_path = last_num - len(new_usernames)
+        new_uniq_nums = dict(zip(new_usernames, range(uniq_num_path + 1, last_num + 1)))
+
+        pipe = self.server_cred.pipeline(transaction=True)
+        # unique number attached to unique path
+        pipe.hset(Credential.REDIS_KEY_ALL_PATH_SET, item_id, uniq_num_path)
+        pipe.hset(Credential.REDIS_KEY_ALL_PATH_SET_REV, uniq_num_path, item_id)
+        if new_uniq_nums:
+            # cred do not exist, create new entries
+            pipe.hmset(Credential.REDIS_KEY_ALL_CRED_SET, new_uniq_nums)
+            pipe.hmset(Credential.REDIS_KEY_ALL_CRED_SET_REV, {uniq_num: username for username, uniq_num in new_uniq_nums.items()})
+
+        # username part: set of unique numbers
+        parts = {}
+        for username, uniq_num_cred in zip(usernames, uniq_nums):
+            if uniq_num_cred is None:
+                uniq_num_cred = new_uniq_nums[username]
+
+            # Add the mapping between the credential and the path
+            pipe.sadd(f'{Credential.REDIS_KEY_MAP_CRED_TO_PATH}_{str(uniq_num_cred)}', uniq_num_path)
+
+            # Split credentials on capital letters, numbers, dots and so on
+            # Add the split to redis, each split point towards its initial credential unique number
+            for partCred in re.findall(Credential.REGEX_CRED, username):
+                if len(partCred) > self.minimumLengthThreshold:
+                    parts.setdefault(partCred, set()).add(uniq_num_cred)
+
+        for partCred, uniq_nums_cred in parts.items():
+            pipe.sadd(partCred, *uniq_nums_cred)
+        pipe.execute()
 
 
 if __name__ == '__main__':
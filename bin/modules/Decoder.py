@@ -46,18 +46,22 @@ class Decoder(AbstractModule):
     Decoder module for AIL framework
     """
 
-    # TODO to lambda expr
     def hex_decoder(self, hexStr):
-        #hexStr = ''.join( hex_string.split(" ") )
-        return bytes(bytearray([int(hexStr[i:i+2], 16) for i in range(0, len(hexStr), 2)]))
+        # odd length: the last character is decoded alone
+        if len(hexStr) % 2:
+            return bytes.fromhex(hexStr[:-1]) + bytes([int(hexStr[-1], 16)])
+        return bytes.fromhex(hexStr)
 
 
-    # TODO to lambda expr
     def binary_decoder(self, binary_string):
-        return bytes(bytearray([int(binary_string[i:i+8], 2) for i in range(0, len(binary_string), 8)]))
+        size = len(binary_string) // 8 * 8
+        decoded = int(binary_string[:size], 2).to_bytes(size // 8, 'big') if size else b''
+        # incomplete last byte
+        if size != len(binary_string):
+            decoded += bytes([int(binary_string[size:], 2)])
+        return decoded
 
 
-    # TODO to lambda expr
     def base64_decoder(self, base64_string):
         return base64.b64decode(base64_string)
 
@@ -90,6 +94,11 @@ class Decoder(AbstractModule):
 
         self.decoder_order = [ decoder_base64, decoder_binary, decoder_hexadecimal, decoder_base64]
 
+        # Candidates: all the encoded strings are made of these characters,
+        # the content is scanned once, the decoders only search the candidates
+        self.regex_candidate_min_size = min(decoder['encoded_min_size'] for decoder in self.decoder_order)
+        self.regex_candidate = re.compile(f'[A-Za-z0-9+/=]{{{self.regex_candidate_min_size},}}')
+
         for decoder in self.decoder_order:
             serv_metadata.sadd('all_decoder', decoder['name'])
 
@@ -106,54 +115,79 @@ class Decoder(AbstractModule):
 
         # Extract info from message
         content = Item.get_item_content(obj_id)
-        date = Item.get_item_date(obj_id)
 
+        # candidates spans: list of [start, end] not decoded yet
+        spans = [list(match.span()) for match in self.regex_candidate.finditer(content)]
+
+        # decoded: list of (sha1_string, decoder_name, mimetype, decoded_file)
+        decoded_list = []
+        decoders_found = []
         for decoder in self.decoder_order: # add threshold and size limit
+            if not spans:
+                break
             # max execution time on regex
             signal.alarm(decoder['max_execution_time'])
 
             try:
-                encoded_list = decoder['regex'].findall(content)
+                encoded_list, spans = self.search_encoded(content, spans, decoder['regex'], decoder['encoded_min_size'])
             except TimeoutException:
-                encoded_list = []
                 self.process.incr_module_timeout_statistic() # add encoder type
                 self.redis_logger.debug(f"{obj_id} processing timeout")
                 continue
             else:
                 signal.alarm(0)
 
-                if encoded_list:
-                    content = self.decode_string(content, message, date, encoded_list, decoder['name'], decoder['encoded_min_size'])
-
-
-    def decode_string(self, content, item_id, item_date, encoded_list, decoder_name, encoded_min_size):
-        find = False
+            if encoded_list:
+                decoded_list.extend(self.decode_string(obj_id, encoded_list, decoder['name']))
+                if decoder['name'] not in decoders_found:
+                    decoders_found.append(decoder['name'])
+
+        if decoded_list:
+            Decoded.save_item_decoded(obj_id, decoded_list)
+            for decoder_name in decoders_found:
+                self.set_out_item(decoder_name, obj_id)
+
+
+    def search_encoded(self, content, spans, regex, encoded_min_size):
+        """
+        Search the encoded strings in the candidates spans, the encoded
+        strings are masked: the spans are split around them
+
+        :return: list of encoded strings, remaining spans
+        """
+        encoded_list = []
+        new_spans = []
+        for start, end in spans:
+            for match in regex.finditer(content, start, end):
+                if match.end() - match.start() >= encoded_min_size:
+                    encoded_list.append(match.group())
+                    if match.start() - start >= self.regex_candidate_min_size:
+                        new_spans.append([start, match.start()])
+                    start = match.end()
+            if end - start >= self.regex_candidate_min_size:
+                new_spans.append([start, end])
+        return encoded_list, new_spans
+
+
+    def decode_string(self, item_id, encoded_list, decoder_name):
+        decoded_list = []
         for encoded in encoded_list:
-            if len(encoded) >=  encoded_min_size:
-                decoded_file = self.decoder_function[decoder_name](encoded)
-                find = True
-
-                sha1_string = sha1(decoded_file).hexdigest()
-                mimetype = Decoded.get_file_mimetype(decoded_file)
-                if not mimetype:
-                    self.redis_logger.debug(item_id)
-                    self.redis_logger.debug(sha1_string)
-                    print(item_id)
-                    print(sha1_string)
-                    raise Exception('Invalid mimetype')
-                Decoded.save_decoded_file_content(sha1_string, decoded_file, item_date, mimetype=mimetype)
-                Decoded.save_item_relationship(sha1_string, item_id)
-                Decoded.create_decoder_matadata(sha1_string, item_id, decoder_name)
-
-                #remove encoded from item content
-                content = content.replace(encoded, '', 1)
-
-                self.redis_logger.debug(f'{item_id} : {decoder_name} - {mimetype}')
-                print(f'{item_id} : {decoder_name} - {mimetype}')
-        if(find):
-            self.set_out_item(decoder_name, item_id)
-
-        return content
+            decoded_file = self.decoder_function[decoder_name](encoded)
+
+            sha1_string = sha1(decoded_file).hexdigest()
+            mimetype = Decoded.get_file_mimetype(decoded_file)
+            if not mimetype:
+                self.redis_logger.debug(item_id)
+                self.redis_logger.debug(sha1_string)
+                print(item_id)
+                print(sha1_string)
+                raise Exception('Invalid mimetype')
+            decoded_list.append((sha1_string, decoder_name, mimetype, decoded_file))
+
+            self.redis_logger.debug(f'{item_id} : {decoder_name} - {mimetype}')
+            print(f'{item_id} : {decoder_name} - {mimetype}')
+
+        return decoded_list
 
 
     def set_out_item(self, decoder_name, item_id):
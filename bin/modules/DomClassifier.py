@@ -8,6 +8,9 @@ The DomClassifier Module
 The DomClassifier modules extract and classify Internet domains/hostnames/IP addresses from
 the out output of the Global module.
 
+A message is the set of hosts of an item: '<host>,<host>,... <item id>'. The
+hosts are resolved concurrently, the DNS records are cached (dns_resolver).
+
 """
 
 ##################################
@@ -24,10 +27,12 @@ sys.path.append(os.environ['AIL_BIN'])
 ##################################
 from modules.abstract_module import AbstractModule
 from packages.Item import Item
+from lib.ConfigLoader import ConfigLoader
 
 sys.path.append(os.path.join(os.environ['AIL_BIN'], 'lib'))
 import d4
 import item_basic
+from dns_resolver import DNSResolver
 
 
 class DomClassifier(AbstractModule):
@@ -44,6 +49,7 @@ class DomClassifier(AbstractModule):
         addr_dns = self.process.config.get("DomClassifier", "dns")
 
         self.c = DomainClassifier.domainclassifier.Extract(rawtext="", nameservers=[addr_dns])
+        self.dns_resolver = DNSResolver(ConfigLoader().get_redis_conn("Redis_Cache"), [addr_dns])
 
         self.cc = self.process.config.get("DomClassifier", "cc")
         self.cc_tld = self.process.config.get("DomClassifier", "cc_tld")
@@ -53,7 +59,7 @@ class DomClassifier(AbstractModule):
 
 
     def compute(self, message, r_result=False):
-        host, id = message.split()
+        hosts, id = message.split()
 
         item = Item(id)
         item_basename = item.get_basename()
@@ -61,17 +67,19 @@ class DomClassifier(AbstractModule):
         item_source = item.get_source()
         try:
 
-            self.c.text(rawtext=host)
+            # domains with a valid TLD
+            self.c.text(rawtext=hosts.replace(',', ' '))
             print(self.c.domain)
-            self.c.validdomain(passive_dns=True, extended=False)
+            records = self.dns_resolver.get_passive_dns_records(set(self.c.domain))
+            self.c.vdomain = {dns_record for dns_records in records.values() for dns_record in dns_records}
             #self.redis_logger.debug(self.c.vdomain)
 
             print(self.c.vdomain)
             print()
 
+            # all the DNS records of the item in one message
             if self.c.vdomain and d4.is_passive_dns_enabled():
-                for dns_record in self.c.vdomain:
-                    self.send_message_to_queue(dns_record)
+                self.send_message_to_queue(''.join(sorted(self.c.vdomain)))
 
             if localizeddomains := self.c.include(expression=self.cc_tld):
                 print(localizeddomains)
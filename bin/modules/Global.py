@@ -24,24 +24,22 @@ Requirements
 # Import External packages
 ##################################
 import base64
-import hashlib
-import io
-import gzip
+import binascii
 import os
 import sys
 import time
 import datetime
 import redis
 
-from hashlib import md5
-from uuid import uuid4
-
 sys.path.append(os.environ['AIL_BIN'])
 ##################################
 # Import Project packages
 ##################################
 from modules.abstract_module import AbstractModule
 from lib.ConfigLoader import ConfigLoader
+from lib.exceptions import InvalidGzipError, IncompleteGzipError
+from lib import item_basic
+from lib import item_store
 
 
 class Global(AbstractModule):
@@ -63,6 +61,11 @@ class Global(AbstractModule):
         self.PASTES_FOLDERS = f'{self.PASTES_FOLDER}/'
         self.PASTES_FOLDERS = os.path.join(os.path.realpath(self.PASTES_FOLDERS), '')
 
+        # Items saved by batch: the directories are created and the files
+        # fsync once by batch
+        self.batch_size = self.process.config.getint("Global", "batch_size")
+        self.fsync = self.process.config.getboolean("Global", "fsync")
+
         # Waiting time in secondes between to message proccessed
         self.pending_seconds = 0.5
 
@@ -81,149 +84,188 @@ class Global(AbstractModule):
             self.processed_item = 0
 
 
+    def get_message(self):
+        # items saved by the local producers first (deduplicated by the Mixer)
+        if messages := item_basic.pop_local_ingest_messages(item_basic.GLOBAL_LOCAL_INGEST_QUEUE, 1):
+            return messages[0]
+        return super(Global, self).get_message()
+
+
+    def get_messages(self):
+        messages = item_basic.pop_local_ingest_messages(item_basic.GLOBAL_LOCAL_INGEST_QUEUE, self.batch_size)
+        if len(messages) < self.batch_size:
+            messages.extend(self.process.get_from_set_batch(self.batch_size - len(messages)))
+        return messages
+
+
     def compute(self, message, r_result=False):
+        items_id = self.compute_batch([message])
+        if r_result and items_id:
+            return items_id[0]
+
+
+    def compute_batch(self, messages):
+        """
+        Save a batch of items
+
+        :return: list of the items id saved
+        """
+        # filename: gzip payload
+        items = {}
+        # items saved by a local producer
+        local_items = []
+        for message in messages:
+            try:
+                if self.is_local_item(message):
+                    if filename := self.get_local_item(message):
+                        local_items.append(filename)
+                elif res := self.get_item_to_save(message, items):
+                    filename, payload = res
+                    items[filename] = payload
+            except Exception as err:
+                self._log_compute_error(err, message)
+
+        if items:
+            item_store.write_items(list(items.items()), fsync=self.fsync)
+
+        items_id = []
+        for filename in local_items + list(items):
+            item_id = filename
+            # remove self.PASTES_FOLDER from
+            if self.PASTES_FOLDERS in item_id:
+                item_id = item_id.replace(self.PASTES_FOLDERS, '', 1)
+
+            self.send_message_to_queue(item_id)
+            self.processed_item+=1
+            items_id.append(item_id)
+        return items_id
+
+
+    def is_local_item(self, message):
+        """
+        Item saved by a local producer: '<item id> local:<content digest>',
+        popped from the Global local ingest queue
+        """
+        return isinstance(message, item_basic.LocalItemMessage)
+
+
+    def get_local_item(self, message):
+        """
+        Check a local item: path traversal, saved file
+
+        :return: filename if valid, else None
+        """
+        splitted = message.split()
+        filename = item_store.get_item_filepath(self.PASTES_FOLDERS, splitted[0])
+        if not filename:
+            self.redis_logger.warning(f'Global; Path traversal detected {splitted[0]}')
+            print(f'Global; Path traversal detected {splitted[0]}')
+        elif not os.path.isfile(filename):
+            self.redis_logger.warning(f'Global; Local item not found: {filename}')
+            print(f'Global; Local item not found: {filename}')
+            filename = None
+        return filename
+
+
+    def get_item_to_save(self, message, pending_items):
+        """
+        Check an item: filename, gzip payload, duplicate
+
+        :param pending_items: items of the batch not saved yet, filename: payload
+        :return: (filename, gzip payload) if the item need to be saved, else None
+        """
         # Recovering the streamed message informations
         splitted = message.split()
 
         if len(splitted) == 2:
             item, gzip64encoded = splitted
 
-            # Remove PASTES_FOLDER from item path (crawled item + submited)
-            if self.PASTES_FOLDERS in item:
-                item = item.replace(self.PASTES_FOLDERS, '', 1)
-
-            file_name_item = item.split('/')[-1]
-            if len(file_name_item) > 255:
-                new_file_name_item = f'{file_name_item[:215]}{str(uuid4())}.gz'
-                item = self.rreplace(item, file_name_item, new_file_name_item, 1)
-
             # Creating the full filepath
-            filename = os.path.join(self.PASTES_FOLDER, item)
-            filename = os.path.realpath(filename)
+            filename = item_store.get_item_filepath(self.PASTES_FOLDERS, item)
+
+            # local item not sent by a local producer (feeder, sync, ...)
+            if item_store.is_local_item_message(gzip64encoded):
+                self.redis_logger.warning(f'Global; Untrusted local item {item}')
+                print(f'Global; Untrusted local item {item}')
 
             # Incorrect filename
-            if (
-                os.path.commonprefix([filename, self.PASTES_FOLDER])
-                != self.PASTES_FOLDER
-            ):
-                self.redis_logger.warning(f'Global; Path traversal detected {filename}')
-                print(f'Global; Path traversal detected {filename}')
+            elif not filename:
+                self.redis_logger.warning(f'Global; Path traversal detected {item}')
+                print(f'Global; Path traversal detected {item}')
 
             else:
                 # Decode compressed base64
-                decoded = base64.standard_b64decode(gzip64encoded)
-                if new_file_content := self.gunzip_bytes_obj(filename, decoded):
-                    if filename := self.check_filename(filename, new_file_content):
-                        # create subdir
-                        dirname = os.path.dirname(filename)
-                        if not os.path.exists(dirname):
-                            os.makedirs(dirname)
-
-                        with open(filename, 'wb') as f:
-                            f.write(decoded)
-
-                        item_id = filename
-                        # remove self.PASTES_FOLDER from
-                        if self.PASTES_FOLDERS in item_id:
-                            item_id = item_id.replace(self.PASTES_FOLDERS, '', 1)
-
-                        self.send_message_to_queue(item_id)
-                        self.processed_item+=1
-                        if r_result:
-                            return item_id
+                try:
+                    decoded = base64.standard_b64decode(gzip64encoded)
+                except binascii.Error as e:
+                    self.redis_logger.warning(f'Global; Invalid base64: {filename}, {e}')
+                    print(f'Global; Invalid base64: {filename}, {e}')
+                    return None
+                if self.check_gzip_payload(filename, decoded):
+                    if filename := self.check_filename(filename, decoded, pending_items):
+                        return filename, decoded
 
         else:
             self.redis_logger.debug(f"Empty Item: {message} not processed")
             print(f"Empty Item: {message} not processed")
 
 
-    def check_filename(self, filename, new_file_content):
+    def check_filename(self, filename, payload, pending_items=None):
         """
         Check if file is not a duplicated file
         return the filename if new file, else None
-        """
 
-        # check if file exist
-        if os.path.isfile(filename):
+        The raw gzip payloads are compared first, the decompressed contents are
+        only compared if the payloads are different
+        """
+        if pending_items is None:
+            pending_items = {}
+        try:
+            new_filename = item_store.check_filename(filename, payload, pending_items)
+        except InvalidGzipError as e:
+            # File not unzipped
+            self.log_invalid_file(filename, e)
+            return None
+
+        if new_filename is None:
+            self.redis_logger.debug(f'ignore duplicated file {filename}')
+            print(f'ignore duplicated file {filename}')
+        elif new_filename != filename:
             self.redis_logger.warning(f'File already exist {filename}')
             print(f'File already exist {filename}')
+            self.redis_logger.debug(f'new file to check: {new_filename}')
+        return new_filename
 
-            if curr_file_content := self.gunzip_file(filename):
-                # Compare file content with message content with MD5 checksums
-                curr_file_md5 = md5(curr_file_content).hexdigest()
-                new_file_md5 = md5(new_file_content).hexdigest()
-
-                if new_file_md5 != curr_file_md5:
-                    # MD5 are not equals, verify filename
-                    if filename.endswith('.gz'):
-                        filename = f'{filename[:-3]}_{new_file_md5}.gz'
-                    else:
-                        filename = f'{filename}_{new_file_md5}'
-                    self.redis_logger.debug(f'new file to check: {filename}')
-
-                    if os.path.isfile(filename):
-                        # Ignore duplicate
-                        self.redis_logger.debug(f'ignore duplicated file {filename}')
-                        print(f'ignore duplicated file {filename}')
-                        filename = None
-
-                else:
-                    # Ignore duplicate checksum equals
-                    self.redis_logger.debug(f'ignore duplicated file {filename}')
-                    print(f'ignore duplicated file {filename}')
-                    filename = None
-
-            else:
-                # File not unzipped
-                filename = None
-
-
-        return filename
 
-
-    def gunzip_file(self, filename):
+    def log_invalid_file(self, filename, error):
         """
-        Unzip a file
-        publish stats if failure
+        Saved file not unzipped, publish stats
         """
-        curr_file_content = None
-
-        try:
-            with gzip.open(filename, 'rb') as f:
-                curr_file_content = f.read()
-        except EOFError:
+        if isinstance(error, IncompleteGzipError):
             self.redis_logger.warning(f'Global; Incomplete file: {filename}')
             print(f'Global; Incomplete file: {filename}')
             # save daily stats
             self.r_stats.zincrby('module:Global:incomplete_file', datetime.datetime.now().strftime('%Y%m%d'), 1)
-        except OSError:
+        else:
             self.redis_logger.warning(f'Global; Not a gzipped file: {filename}')
             print(f'Global; Not a gzipped file: {filename}')
             # save daily stats
             self.r_stats.zincrby('module:Global:invalid_file', datetime.datetime.now().strftime('%Y%m%d'), 1)
 
-        return curr_file_content
 
-    # # TODO: add stats incomplete_file/Not a gzipped file 
-    def gunzip_bytes_obj(self, filename, bytes_obj):
-        gunzipped_bytes_obj = None
-        try:
-            in_ = io.BytesIO()
-            in_.write(bytes_obj)
-            in_.seek(0)
+    # # TODO: add stats incomplete_file/Not a gzipped file
+    def check_gzip_payload(self, filename, payload):
+        """
+        Check the gzip payload (trailer CRC32 and size), the content is not kept
 
-            with gzip.GzipFile(fileobj=in_, mode='rb') as fo:
-                gunzipped_bytes_obj = fo.read()
-        except Exception as e:
+        :return: True if valid and not empty
+        """
+        try:
+            return item_store.check_gzip(payload) > 0
+        except InvalidGzipError as e:
             self.redis_logger.warning(f'Global; Invalid Gzip file: {filename}, {e}')
             print(f'Global; Invalid Gzip file: {filename}, {e}')
-
-        return gunzipped_bytes_obj
-
-
-    def rreplace(self, s, old, new, occurrence):
-        li = s.rsplit(old, occurrence)
-        return new.join(li)
+            return False
 
 
 if __name__ == '__main__':
@@ -7,7 +7,8 @@ The Hosts Module
 
 This module is consuming the Redis-list created by the Global module.
 
-It is looking for Hosts
+It is looking for Hosts, the hosts of an item are sent in one message:
+'<host>,<host>,... <item id>'
 
 """
 
@@ -63,10 +64,10 @@ class Hosts(AbstractModule):
         content = item.get_content()
 
         hosts = regex_helper.regex_findall(self.module_name, self.redis_cache_key, self.host_regex, item.get_id(), content)
-        for host in hosts:
-            #print(host)
-
-            msg = f'{host} {item.get_id()}'
+        # unique hosts, keep order
+        hosts = list(dict.fromkeys(hosts))
+        if hosts:
+            msg = f'{",".join(hosts)} {item.get_id()}'
             self.send_message_to_queue(msg, 'Host')
 
 
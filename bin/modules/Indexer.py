@@ -8,14 +8,22 @@ The ZMQ_Sub_Indexer Module
 The ZMQ_Sub_Indexer modules is fetching the list of files to be processed
 and index each file with a full-text indexer (Whoosh until now).
 
+Items are buffered and committed by batch (batch_size or commit_period),
+without merge. The segments are merged in a background thread
+(merge_period), the items stay buffered during a merge. The buffered items
+are committed on shutdown.
+
 """
 ##################################
 # Import External packages
 ##################################
+import atexit
 import time
 import shutil
 import os
+import signal
 import sys
+import threading
 from os.path import join, getsize
 from whoosh.index import create_in, exists_in, open_dir
 from whoosh.fields import Schema, TEXT, ID
@@ -34,9 +42,6 @@ class Indexer(AbstractModule):
     Indexer module for AIL framework
     """
 
-    # Time to wait in seconds between two index's size variable compute
-    TIME_WAIT = 60*15  # sec
-
     def __init__(self):
         """
         Init Instance
@@ -51,11 +56,37 @@ class Indexer(AbstractModule):
         self.indexertype = self.process.config.get("Indexer", "type")
         self.INDEX_SIZE_THRESHOLD = self.process.config.getint(
             "Indexer", "index_max_size")
+        # not AbstractModule.batch_size: messages are popped one by one
+        self.commit_batch_size = self.process.config.getint("Indexer", "batch_size")
+        self.commit_period = self.process.config.getint("Indexer", "commit_period")
+        self.merge_period = self.process.config.getint("Indexer", "merge_period")
 
         self.indexname = None
         self.schema = None
         self.ix = None
 
+        # buffered documents
+        self.documents = []
+        self.first_buffered = None
+
+        # index size: size of the index at the last measure + estimated size
+        # of the items indexed since (bytes indexed * measured size ratio)
+        self.index_size = 0
+        self.bytes_indexed = 0
+        self.size_ratio = 1.0
+
+        # background merge
+        self.index_lock = threading.Lock()
+        self.merge_thread = None
+        self.last_merge = time.time()
+
+        # flush the buffered items when the queue is empty
+        self.pending_seconds = 1
+
+        # commit the buffered items on shutdown
+        atexit.register(self.shutdown)
+        signal.signal(signal.SIGTERM, self.sigterm_handler)
+
         if self.indexertype == "whoosh":
             self.schema = Schema(title=TEXT(stored=True), path=ID(stored=True,
                                                              unique=True),
@@ -94,8 +125,7 @@ class Indexer(AbstractModule):
                     if exists_in(self.indexpath)
                     else create_in(self.indexpath, self.schema)
                 )
-
-            self.last_refresh = time_now
+            self.index_size = self.check_index_size()
 
 
     def compute(self, message):
@@ -108,35 +138,105 @@ class Indexer(AbstractModule):
         self.redis_logger.debug(f"Indexing - {self.indexname}: {docpath}")
         print(f"Indexing - {self.indexname}: {docpath}")
 
+        if self.indexertype == "whoosh":
+            if not self.documents:
+                self.first_buffered = time.time()
+            self.documents.append({'title': docpath, 'path': docpath, 'content': item_content})
+
+            if len(self.documents) >= self.commit_batch_size or time.time() - self.first_buffered >= self.commit_period:
+                self.commit()
+
+    def computeNone(self):
+        # Queue empty, commit the buffered items
+        if self.documents:
+            self.commit()
+
+    def sigterm_handler(self, signum, frame):
+        # stop after the current item, the buffered items are committed (atexit)
+        self.proceed = False
+
+    def shutdown(self):
+        if self.is_merging():
+            self.merge_thread.join()
+        if self.documents:
+            self.commit()
+
+    def is_merging(self):
+        return self.merge_thread is not None and self.merge_thread.is_alive()
+
+    def commit(self):
+        """
+        Commit the buffered items in a new segment (no merge)
+        """
+        # background merge: the index writer is locked, keep the items
+        # buffered (up to 10 batches)
+        if self.is_merging() and len(self.documents) < 10 * self.commit_batch_size:
+            return
+        documents = self.documents
+        self.documents = []
         try:
-            # Avoid calculating the index's size at each message
-            if(time.time() - self.last_refresh > self.TIME_WAIT):
-                self.last_refresh = time.time()
-                if self.check_index_size() >= self.INDEX_SIZE_THRESHOLD*(1000*1000):
-                    timestamp = int(time.time())
-                    self.redis_logger.debug(f"Creating new index {timestamp}")
-                    print(f"Creating new index {timestamp}")
-                    self.indexpath = join(self.baseindexpath, str(timestamp))
-                    self.indexname = str(timestamp)
-                    # update all_index
-                    with open(self.indexRegister_path, "a") as f:
-                        f.write('\n'+str(timestamp))
-                    # create new dir
-                    os.mkdir(self.indexpath)
-                    self.ix = create_in(self.indexpath, self.schema)
-
-            if self.indexertype == "whoosh":
+            with self.index_lock:
                 indexwriter = self.ix.writer()
-                indexwriter.update_document(
-                    title=docpath,
-                    path=docpath,
-                    content=item_content)
-                indexwriter.commit()
+                for document in documents:
+                    indexwriter.update_document(**document)
+                    self.bytes_indexed += len(document['content'])
+                indexwriter.commit(merge=False)
+
+            self.redis_logger.debug(f"Indexing - {self.indexname}: {len(documents)} items committed")
+
+            if self.get_index_size() >= self.INDEX_SIZE_THRESHOLD*(1000*1000):
+                self.rotate_index()
+            elif time.time() - self.last_merge > self.merge_period:
+                self.start_background_merge()
 
         except IOError:
-            self.redis_logger.debug(f"CRC Checksum Failed on: {item_id}")
-            print(f"CRC Checksum Failed on: {item_id}")
-            self.redis_logger.error(f'Duplicate;{item.get_source()};{item.get_date()};{item.get_basename()};CRC Checksum Failed')
+            self.redis_logger.debug(f"CRC Checksum Failed on: {self.indexname}")
+            print(f"CRC Checksum Failed on: {self.indexname}")
+            self.redis_logger.error(f'Indexer;;;;Commit Failed;{self.indexname}')
+
+    def get_index_size(self):
+        """
+        Estimated index size, in bytes
+        """
+        return self.index_size + int(self.bytes_indexed * self.size_ratio)
+
+    def _update_index_size(self):
+        # measure the index size and update the index size/bytes indexed ratio
+        new_size = self.check_index_size()
+        if self.bytes_indexed:
+            self.size_ratio = max(new_size - self.index_size, 0) / self.bytes_indexed
+        self.index_size = new_size
+        self.bytes_indexed = 0
+
+    def _merge(self):
+        with self.index_lock:
+            indexwriter = self.ix.writer()
+            indexwriter.commit(merge=True)
+            self._update_index_size()
+
+    def start_background_merge(self):
+        if self.is_merging():
+            return
+        self.last_merge = time.time()
+        self.merge_thread = threading.Thread(target=self._merge, daemon=True)
+        self.merge_thread.start()
+
+    def rotate_index(self):
+        if self.is_merging():
+            self.merge_thread.join()
+        timestamp = int(time.time())
+        self.redis_logger.debug(f"Creating new index {timestamp}")
+        print(f"Creating new index {timestamp}")
+        self.indexpath = join(self.baseindexpath, str(timestamp))
+        self.indexname = str(timestamp)
+        # update all_index
+        with open(self.indexRegister_path, "a") as f:
+            f.write('\n'+str(timestamp))
+        # create new dir
+        os.mkdir(self.indexpath)
+        self.ix = create_in(self.indexpath, self.schema)
+        self.index_size = 0
+        self.bytes_indexed = 0
 
     def check_index_size(self):
         """
@@ -9,6 +9,9 @@
     This is done because NLTK sentences tokemnizer (sent_tokenize) seems to crash
     for long lines (function _slices_from_text line#1276).
 
+    The VADER lexicon is loaded once (lib/sentiment_scorer.py), the scores are
+    buffered by provider/hour and saved in ARDB_Sentiment by batch.
+
 
     nltk.sentiment.vader module credit:
         Hutto, C.J. & Gilbert, E.E. (2014). VADER: A Parsimonious Rule-based Model for Sentiment Analysis of Social Media Text. Eighth International Conference on Weblogs and Social Media (ICWSM-14). Ann Arbor, MI, June 2014.
@@ -18,6 +21,7 @@
 ##################################
 # Import External packages
 ##################################
+import atexit
 import os
 import sys
 import time
@@ -26,7 +30,6 @@ import calendar
 import redis
 import json
 import signal
-from nltk.sentiment.vader import SentimentIntensityAnalyzer
 from nltk import tokenize, download
 
 sys.path.append(os.environ['AIL_BIN'])
@@ -37,6 +40,7 @@ from modules.abstract_module import AbstractModule
 from packages import Paste
 sys.path.append(os.path.join(os.environ['AIL_BIN'], 'lib/'))
 import ConfigLoader
+from sentiment_scorer import SentimentScorer
 
 
 class TimeoutException(Exception):
@@ -62,12 +66,24 @@ class SentimentAnalysis(AbstractModule):
     def __init__(self):
         super(SentimentAnalysis, self).__init__()
 
-        self.sentiment_lexicon_file = ConfigLoader.ConfigLoader().get_config_str("Directories", "sentiment_lexicon_file")
+        config_loader = ConfigLoader.ConfigLoader()
+        self.sentiment_lexicon_file = config_loader.get_config_str("Directories", "sentiment_lexicon_file")
+        nb_process = config_loader.get_config_int("SentimentAnalysis", "nb_process")
+        self.scorer = SentimentScorer(self.sentiment_lexicon_file, nb_process=nb_process)
 
         # REDIS_LEVEL_DB #
-        self.db = ConfigLoader.ConfigLoader().get_redis_conn("ARDB_Sentiment")
+        self.db = config_loader.get_redis_conn("ARDB_Sentiment")
+
+        # Scores not saved: provider_timestamp: list of scores
+        self.scores_buffer = {}
+        self.nb_buffered = 0
+        self.max_buffered = 100
+        self.flush_period = config_loader.get_config_int("SentimentAnalysis", "flush_period")
+        self.last_flush = time.time()
 
-        self.time1 = time.time()
+        # save the buffered scores on shutdown
+        atexit.register(self.shutdown)
+        signal.signal(signal.SIGTERM, self.sigterm_handler)
 
         # Waiting time in secondes between to message proccessed
         self.pending_seconds = 1
@@ -87,6 +103,56 @@ class SentimentAnalysis(AbstractModule):
         else:
             signal.alarm(0)
 
+        if self.nb_buffered >= self.max_buffered or time.time() - self.last_flush > self.flush_period:
+            self.flush()
+
+
+    def computeNone(self):
+        self.flush()
+
+
+    def sigterm_handler(self, signum, frame):
+        # the buffered scores are saved (atexit)
+        sys.exit(0)
+
+
+    def shutdown(self):
+        self.flush()
+        self.scorer.close()
+
+
+    def flush(self):
+        """
+        Save the buffered scores in ARDB_Sentiment
+        """
+        self.last_flush = time.time()
+        if not self.nb_buffered:
+            return
+
+        # reserve the unique IDs
+        UniqID = self.db.incrby('UniqID', self.nb_buffered) - self.nb_buffered
+
+        # In redis-levelDB: {} = set, () = K-V
+        # {Provider_set -> provider_i}
+        # {Provider_TimestampInHour_i -> UniqID_i}_j
+        # (UniqID_i -> PasteValue_i)
+        pipe = self.db.pipeline(transaction=False)
+        providers = set()
+        for (provider, timestamp), scores in self.scores_buffer.items():
+            providers.add(provider)
+            provider_timestamp = f'{provider}_{str(timestamp)}'
+            uniq_ids = []
+            for avg_score in scores:
+                UniqID += 1
+                uniq_ids.append(UniqID)
+                pipe.set(UniqID, avg_score)
+            pipe.sadd(provider_timestamp, *uniq_ids)
+        pipe.sadd('Provider_set', *providers)
+        pipe.execute()
+
+        self.scores_buffer = {}
+        self.nb_buffered = 0
+
 
     def analyse(self, message):
 
@@ -119,46 +185,11 @@ class SentimentAnalysis(AbstractModule):
                 sentences = tokenize.sent_tokenize(p_content)
 
             if len(sentences) > 0:
-                avg_score = {'neg': 0.0, 'neu': 0.0, 'pos': 0.0, 'compoundPos': 0.0, 'compoundNeg': 0.0}
-                neg_line = 0
-                pos_line = 0
-                sid = SentimentIntensityAnalyzer(self.sentiment_lexicon_file)
-                for sentence in sentences:
-                    ss = sid.polarity_scores(sentence)
-                    for k in sorted(ss):
-                        if k == 'compound':
-                            if ss['neg'] > ss['pos']:
-                                avg_score['compoundNeg'] += ss[k]
-                                neg_line += 1
-                            else:
-                                avg_score['compoundPos'] += ss[k]
-                                pos_line += 1
-                        else:
-                            avg_score[k] += ss[k]
-
-
-                for k in avg_score:
-                    if k == 'compoundPos':
-                        avg_score[k] = avg_score[k] / (pos_line if pos_line > 0 else 1)
-                    elif k == 'compoundNeg':
-                        avg_score[k] = avg_score[k] / (neg_line if neg_line > 0 else 1)
-                    else:
-                        avg_score[k] = avg_score[k] / len(sentences)
-
-
-                # In redis-levelDB: {} = set, () = K-V
-                # {Provider_set -> provider_i}
-                # {Provider_TimestampInHour_i -> UniqID_i}_j
-                # (UniqID_i -> PasteValue_i)
-
-                self.db.sadd('Provider_set', provider)
-
-                provider_timestamp = f'{provider}_{str(timestamp)}'
-                self.db.incr('UniqID')
-                UniqID = self.db.get('UniqID')
-                self.redis_logger.debug(f'{provider_timestamp}->{UniqID}dropped{num_line_removed}lines')
-                self.db.sadd(provider_timestamp, UniqID)
-                self.db.set(UniqID, avg_score)
+                avg_score = self.scorer.get_avg_score(sentences)
+
+                self.redis_logger.debug(f'{provider}_{str(timestamp)}->dropped{num_line_removed}lines')
+                self.scores_buffer.setdefault((provider, timestamp), []).append(avg_score)
+                self.nb_buffered += 1
         else:
             self.redis_logger.debug(f'Dropped:{p_MimeType}')
 
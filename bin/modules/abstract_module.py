@@ -56,9 +56,17 @@ class AbstractModule(ABC):
         # Waiting time in secondes between two proccessed messages
         self.pending_seconds = 10
 
+        # Number of messages popped from the queue at once
+        # 1: one message at a time, compute(message)
+        # >1: batched consumption, compute_batch(messages)
+        self.batch_size = 1
+
         # Setup the I/O queues
         self.process = Process(self.queue_name)
 
+        # slowest regexes in the module heartbeat
+        self.process.telemetry.add_stats('regex', lambda: regex_helper.get_regex_stats(self.module_name))
+
     def get_message(self):
         """
         Get message from the Redis Queue (QueueIn)
@@ -67,6 +75,13 @@ class AbstractModule(ABC):
         """
         return self.process.get_from_set()
 
+    def get_messages(self):
+        """
+        Get a batch of messages (at most self.batch_size) from the Redis Queue (QueueIn)
+        The queue bookkeeping and the statistics are updated once per batch
+        """
+        return self.process.get_from_set_batch(self.batch_size)
+
     def send_message_to_queue(self, message, queue_name=None):
         """
         Send message to queue
@@ -96,26 +111,39 @@ class AbstractModule(ABC):
 
         # Endless loop processing messages from the input queue
         while self.proceed:
-            if message := self.get_message():
+            if self.batch_size > 1:
+                if messages := self.get_messages():
+                    try:
+                        # Module processing with a batch of messages from the queue
+                        self.compute_batch(messages)
+                    except Exception as err:
+                        self._log_compute_error(err, messages)
+                    continue
+            elif message := self.get_message():
                 try:
                     # Module processing with the message from the queue
                     self.compute(message)
                 except Exception as err:
-                    trace = traceback.format_tb(err.__traceback__)
-                    trace = ''.join(trace)
-                    self.redis_logger.critical(f"Error in module {self.module_name}: {err}")
-                    self.redis_logger.critical(f"Module {self.module_name} input message: {message}")
-                    self.redis_logger.critical(trace)
-                    print()
-                    print(f"ERROR: {err}")
-                    print(f'MESSAGE: {message}')
-                    print('TRACEBACK:')
-                    print(trace)
-            else:
-                self.computeNone()
-                # Wait before next process
-                self.redis_logger.debug(f"{self.module_name}, waiting for new message, Idling {self.pending_seconds}s")
-                time.sleep(self.pending_seconds)
+                    self._log_compute_error(err, message)
+                continue
+
+            self.computeNone()
+            # Wait before next process
+            self.redis_logger.debug(f"{self.module_name}, waiting for new message, Idling {self.pending_seconds}s")
+            time.sleep(self.pending_seconds)
+
+    def _log_compute_error(self, err, message):
+        self.process.telemetry.incr_errors()
+        trace = traceback.format_tb(err.__traceback__)
+        trace = ''.join(trace)
+        self.redis_logger.critical(f"Error in module {self.module_name}: {err}")
+        self.redis_logger.critical(f"Module {self.module_name} input message: {message}")
+        self.redis_logger.critical(trace)
+        print()
+        print(f"ERROR: {err}")
+        print(f'MESSAGE: {message}')
+        print('TRACEBACK:')
+        print(trace)
 
 
     def _module_name(self):
@@ -133,6 +161,19 @@ class AbstractModule(ABC):
         pass
 
 
+    def compute_batch(self, messages):
+        """
+        Method of the Module called with a batch of messages (batch_size > 1)
+        Override it to share work between messages, by default compute()
+        is called on each message: an error doesn't drop the rest of the batch
+        """
+        for message in messages:
+            try:
+                self.compute(message)
+            except Exception as err:
+                self._log_compute_error(err, message)
+
+
     def computeNone(self):
         """
         Method of the Module when there is no message
@@ -17,7 +17,6 @@ import sys
 import gzip
 import io
 import redis
-import base64
 import datetime
 import time
 # from sflock.main import unpack
@@ -30,6 +29,7 @@ sys.path.append(os.environ['AIL_BIN'])
 from modules.abstract_module import AbstractModule
 from packages import Tag
 from lib import ConfigLoader
+from lib import item_basic
 
 
 class SubmitPaste(AbstractModule):
@@ -288,14 +288,16 @@ class SubmitPaste(AbstractModule):
             # file not exists in AIL paste directory
             self.redis_logger.debug(f"new paste {paste_content}")
 
-            if gzip64encoded := self._compress_encode_content(paste_content):
-                # use relative path
-                rel_item_path = save_path.replace(self.PASTES_FOLDER, '', 1)
+            # use relative path
+            rel_item_path = save_path.replace(self.PASTES_FOLDER, '', 1)
+
+            if relay_message := self._create_ingest_message(uuid, rel_item_path, paste_content):
+                # local ingest: the item can be saved with another id
+                rel_item_path = relay_message.split(' ', 1)[0]
                 self.redis_logger.debug(f"relative path {rel_item_path}")
 
                 # send paste to Global module
-                relay_message = f"{rel_item_path} {gzip64encoded}"
-                self.process.populate_set_out(relay_message, 'Mixer')
+                item_basic.send_ingest_message(self.process, relay_message)
 
                 # increase nb of paste by feeder name
                 self.r_serv_log_submit.hincrby("mixer_cache:list_feeder", source, 1)
@@ -326,16 +328,15 @@ class SubmitPaste(AbstractModule):
         return False
 
 
-    def _compress_encode_content(self, content):
-        gzip64encoded = None
+    def _create_ingest_message(self, uuid, item_id, content):
+        relay_message = None
 
         try:
-            gzipencoded = gzip.compress(content)
-            gzip64encoded = base64.standard_b64encode(gzipencoded).decode()
+            relay_message = item_basic.get_ingest_message(item_id, gzip.compress(content), content=content)
         except:
             self.abord_file_submission(uuid, "file error")
 
-        return gzip64encoded
+        return relay_message
 
 
     def addError(self, uuid, errorMessage):
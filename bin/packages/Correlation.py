@@ -7,6 +7,7 @@ import redis
 
 sys.path.append(os.path.join(os.environ['AIL_BIN'], 'lib/'))
 import ConfigLoader
+import correlation_graph
 import item_basic
 
 sys.path.append(os.path.join(os.environ['AIL_BIN'], 'packages/'))
@@ -352,6 +353,7 @@ class Correlation(object):
 
     def save_item_correlation(self, subtype, obj_id, item_id, item_date):
         self.update_correlation_daterange(subtype, obj_id, item_date)
+        correlation_graph.delete_graph_cache([(self.correlation_name, subtype, obj_id), ('item', None, item_id)])
 
         # global set
         r_serv_metadata.sadd(
@@ -382,6 +384,7 @@ class Correlation(object):
 
     def delete_item_correlation(self, subtype, obj_id, item_id, item_date):
         #self.update_correlation_daterange(subtype, obj_id, item_date) update daterange ! # # TODO:
+        correlation_graph.delete_graph_cache([(self.correlation_name, subtype, obj_id), ('item', None, item_id)])
         r_serv_metadata.srem(
             f'set_{self.correlation_name}_{subtype}:{obj_id}', item_id
         )
@@ -403,6 +406,7 @@ class Correlation(object):
             r_serv_metadata.zincrby(f'{self.correlation_name}_all:{subtype}', obj_id, -1)
 
     def save_domain_correlation(self, domain, subtype, obj_id):
+        correlation_graph.delete_graph_cache([(self.correlation_name, subtype, obj_id), ('domain', None, domain)])
         r_serv_metadata.sadd(
             f'domain_{self.correlation_name}_{subtype}:{domain}', obj_id
         )
@@ -412,6 +416,7 @@ class Correlation(object):
         )
 
     def delete_domain_correlation(self, domain, subtype, obj_id):
+        correlation_graph.delete_graph_cache([(self.correlation_name, subtype, obj_id), ('domain', None, domain)])
         r_serv_metadata.srem(
             f'domain_{self.correlation_name}_{subtype}:{domain}', obj_id
         )
@@ -492,6 +497,9 @@ class Correlation(object):
         r_serv_metadata.delete(f'{self.correlation_name}_metadata_{subtype}:{obj_id}')
         r_serv_metadata.zrem(f'{self.correlation_name}_all:{subtype}', obj_id)
 
+        # cached graphs containing this object
+        correlation_graph.delete_graph_cache([(self.correlation_name, subtype, obj_id)])
+
         return True
 
     ######## API EXPOSED ########
@@ -31,6 +31,7 @@ from Date import Date
 
 sys.path.append(os.path.join(os.environ['AIL_BIN'], 'lib/'))
 import ConfigLoader
+import crawler_artifacts
 
 class HiddenServices(object):
     """
@@ -338,17 +339,14 @@ class HiddenServices(object):
     def get_all_har(self, l_pastes, filename=False):
         all_har = []
         for item in l_pastes:
+            if not crawler_artifacts.exist_har(item):
+                continue
             if filename:
-                all_har.append((self.get_item_har(item), f'{os.path.basename(item)}.json'))
+                all_har.append((item, f'{os.path.basename(item)}.json'))
             else:
-                all_har.append(self.get_item_har(item))
+                all_har.append(item)
         return all_har
 
-
-    def get_item_har(self, item_path):
-        item_path = item_path.replace(f'{self.paste_crawled_directory_name}/', '', 1)
-        return f'{os.path.join(self.screenshot_directory, item_path)}.json'
-
     def create_domain_basic_archive(self, l_pastes):
         all_har = self.get_all_har(l_pastes, filename=True)
         all_screenshot = self.get_all_domain_screenshot(l_pastes, filename=True)
@@ -362,7 +360,7 @@ class HiddenServices(object):
         with zipfile.ZipFile(zip_buffer, "a") as zf:
 
             #print(all_har)
-            self.write_in_zip_buffer(zf, all_har)
+            self.write_har_in_zip_buffer(zf, all_har)
             self.write_in_zip_buffer(zf, all_screenshot)
             self.write_in_zip_buffer(zf, all_items)
 
@@ -383,6 +381,13 @@ class HiddenServices(object):
                 har_content = f.read()
                 zf.writestr( file_name, BytesIO(har_content).getvalue())
 
+    def write_har_in_zip_buffer(self, zf, list_har):
+        # HAR read by chunks, restored bodies
+        for item_id, file_name in list_har:
+            with zf.open(file_name, 'w') as f:
+                for chunk in crawler_artifacts.iter_har(item_id):
+                    f.write(chunk.encode())
+
     def get_metadata_file(self, list_items):
         file_content = ''
         dict_url = self.get_all_links(list_items)
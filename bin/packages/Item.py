@@ -535,6 +535,7 @@ def delete_item(obj_id):
     r_serv_metadata.delete(f'misp_events:{obj_id}')
     r_serv_metadata.delete(f'hive_cases:{obj_id}')
 
+    item_basic.clear_item_content_cache(obj_id)
     os.remove(get_item_filename(obj_id))
 
     # get all correlation
@@ -633,6 +634,7 @@ class Item(AbstractObject):
     # # WARNING: UNCLEAN DELETE /!\ TEST ONLY /!\
     # TODO: DELETE ITEM CORRELATION + TAGS + METADATA + ...
     def delete(self):
+        item_basic.clear_item_content_cache(self.id)
         try:
             os.remove(self.get_filename())
             return True
@@ -32,6 +32,7 @@ from Hash import Hash
 
 sys.path.append(os.path.join(os.environ['AIL_BIN'], 'lib/'))
 import ConfigLoader
+import item_basic
 
 from langid.langid import LanguageIdentifier, model
 
@@ -75,7 +76,8 @@ class Paste(object):
         self.p_name = os.path.basename(self.p_path)
         self.p_size = round(os.path.getsize(self.p_path)/1024.0, 2)
         self.p_mime = magic.from_buffer("test", mime=True)
-        self.p_mime = magic.from_buffer(self.get_p_content(), mime=True)
+        # the mime type only needs the beginning of the file
+        self.p_mime = magic.from_buffer(next(item_basic.iter_item_content(self.p_path, decode=False), b''), mime=True)
 
         # Assuming that the paste will alway be in a day folder which is itself
         # in a month folder which is itself in a year folder.
@@ -120,25 +122,7 @@ class Paste(object):
 
         """
 
-        try:
-            paste = self.cache.get(self.p_path)
-        except UnicodeDecodeError:
-            paste = None
-        except Exception as e:
-            print(f"ERROR in: {self.p_path}")
-            print(e)
-            paste = None
-
-        if paste is None:
-            try:
-                with gzip.open(self.p_path, 'r') as f:
-                    paste = f.read()
-                    self.cache.set(self.p_path, paste)
-                    self.cache.expire(self.p_path, 300)
-            except:
-                paste = ''
-
-        return str(paste)
+        return item_basic.get_item_content(self.p_path)
 
     def get_p_content_as_file(self):
         return StringIO(self.get_p_content())
@@ -147,9 +131,7 @@ class Paste(object):
         num_line_removed = 0
         line_length_threshold = threshold
         string_content = ""
-        f = self.get_p_content_as_file()
-        line_id = 0
-        for line in f:
+        for line in item_basic.iter_item_lines(self.p_path):
             length = len(line)
 
             if length < line_length_threshold:
@@ -171,14 +153,12 @@ class Paste(object):
         """
         if self.p_nb_lines is None or self.p_max_length_line is None:
             max_length_line = 0
-            f = self.get_p_content_as_file()
             line_id = 0
-            for line_id, line in enumerate(f):
+            for line_id, line in enumerate(item_basic.iter_item_lines(self.p_path)):
                 length = len(line)
                 if length >= max_length_line:
                     max_length_line = length
 
-            f.close()
             self.p_nb_lines = line_id
             self.p_max_length_line = max_length_line
 
@@ -217,8 +197,9 @@ class Paste(object):
         .. seealso:: _set_p_hash_kind("md5")
 
         """
+        content = item_basic.get_item_content_binary(self.p_path)
         for hash_name, the_hash in self.p_hash_kind.items():
-            self.p_hash[hash_name] = the_hash.Calculate(self.get_p_content().encode())
+            self.p_hash[hash_name] = the_hash.Calculate(content)
         return self.p_hash
 
     def _get_p_language(self):
@@ -6,6 +6,8 @@ import sys
 import redis
 import datetime
 
+from hashlib import sha1
+
 sys.path.append(os.path.join(os.environ['AIL_BIN'], 'packages/'))
 import Date
 
@@ -534,6 +536,7 @@ def add_obj_tag(object_type, object_id, tag, obj_date=None):
         # add tag
         r_serv_metadata.sadd('tag:{}'.format(object_id), tag)
         r_serv_tags.sadd('{}:{}'.format(tag, obj_date), object_id)
+        delete_tags_intersections_cache(tag, obj_date)
 
         # add domain tag
         if item_basic.is_crawled(object_id) and tag!='infoleak:submission="crawler"' and tag != 'infoleak:submission="manual"':
@@ -566,6 +569,7 @@ def delete_obj_tag(object_type, object_id, tag, obj_date):
         obj_date = get_obj_date(object_type, object_id)
         r_serv_metadata.srem('tag:{}'.format(object_id), tag)
         r_serv_tags.srem('{}:{}'.format(tag, obj_date), object_id)
+        delete_tags_intersections_cache(tag, obj_date)
     else:
         r_serv_metadata.srem('tag:{}'.format(object_id), tag)
         r_serv_tags.srem('{}:{}'.format(object_type, tag), object_id)
@@ -637,6 +641,81 @@ def get_obj_keys_by_tags(object_type, l_tags, date_day=None):
 def get_obj_by_tag(key_tag):
     return r_serv_tags.smembers(key_tag)
 
+#### TAGS QUERY ####
+# Intersections of tags by day are cached (SINTERSTORE), a cached intersection
+# is deleted if a tag of this day is added/removed
+TAGS_INTERSECTION_TTL = 3600
+
+def get_tags_intersection_key(l_tags, date_day):
+    tags_hash = sha1('\n'.join(sorted(l_tags)).encode()).hexdigest()
+    return f'tags_inter:{date_day}:{tags_hash}'
+
+def get_tags_intersection_index_key(tag, date_day):
+    return f'tags_inter_idx:{tag}:{date_day}'
+
+def delete_tags_intersections_cache(tag, date_day):
+    index_key = get_tags_intersection_index_key(tag, date_day)
+    if l_keys := r_serv_tags.smembers(index_key):
+        r_serv_tags.delete(index_key, *l_keys)
+
+def get_tags_day_intersection(l_tags, date_day):
+    """
+    Compute and cache the intersection of the tags of a day
+
+    :return: number of objects
+    """
+    inter_key = get_tags_intersection_key(l_tags, date_day)
+    pipe = r_serv_tags.pipeline(transaction=False)
+    pipe.sinterstore(inter_key, get_obj_keys_by_tags('item', l_tags, date_day))
+    pipe.expire(inter_key, TAGS_INTERSECTION_TTL)
+    for tag in l_tags:
+        index_key = get_tags_intersection_index_key(tag, date_day)
+        pipe.sadd(index_key, inter_key)
+        pipe.expire(index_key, TAGS_INTERSECTION_TTL)
+    return pipe.execute()[0]
+
+def get_tags_days_cardinality(l_tags, l_dates):
+    """
+    Number of objects tagged by day, in one pipeline: exact for one tag or
+    a cached intersection, else the size of the smallest tag set (max)
+
+    :return: list of [date_day, nb_obj, is_exact]
+    """
+    pipe = r_serv_tags.pipeline(transaction=False)
+    for date_day in l_dates:
+        for set_key in get_obj_keys_by_tags('item', l_tags, date_day):
+            pipe.scard(set_key)
+        if len(l_tags) > 1:
+            inter_key = get_tags_intersection_key(l_tags, date_day)
+            pipe.exists(inter_key)
+            pipe.scard(inter_key)
+    res = pipe.execute()
+
+    days_cardinality = []
+    nb_res = len(l_tags) + 2 if len(l_tags) > 1 else 1
+    for i, date_day in enumerate(l_dates):
+        day_res = res[i * nb_res:(i + 1) * nb_res]
+        nb_min = min(day_res[:len(l_tags)])
+        if len(l_tags) == 1 or nb_min == 0:
+            days_cardinality.append([date_day, nb_min, True])
+        # cached intersection
+        elif day_res[-2]:
+            days_cardinality.append([date_day, day_res[-1], True])
+        else:
+            days_cardinality.append([date_day, nb_min, False])
+    return days_cardinality
+
+def get_tags_day_obj(l_tags, date_day):
+    if len(l_tags) < 2:
+        l_obj = get_obj_by_tag(get_obj_keys_by_tags('item', l_tags, date_day)[0])
+    else:
+        l_obj = r_serv_tags.smembers(get_tags_intersection_key(l_tags, date_day))
+        # expired
+        if not l_obj:
+            l_set_keys = get_obj_keys_by_tags('item', l_tags, date_day)
+            l_obj = r_serv_tags.sinter(l_set_keys[0], *l_set_keys[1:])
+    return sorted(l_obj)
+
 def get_obj_by_tags(object_type, l_tags, date_from=None, date_to=None, nb_obj=50, page=1): # remove old object
     # with daterange
     l_tagged_obj = []
@@ -645,45 +724,46 @@ def get_obj_by_tags(object_type, l_tags, date_from=None, date_to=None, nb_obj=50
         date_range = sanitise_tags_date_range(l_tags, date_from=date_from, date_to=date_to)
         l_dates = Date.substract_date(date_range['date_from'], date_range['date_to'])
 
-        for date_day in l_dates:
-            l_set_keys = get_obj_keys_by_tags(object_type, l_tags, date_day)
-            # if len(l_set_keys) > nb_obj:
-            #     return l_tagged_obj
-            if len(l_set_keys) < 2:
-                date_day_obj = get_obj_by_tag(l_set_keys[0])
-            else:
-                date_day_obj = r_serv_tags.sinter(l_set_keys[0], *l_set_keys[1:])
+        days_cardinality = get_tags_days_cardinality(l_tags, l_dates)
+        if page < 1:
+            page = 1
+        start = nb_obj*(page -1)
 
-            # next_nb_start = len(l_tagged_obj) + len(date_day_obj) - nb_obj
-            # if next_nb_start > 0:
-            #  get + filter nb_start
-            l_tagged_obj.extend( date_day_obj )
+        # days are read until the page is filled
+        nb_previous = 0
+        for day_cardinality in days_cardinality:
+            if len(l_tagged_obj) >= nb_obj:
+                break
+            date_day, nb_day, is_exact = day_cardinality
+            if nb_day == 0:
+                continue
+            if not is_exact:
+                nb_day = get_tags_day_intersection(l_tags, date_day)
+                day_cardinality[1] = nb_day
+                day_cardinality[2] = True
+            # the page starts in this day
+            if nb_previous + nb_day > start:
+                offset = max(start - nb_previous, 0)
+                date_day_obj = get_tags_day_obj(l_tags, date_day)
+                l_tagged_obj.extend(date_day_obj[offset:offset + nb_obj - len(l_tagged_obj)])
+            nb_previous += nb_day
+
+        # total: exact if all the days were counted
+        nb_all_elem = sum(day_cardinality[1] for day_cardinality in days_cardinality)
+        nb_all_elem_exact = all(day_cardinality[2] for day_cardinality in days_cardinality)
 
-        # handle pagination
-        nb_all_elem = len(l_tagged_obj)
         nb_pages = nb_all_elem / nb_obj
         if not nb_pages.is_integer():
             nb_pages = int(nb_pages)+1
         else:
             nb_pages = int(nb_pages)
-        if page > nb_pages:
-            page = nb_pages
-
-        start = nb_obj*(page -1)
-        if nb_pages > 1:
-            stop = (nb_obj*page)
-            l_tagged_obj = l_tagged_obj[start:stop]
-        # only one page
-        else:
-            stop = nb_all_elem
-            l_tagged_obj = l_tagged_obj[start:]
-
-        if stop > nb_all_elem:
-            stop = nb_all_elem
-        stop = stop -1
+        # page out of range: last page
+        if page > nb_pages and nb_pages > 0:
+            return get_obj_by_tags(object_type, l_tags, date_from=date_from, date_to=date_to, nb_obj=nb_obj, page=nb_pages)
 
         return {"tagged_obj":l_tagged_obj, "date" : date_range,
-                "page":page, "nb_pages":nb_pages, "nb_first_elem":start+1, "nb_last_elem":stop+1, "nb_all_elem":nb_all_elem}
+                "page":page, "nb_pages":nb_pages, "nb_first_elem":start+1, "nb_last_elem":start+len(l_tagged_obj),
+                "nb_all_elem":nb_all_elem, "nb_all_elem_exact":nb_all_elem_exact}
 
     # without daterange
     else:
@@ -35,8 +35,11 @@ special_characters = set('[<>~!?@#$%^&*|()_-+={}":;,.\'\n\r\t]/\\')
 special_characters.add('\\s')
 
 # NLTK tokenizer
-tokenizer = RegexpTokenizer('[\&\~\:\;\,\.\(\)\{\}\|\[\]\\\\/\-/\=\'\"\%\$\?\@\+\#\_\^\<\>\!\*\n\r\t\s]+',
+token_separators = '\&\~\:\;\,\.\(\)\{\}\|\[\]\\\\/\-/\=\'\"\%\$\?\@\+\#\_\^\<\>\!\*\n\r\t\s'
+tokenizer = RegexpTokenizer(f'[{token_separators}]+',
                                     gaps=True, discard_empty=True)
+# same tokens as the NLTK tokenizer, streamed
+token_regex = re.compile(f'[^{token_separators}]+')
 
 def is_valid_uuid_v4(UUID):
     if not UUID:
@@ -100,6 +103,85 @@ def get_text_word_frequency(item_content, filtering=True):
         words_dict[word] += 1
     return words_dict
 
+class TrackedTermIndex(object):
+    """
+    Hashed-token index of the tracked words and words sets
+
+    Find all the tracked words and sets in one streaming pass over the
+    content tokens, without building a word frequency dict.
+    """
+
+    def __init__(self):
+        self.words = set()
+        # set name: (list of words, nb words threshold)
+        self.sets = {}
+        # token: set of tracked terms, ('word', word) or ('set', set name)
+        self.index = defaultdict(set)
+
+    def _add(self, token, term):
+        self.index[token].add(term)
+
+    def _remove(self, token, term):
+        terms = self.index.get(token)
+        if terms:
+            terms.discard(term)
+            if not terms:
+                del self.index[token]
+
+    def update_words(self, words):
+        words = set(words)
+        for word in self.words - words:
+            self._remove(word, ('word', word))
+        for word in words - self.words:
+            self._add(word, ('word', word))
+        self.words = words
+
+    def update_sets(self, sets_list):
+        """
+        :param sets_list: list of (list of words, nb words threshold, set name),
+                          see get_set_tracked_words_list()
+        """
+        new_sets = {elem[2]: (elem[0], elem[1]) for elem in sets_list}
+        for set_name in self.sets:
+            if new_sets.get(set_name) != self.sets[set_name]:
+                for word in self.sets[set_name][0]:
+                    self._remove(word, ('set', set_name))
+        for set_name in new_sets:
+            if self.sets.get(set_name) != new_sets[set_name]:
+                for word in new_sets[set_name][0]:
+                    self._add(word, ('set', set_name))
+        self.sets = new_sets
+
+    def match(self, content):
+        """
+        Get all the tracked words and sets found in the content
+
+        :return: list of words, list of sets name
+        """
+        index = self.index
+        found = defaultdict(set)
+        nb_terms = sum(len(terms) for terms in index.values())
+        nb_found = 0
+        for token in token_regex.finditer(content.lower()):
+            terms = index.get(token.group())
+            if terms:
+                for term in terms:
+                    if token.group() not in found[term]:
+                        found[term].add(token.group())
+                        nb_found += 1
+                # all tracked tokens found
+                if nb_found == nb_terms:
+                    break
+
+        words = []
+        sets_found = []
+        for term_type, term in found:
+            if term_type == 'word':
+                words.append(term)
+            elif len(found[(term_type, term)]) >= self.sets[term][1]:
+                sets_found.append(term)
+        return words, sets_found
+
 # # TODO: create all tracked words
 def get_tracked_words_list():
     return list(r_serv_term.smembers('all:tracker:word'))
@@ -33,6 +33,9 @@ class Template(AbstractModule):
         # Pending time between two computation (computeNone) in seconds
         self.pending_seconds = 10
 
+        # Number of messages popped at once, compute_batch() is called if > 1
+        # self.batch_size = 50
+
         # Send module state to logs
         self.redis_logger.info(f'Module {self.module_name} initialized')
 
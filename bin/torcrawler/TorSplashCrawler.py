@@ -12,13 +12,14 @@ import time
 from hashlib import sha256
 
 from scrapy.spidermiddlewares.httperror import HttpError
+from twisted.internet import reactor, threads
 from twisted.internet.error import DNSLookupError
 from twisted.internet.error import TimeoutError
 from twisted.web._newclient import ResponseNeverReceived
 
 from scrapy import Spider
 from scrapy.linkextractors import LinkExtractor
-from scrapy.crawler import CrawlerProcess, Crawler
+from scrapy.crawler import CrawlerProcess, CrawlerRunner, Crawler
 
 from scrapy_splash import SplashRequest, SplashJsonResponse
 
@@ -26,9 +27,9 @@ sys.path.append(os.environ['AIL_BIN'])
 from Helper import Process
 
 sys.path.append(os.path.join(os.environ['AIL_BIN'], 'lib'))
-import ConfigLoader
 import Screenshot
 import crawlers
+import item_basic
 
 script_cookie = """
 function main(splash, args)
@@ -86,12 +87,8 @@ function main(splash, args)
 end
 """
 
-class TorSplashCrawler():
-
-    def __init__(self, splash_url, crawler_options):
-        self.process = CrawlerProcess({'LOG_ENABLED': True})
-        self.crawler = Crawler(self.TorSplashSpider, {
-            'USER_AGENT': crawler_options['user_agent'], # /!\ overwritten by lua script
+def get_crawler_settings(splash_url, crawler_options):
+    return {'USER_AGENT': crawler_options['user_agent'], # /!\ overwritten by lua script
             'SPLASH_URL': splash_url,
             'ROBOTSTXT_OBEY': False,
             'DOWNLOADER_MIDDLEWARES': {'scrapy_splash.SplashCookiesMiddleware': 723,
@@ -106,7 +103,30 @@ class TorSplashCrawler():
             'CLOSESPIDER_PAGECOUNT': crawler_options['closespider_pagecount'],
             'DEPTH_LIMIT': crawler_options['depth_limit'],
             'SPLASH_COOKIES_DEBUG': False
-            })
+            }
+
+class TorSplashCrawlerRunner():
+    """
+    Crawl domains concurrently in a running reactor (long running crawler service)
+    """
+
+    def __init__(self):
+        self.runner = CrawlerRunner({'LOG_ENABLED': True})
+
+    def crawl(self, splash_url, type, crawler_options, date, requested_mode, url, domain, port, cookies, original_item):
+        """
+        :return: deferred fired with the crawler when the domain is crawled
+        """
+        crawler = Crawler(TorSplashCrawler.TorSplashSpider, get_crawler_settings(splash_url, crawler_options))
+        d = self.runner.crawl(crawler, splash_url=splash_url, type=type, crawler_options=crawler_options, date=date, requested_mode=requested_mode, url=url, domain=domain, port=port, cookies=cookies, original_item=original_item)
+        d.addCallback(lambda _: crawler)
+        return d
+
+class TorSplashCrawler():
+
+    def __init__(self, splash_url, crawler_options):
+        self.process = CrawlerProcess({'LOG_ENABLED': True})
+        self.crawler = Crawler(self.TorSplashSpider, get_crawler_settings(splash_url, crawler_options))
 
     def crawl(self, splash_url, type, crawler_options, date, requested_mode, url, domain, port, cookies, original_item):
         self.process.crawl(self.crawler, splash_url=splash_url, type=type, crawler_options=crawler_options, date=date, requested_mode=requested_mode, url=url, domain=domain, port=port, cookies=cookies, original_item=original_item)
@@ -138,10 +158,6 @@ class TorSplashCrawler():
             self.p = Process(config_section)
             self.item_dir = os.path.join(self.p.config.get("Directories", "crawled"), date_str )
 
-            config_loader = ConfigLoader.ConfigLoader()
-            self.har_dir = os.path.join(config_loader.get_files_directory('har') , date_str )
-            config_loader = None
-
             self.r_serv_log_submit = redis.StrictRedis(
                 host=self.p.config.get("Redis_Log_submit", "host"),
                 port=self.p.config.getint("Redis_Log_submit", "port"),
@@ -149,6 +165,30 @@ class TorSplashCrawler():
                 decode_responses=True)
 
             self.root_key = None
+            # crawl error, read by the crawler service
+            self.crawl_error = None
+
+        def pause_crawl(self, delay):
+            # non blocking: the reactor is shared by all the crawls of the crawler service
+            self.crawler.engine.pause()
+            reactor.callLater(delay, self.crawler.engine.unpause)
+
+        def check_splash(self, url):
+            """
+            Pause the crawl while Splash is checked in a thread, 30s more if
+            Splash is not reachable (restarted)
+            """
+            self.crawler.engine.pause()
+            d = threads.deferToThread(crawlers.is_splash_reachable, self.splash_url)
+            d.addErrback(lambda failure: False)
+            d.addCallback(self.splash_checked, url)
+
+        def splash_checked(self, reachable, url):
+            if reachable:
+                self.crawler.engine.unpause()
+            else:
+                self.logger.error('Splash, ResponseNeverReceived for %s, retry in 30s ...', url)
+                self.pause_crawl(30)
 
         def build_request_arg(self, cookies):
             return {'wait': 10,
@@ -196,7 +236,7 @@ class TorSplashCrawler():
                         father = response.meta['father']
 
                         self.logger.error('Splash, ResponseNeverReceived for %s, retry in 10s ...', url)
-                        time.sleep(10)
+                        self.pause_crawl(10)
                         if 'cookies' in response.data:
                             all_cookies = response.data['cookies'] # # TODO:  use initial cookie ?????
                         else:
@@ -214,6 +254,7 @@ class TorSplashCrawler():
                     else:
                         if self.requested_mode == 'test':
                             crawlers.save_test_ail_crawlers_result(False, 'Connection to proxy refused')
+                        self.crawl_error = 'Connection to proxy refused'
                         print('Connection to proxy refused')
                 elif response.data['error'] == 'network3':
                     if self.requested_mode == 'test':
@@ -264,7 +305,7 @@ class TorSplashCrawler():
                         Screenshot.save_domain_relationship(sha256_string, self.domains[0])
                 # HAR
                 if 'har' in response.data and self.har:
-                    crawlers.save_har(self.har_dir, item_id, response.data['har'])
+                    crawlers.save_har(item_id, response.data['har'])
 
                 le = LinkExtractor(allow_domains=self.domains, unique=True)
                 for link in le.extract_links(response):
@@ -294,10 +335,8 @@ class TorSplashCrawler():
                 father = failure.request.meta['father']
                 l_cookies = self.build_request_arg(failure.request.meta['splash']['args']['cookies'])
 
-                # Check if Splash restarted
-                if not crawlers.is_splash_reachable(self.splash_url):
-                    self.logger.error('Splash, ResponseNeverReceived for %s, retry in 30s ...', url)
-                    time.sleep(30)
+                # Check if Splash restarted, the request is retried after the check
+                self.check_splash(url)
 
                 yield SplashRequest(
                     url,
@@ -313,12 +352,15 @@ class TorSplashCrawler():
                 self.logger.error(failure.getErrorMessage())
 
         def save_crawled_item(self, item_id, item_content):
-            gzip64encoded = crawlers.save_crawled_item(item_id, item_content)
+            relay_message = crawlers.save_crawled_item(item_id, item_content)
+            if not relay_message:
+                return
+            # local ingest: the item can be saved with another id
+            item_id = relay_message.split(' ', 1)[0]
 
             # Send item to queue
             # send paste to Global
-            relay_message = "{0} {1}".format(item_id, gzip64encoded)
-            self.p.populate_set_out(relay_message, 'Mixer')
+            item_basic.send_ingest_message(self.p, relay_message)
 
             # increase nb of paste by feeder name
             self.r_serv_log_submit.hincrby("mixer_cache:list_feeder", "crawler", 1)
@@ -4,24 +4,33 @@
 The Retro_Hunt trackers module
 ===================
 
+The date x source space of a task is split in shards (one source day
+directory). The shards are searched by a pool of workers, the number of
+workers is set by task. Each shard saves its own checkpoint: a paused task
+resumes after the last item analyzed of each shard.
+
+The items are read from the gzip files (raw bytes), not from the cache.
 """
 
 ##################################
 # Import External packages
 ##################################
+import concurrent.futures
+import gzip
 import os
-import re
+import queue
 import sys
+import threading
 import time
 import yara
+import zlib
 
 sys.path.append(os.environ['AIL_BIN'])
 ##################################
 # Import Project packages
 ##################################
 from modules.abstract_module import AbstractModule
-from packages.Item import Item
-from packages.Item import Date
+from lib import item_basic
 from lib import Tracker
 
 import NotificationHelper # # TODO: refractor
@@ -39,16 +48,20 @@ class Retro_Hunt(AbstractModule):
 
         self.full_item_url = self.process.config.get("Notifications", "ail_domain") + "/object/item?id="
 
-        self.refresh_deleta = 10
-        self.last_refresh = 0
+        # save the shard checkpoint every n items
+        self.checkpoint_nb_items = 100
 
         # reset on each loop
         self.task_uuid = None
-        self.date_from = 0
-        self.date_to = 0
-        self.nb_src_done = 0
+        self.tags = []
+        self.nb_shards = 0
+        self.nb_shards_done = 0
+        # shard => fraction of the items analyzed
+        self.shards_progress = {}
         self.progress = 0
-        self.item = None
+        self.stop_event = threading.Event()
+        # items matched by the workers, the tags are sent by the main thread
+        self.matches = queue.Queue()
 
         self.redis_logger.info(f"Module: {self.module_name} Launched")
 
@@ -69,91 +82,144 @@ class Retro_Hunt(AbstractModule):
         timeout = Tracker.get_retro_hunt_task_timeout(task_uuid)
         self.redis_logger.debug(f'{self.module_name}, Retro Hunt rule {task_uuid} timeout {timeout}')
         sources = Tracker.get_retro_hunt_task_sources(task_uuid, r_sort=True)
-
-        self.date_from = Tracker.get_retro_hunt_task_date_from(task_uuid)
-        self.date_to = Tracker.get_retro_hunt_task_date_to(task_uuid)
         self.tags = Tracker.get_retro_hunt_task_tags(task_uuid)
-        curr_date = Tracker.get_retro_hunt_task_current_date(task_uuid)
-        self.nb_src_done = Tracker.get_retro_hunt_task_nb_src_done(task_uuid, sources=sources)
-        self.progress = self.update_progress(sources, curr_date)
-        # iterate on date
-        filter_last = True
-        while int(curr_date) <= int(self.date_to):
-            print(curr_date)
-            dirs_date = Tracker.get_retro_hunt_dir_day_to_analyze(task_uuid, curr_date, filter_last=filter_last, sources=sources)
-            filter_last = False
-            nb_id = 0
-            self.nb_src_done = 0
-            self.update_progress(sources, curr_date)
-            # # TODO: Filter previous item
-            for dir in dirs_date:
-                print(dir)
-                self.redis_logger.debug(f'{self.module_name}, Retro Hunt searching in directory {dir}')
-                l_obj = Tracker.get_items_to_analyze(dir)
-                for id in l_obj:
-                    #print(f'{dir} / {id}')
-                    self.item = Item(id)
-                    # save current item in cache
-                    Tracker.set_cache_retro_hunt_task_id(task_uuid, id)
-
-                    self.redis_logger.debug(f'{self.module_name}, Retro Hunt rule {task_uuid}, searching item {id}')
-
-                    yara_match = rule.match(data=self.item.get_content(), callback=self.yara_rules_match, which_callbacks=yara.CALLBACK_MATCHES, timeout=timeout)
-
-                    # save last item
-                    if nb_id % 10 == 0: # # TODO: Add nb before save in DB
-                        Tracker.set_retro_hunt_last_analyzed(task_uuid, id)
-                    nb_id += 1
-                    self.update_progress(sources, curr_date)
+        nb_workers = Tracker.get_retro_hunt_task_nb_workers(task_uuid)
+
+        # shards: source day dirs
+        shards = Tracker.get_retro_hunt_task_shards(task_uuid, sources=sources)
+        Tracker.init_retro_hunt_shards_checkpoints(task_uuid, shards)
+        checkpoints = Tracker.get_retro_hunt_shards_checkpoints(task_uuid)
+        shards_to_analyze = [(shard, checkpoints.get(shard)) for shard in shards
+                             if checkpoints.get(shard) != Tracker.RETRO_HUNT_SHARD_DONE]
+        self.nb_shards = len(shards)
+        self.nb_shards_done = self.nb_shards - len(shards_to_analyze)
+        self.shards_progress = {}
+        self.stop_event.clear()
+        self.update_progress()
+
+        paused = False
+        with concurrent.futures.ThreadPoolExecutor(max_workers=nb_workers) as executor:
+            shards_to_analyze = iter(shards_to_analyze)
+            running = set()
+            try:
+                while True:
+                    while not self.stop_event.is_set() and len(running) < nb_workers:
+                        shard = next(shards_to_analyze, None)
+                        if not shard:
+                            break
+                        running.add(executor.submit(self.hunt_shard, rule, timeout, *shard))
+                    if not running:
+                        break
+
+                    done, running = concurrent.futures.wait(running, timeout=1,
+                                                            return_when=concurrent.futures.FIRST_COMPLETED)
+                    for future in done:
+                        if future.result():
+                            self.nb_shards_done += 1
+                    self.send_matches_tags()
+                    self.update_progress()
 
                     # PAUSE
-                    self.update_progress(sources, curr_date)
-                    if Tracker.check_retro_hunt_pause(task_uuid):
-                        Tracker.set_retro_hunt_last_analyzed(task_uuid, id)
-                        #self.update_progress(sources, curr_date, save_db=True)
-                        Tracker.pause_retro_hunt_task(task_uuid)
-                        Tracker.clear_retro_hunt_task_cache(task_uuid)
-                        return None
-
-                self.nb_src_done += 1
-                self.update_progress(sources, curr_date)
-            curr_date = Date.date_add_day(curr_date)
-            print('-----')
-
-        self.update_progress(sources, curr_date)
+                    if not self.stop_event.is_set() and Tracker.check_retro_hunt_pause(task_uuid):
+                        self.redis_logger.debug(f'{self.module_name}, pausing Retro Hunt {task_uuid}')
+                        self.stop_event.set()
+                        paused = True
+            # stop the workers, the shards checkpoints are saved
+            except BaseException:
+                self.stop_event.set()
+                raise
+        self.send_matches_tags()
+
+        if paused:
+            Tracker.pause_retro_hunt_task(task_uuid)
+            Tracker.clear_retro_hunt_task_cache(task_uuid)
+            return None
 
         Tracker.set_retro_hunt_task_state(task_uuid, 'completed')
         Tracker.set_retro_hunt_nb_match(task_uuid)
         Tracker.clear_retro_hunt_task_cache(task_uuid)
+        Tracker.delete_retro_hunt_shards_checkpoints(task_uuid)
 
         print(f'Retro Hunt {task_uuid} completed')
         self.redis_logger.warning(f'{self.module_name}, Retro Hunt {task_uuid} completed')
 
         # # TODO: stop
 
-    def update_progress(self, sources, curr_date, save_db=False):
-        progress = Tracker.compute_retro_hunt_task_progress(self.task_uuid, date_from=self.date_from, date_to=self.date_to,
-                                                            sources=sources, curr_date=curr_date, nb_src_done=self.nb_src_done)
+    def hunt_shard(self, rule, timeout, shard, last=None):
+        """
+        Worker: search all the items of a shard (source day dir), stop on pause
+
+        :param last: checkpoint, last item analyzed
+        :return: True if all the items of the shard are analyzed
+        """
+        self.redis_logger.debug(f'{self.module_name}, Retro Hunt searching in directory {shard}')
+        items = Tracker.get_items_to_analyze(shard)
+        if last:
+            # resume after the last item analyzed
+            items = [item_id for item_id in items if item_id > last]
+        last = None
+        for i, item_id in enumerate(items):
+            if self.stop_event.is_set():
+                if last:
+                    Tracker.set_retro_hunt_shard_checkpoint(self.task_uuid, shard, last)
+                self.shards_progress.pop(shard, None)
+                return False
+
+            content = self.get_item_raw_content(item_id)
+            if content:
+                try:
+                    if rule.match(data=content, timeout=timeout):
+                        self.save_match(item_id)
+                except yara.TimeoutError:
+                    self.redis_logger.warning(f'{self.module_name}, Retro Hunt {self.task_uuid} timeout: {item_id}')
+            last = item_id
+
+            if (i + 1) % self.checkpoint_nb_items == 0:
+                Tracker.set_retro_hunt_shard_checkpoint(self.task_uuid, shard, item_id)
+            self.shards_progress[shard] = (i + 1) / len(items)
+
+        Tracker.set_retro_hunt_shard_done(self.task_uuid, shard)
+        self.shards_progress.pop(shard, None)
+        return True
+
+    def get_item_raw_content(self, item_id):
+        """
+        Read the gzip file of an item, the content is not added to the cache
+
+        :return: bytes
+        """
+        try:
+            with open(item_basic.get_item_filepath(item_id), 'rb') as f:
+                return gzip.decompress(f.read())
+        except (OSError, EOFError, zlib.error) as e:
+            self.redis_logger.warning(f'{self.module_name}, Retro Hunt {self.task_uuid} invalid item {item_id}: {e}')
+            return None
+
+    def update_progress(self):
+        if self.nb_shards:
+            progress = (self.nb_shards_done + sum(list(self.shards_progress.values()))) * 100 / self.nb_shards
+            progress = int(progress)
+        else:
+            progress = 100
         if self.progress != progress:
             Tracker.set_cache_retro_hunt_task_progress(self.task_uuid, progress)
             self.progress = progress
-        # if save_db:
-        #     Tracker.set_retro_hunt_task_progress(task_uuid, progress)
 
-    def yara_rules_match(self, data):
-        id = self.item.get_id()
-        #print(data)
-        task_uuid = data['namespace']
+    def save_match(self, item_id):
+        self.redis_logger.info(f'{self.module_name}, Retro hunt {self.task_uuid} match found:    {item_id}')
+        print(f'Retro hunt {self.task_uuid} match found:    {item_id}')
 
-        self.redis_logger.info(f'{self.module_name}, Retro hunt {task_uuid} match found:    {id}')
-        print(f'Retro hunt {task_uuid} match found:    {id}')
+        Tracker.save_retro_hunt_match(self.task_uuid, item_id)
+        self.matches.put(item_id)
 
-        Tracker.save_retro_hunt_match(task_uuid, id)
+    def send_matches_tags(self):
+        while not self.matches.empty():
+            item_id = self.matches.get()
 
-        # Tags
-        for tag in self.tags:
-            msg = f'{tag};{id}'
-            self.send_message_to_queue(msg, 'Tags')
+            # Tags
+            for tag in self.tags:
+                msg = f'{tag};{item_id}'
+                self.send_message_to_queue(msg, 'Tags')
 
         # # Mails
         # mail_to_notify = Tracker.get_tracker_mails(tracker_uuid)
@@ -164,7 +230,6 @@ class Retro_Hunt(AbstractModule):
         #     self.redis_logger.debug(f'Send Mail {mail_subject}')
         #     print(f'Send Mail {mail_subject}')
         #     NotificationHelper.sendEmailNotification(mail, mail_subject, mail_body)
-        return yara.CALLBACK_CONTINUE
 
     def run(self):
         """
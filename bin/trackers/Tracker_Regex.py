@@ -46,6 +46,8 @@ class Tracker_Regex(AbstractModule):
 
         # refresh Tracked Regex
         self.dict_regex_tracked = Term.get_regex_tracked_words_dict()
+        self.regex_pool = regex_helper.get_regex_pool(self.module_name)
+        self.regex_matcher = regex_helper.MultiRegexMatcher(self.dict_regex_tracked, self.regex_pool)
         self.last_refresh = time.time()
 
         self.redis_logger.info(f"Module: {self.module_name} Launched")
@@ -54,6 +56,7 @@ class Tracker_Regex(AbstractModule):
         # refresh Tracked regex
         if self.last_refresh < Tracker.get_tracker_last_updated_by_type('regex'):
             self.dict_regex_tracked = Term.get_regex_tracked_words_dict()
+            self.regex_matcher = regex_helper.MultiRegexMatcher(self.dict_regex_tracked, self.regex_pool)
             self.last_refresh = time.time()
             self.redis_logger.debug('Tracked regex refreshed')
             print('Tracked regex refreshed')
@@ -62,10 +65,9 @@ class Tracker_Regex(AbstractModule):
         item_id = item.get_id()
         item_content = item.get_content()
 
-        for regex in self.dict_regex_tracked:
-            matched = regex_helper.regex_search(self.module_name, self.redis_cache_key, self.dict_regex_tracked[regex], item_id, item_content, max_time=self.max_execution_time)
-            if matched:
-                self.new_tracker_found(regex, 'regex', item)
+        # one pass over the content for all the tracked regex
+        for regex in self.regex_matcher.match(item_id, item_content, max_time=self.max_execution_time):
+            self.new_tracker_found(regex, 'regex', item)
 
     def new_tracker_found(self, tracker, tracker_type, item):
         uuid_list = Tracker.get_tracker_uuid_list(tracker, tracker_type)
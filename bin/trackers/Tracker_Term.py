@@ -54,9 +54,10 @@ class Tracker_Term(AbstractModule):
         self.full_item_url = self.process.config.get("Notifications", "ail_domain") + "/object/item?id="
 
         # loads tracked words
-        self.list_tracked_words = Term.get_tracked_words_list()
+        self.term_index = Term.TrackedTermIndex()
+        self.term_index.update_words(Term.get_tracked_words_list())
         self.last_refresh_word = time.time()
-        self.set_tracked_words_list = Term.get_set_tracked_words_list()
+        self.term_index.update_sets(Term.get_set_tracked_words_list())
         self.last_refresh_set = time.time()
 
         self.redis_logger.info(f"Module: {self.module_name} Launched")
@@ -64,13 +65,13 @@ class Tracker_Term(AbstractModule):
     def compute(self, item_id):
         # refresh Tracked term
         if self.last_refresh_word < Term.get_tracked_term_last_updated_by_type('word'):
-            self.list_tracked_words = Term.get_tracked_words_list()
+            self.term_index.update_words(Term.get_tracked_words_list())
             self.last_refresh_word = time.time()
             self.redis_logger.debug('Tracked word refreshed')
             print('Tracked word refreshed')
 
         if self.last_refresh_set < Term.get_tracked_term_last_updated_by_type('set'):
-            self.set_tracked_words_list = Term.get_set_tracked_words_list()
+            self.term_index.update_sets(Term.get_set_tracked_words_list())
             self.last_refresh_set = time.time()
             self.redis_logger.debug('Tracked set refreshed')
             print('Tracked set refreshed')
@@ -82,38 +83,25 @@ class Tracker_Term(AbstractModule):
 
         signal.alarm(self.max_execution_time)
 
-        dict_words_freq = None
+        words_found = []
+        sets_found = []
         try:
-            dict_words_freq = Term.get_text_word_frequency(item_content)
+            # one pass over the tokens for all tracked words and sets
+            words_found, sets_found = self.term_index.match(item_content)
         except TimeoutException:
             self.redis_logger.warning(f"{item.get_id()} processing timeout")
         else:
             signal.alarm(0)
 
-        if dict_words_freq:
-            # create token statistics
-            # for word in dict_words_freq:
-            #    Term.create_token_statistics(item_date, word, dict_words_freq[word])
-
-            # check solo words
-            ####### # TODO: check if source needed #######
-            for word in self.list_tracked_words:
-                if word in dict_words_freq:
-                    self.new_term_found(word, 'word', item)
-
-            # check words set
-            for elem in self.set_tracked_words_list:
-                list_words = elem[0]
-                nb_words_threshold = elem[1]
-                word_set = elem[2]
-                nb_uniq_word = 0
-
-                for word in list_words:
-                    if word in dict_words_freq:
-                        nb_uniq_word += 1
-                if nb_uniq_word >= nb_words_threshold:
-                    self.new_term_found(word_set, 'set', item)
-            
+        # check solo words
+        ####### # TODO: check if source needed #######
+        for word in words_found:
+            self.new_term_found(word, 'word', item)
+
+        # check words set
+        for word_set in sets_found:
+            self.new_term_found(word_set, 'set', item)
+
     def new_term_found(self, term, term_type, item):
         uuid_list = Term.get_term_uuid_list(term, term_type)
 
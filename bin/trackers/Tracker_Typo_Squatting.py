@@ -53,11 +53,12 @@ class Tracker_Typo_Squatting(AbstractModule):
             self.redis_logger.debug('Tracked typosquatting refreshed')
             print('Tracked typosquatting refreshed')
 
-        host, id = message.split()
+        hosts, id = message.split()
+        hosts = set(hosts.split(','))
 
         # Cast message as Item
         for tracker in self.typosquat_tracked_words_list:
-            if host in self.typosquat_tracked_words_list[tracker]:
+            if not hosts.isdisjoint(self.typosquat_tracked_words_list[tracker]):
                 item = Item(id)
                 self.new_tracker_found(tracker, 'typosquatting', item)
 
@@ -115,4 +116,4 @@ class Tracker_Typo_Squatting(AbstractModule):
 if __name__ == '__main__':
     module = Tracker_Typo_Squatting()
     module.run()
-    #module.compute('g00gle.com tests/2020/01/01/test.gz')
+    #module.compute('g00gle.com,foo.be tests/2020/01/01/test.gz')
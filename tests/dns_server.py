@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import socket
+import threading
+
+import dns.message
+import dns.rcode
+import dns.rdatatype
+import dns.rrset
+
+class LocalDNSServer(threading.Thread):
+    """
+    Stand-in DNS server: the records of *.valid.test, NOERROR without answer
+    for the other record types and for *.nodata.test, NXDOMAIN for the others
+
+    :param records: dict, record type => rdata ({qname} replaced by the query name)
+    """
+
+    def __init__(self, records):
+        super(LocalDNSServer, self).__init__(daemon=True)
+        self.records = records
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(('127.0.0.1', 0))
+        self.port = self.sock.getsockname()[1]
+        self.nb_queries = 0
+
+    def run(self):
+        while True:
+            try:
+                data, addr = self.sock.recvfrom(4096)
+            except OSError:
+                return
+            self.nb_queries += 1
+            query = dns.message.from_wire(data)
+            response = dns.message.make_response(query)
+            qname = query.question[0].name.to_text()
+            rdtype = dns.rdatatype.to_text(query.question[0].rdtype)
+            if qname.endswith('valid.test.'):
+                if rdtype in self.records:
+                    rdata = self.records[rdtype].format(qname=qname)
+                    response.answer.append(dns.rrset.from_text(qname, 300, 'IN', rdtype, rdata))
+            elif not qname.endswith('nodata.test.'):
+                response.set_rcode(dns.rcode.NXDOMAIN)
+            self.sock.sendto(response.to_wire(), addr)
+
+    def stop(self):
+        self.sock.close()
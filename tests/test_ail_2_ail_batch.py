@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import sys
+import unittest
+
+sys.path.append(os.environ['AIL_BIN'])
+
+# project packages
+from core import ail_2_ail
+from core import ail_2_ail_batch
+
+AIL_UUID = 'test-ail-2-ail-batch'
+
+class Test_AIL_2_AIL_Batch(unittest.TestCase):
+
+    def setUp(self):
+        self.r = ail_2_ail.r_serv_sync
+        self.queue_uuid = ail_2_ail.create_sync_queue('test batch queue', max_size=5)
+        self.r.sadd(f'ail:instance:sync_queue:{AIL_UUID}', self.queue_uuid)
+
+    def tearDown(self):
+        self.r.delete(f'ail:instance:sync_queue:{AIL_UUID}')
+        self.r.delete(f'sync:queue:seq:push:{AIL_UUID}', f'sync:queue:pending:push:{AIL_UUID}')
+        self.r.delete(ail_2_ail.get_sync_queue_key(self.queue_uuid, AIL_UUID))
+        shutil.rmtree(ail_2_ail.get_sync_queue_spill_dir(self.queue_uuid, AIL_UUID), ignore_errors=True)
+        ail_2_ail.delete_sync_queue(self.queue_uuid)
+
+    def add_objects(self, nb_objs):
+        for i in range(nb_objs):
+            ail_2_ail.add_object_to_sync_queue(self.queue_uuid, AIL_UUID, {'id': f'obj{i}'}, push=True, pull=False)
+
+    def get_batch_ids(self, batch_size):
+        seq, objs = ail_2_ail.get_sync_queue_batch(AIL_UUID, push=True, batch_size=batch_size)
+        return seq, [obj_dict['id'] for queue_uuid, obj_dict in objs]
+
+    def test_ack_requeue_order(self):
+        self.add_objects(5)
+        seq1, batch1 = self.get_batch_ids(2)
+        seq2, batch2 = self.get_batch_ids(2)
+        self.assertEqual(batch1, ['obj0', 'obj1'])
+        self.assertEqual(batch2, ['obj2', 'obj3'])
+        self.assertEqual(ail_2_ail.get_sync_queue_nb_pending_batch(AIL_UUID), 2)
+
+        # acknowledged batch: not resent
+        self.assertTrue(ail_2_ail.ack_sync_queue_batch(AIL_UUID, seq1))
+        self.assertEqual(ail_2_ail.requeue_sync_queue_pending(AIL_UUID), 2)
+        self.assertEqual(ail_2_ail.get_sync_queue_nb_pending_batch(AIL_UUID), 0)
+        self.assertEqual(self.get_batch_ids(10)[1], ['obj2', 'obj3', 'obj4'])
+
+    def test_requeue_pending_order(self):
+        self.add_objects(5)
+        self.get_batch_ids(2)
+        self.get_batch_ids(2)
+        # connection lost: the batches not acknowledged are resent in order
+        self.assertEqual(ail_2_ail.requeue_sync_queue_pending(AIL_UUID), 4)
+        self.assertEqual(self.get_batch_ids(10)[1], [f'obj{i}' for i in range(5)])
+
+    def test_spill_refill_order(self):
+        # max_size 5: the other objects are spilled to disk
+        ail_2_ail.SYNC_SPILL_SEGMENT_SIZE, segment_size = 30, ail_2_ail.SYNC_SPILL_SEGMENT_SIZE
+        try:
+            self.add_objects(20)
+        finally:
+            ail_2_ail.SYNC_SPILL_SEGMENT_SIZE = segment_size
+        self.assertEqual(self.r.llen(ail_2_ail.get_sync_queue_key(self.queue_uuid, AIL_UUID)), 5)
+        self.assertGreater(ail_2_ail.get_sync_queue_nb_spilled_segments(self.queue_uuid, AIL_UUID), 1)
+
+        objs = []
+        while True:
+            seq, batch = self.get_batch_ids(3)
+            if not batch:
+                break
+            objs.extend(batch)
+            ail_2_ail.ack_sync_queue_batch(AIL_UUID, seq)
+        self.assertEqual(objs, [f'obj{i}' for i in range(20)])
+        self.assertEqual(ail_2_ail.get_sync_queue_nb_spilled_segments(self.queue_uuid, AIL_UUID), 0)
+
+    def test_encode_decode_batch(self):
+        frame = ail_2_ail_batch.encode_batch(3, [{'format': 'ail'}])
+        self.assertEqual(ail_2_ail_batch.decode_batch(frame), (3, [{'format': 'ail'}]))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import base64
+import gzip
+import json
+import os
+import sys
+import unittest
+
+from io import BytesIO
+
+from PIL import Image
+
+sys.path.append(os.environ['AIL_BIN'])
+sys.path.append(os.path.join(os.environ['AIL_BIN'], 'lib'))
+
+# project packages
+import lib.crawler_artifacts as crawler_artifacts
+import lib.Screenshot as Screenshot
+
+def get_b64_png(color, pixel=None, compress_level=6):
+    img = Image.new('RGB', (320, 240), color)
+    for x in range(160):
+        img.putpixel((x, 120), (0, 0, 0))
+    if pixel:
+        img.putpixel(pixel, (255, 255, 255))
+    f = BytesIO()
+    img.save(f, 'PNG', compress_level=compress_level)
+    return base64.standard_b64encode(f.getvalue()).decode()
+
+class Test_Crawler_Artifacts(unittest.TestCase):
+
+    def test_har(self):
+        body = 'var a = 1;\n' * 1000
+        har = {'log': {'version': '1.2', 'entries': [{'response': {'content': {'size': len(body), 'text': body}}},
+                                                     {'response': {'content': {'size': 5, 'text': 'small'}}}]}}
+        har_json = json.dumps(har)
+        item_id = 'crawled/2021/01/01/test_har.onion'
+        crawler_artifacts.save_har(item_id, json.loads(har_json))
+
+        with open(crawler_artifacts.get_har_filepath(item_id), 'rb') as f:
+            self.assertNotIn(body.encode(), f.read())
+        self.assertEqual(json.loads(''.join(crawler_artifacts.iter_har(item_id))), json.loads(har_json))
+        # path traversal
+        self.assertIsNone(crawler_artifacts.iter_har('../../../test_har'))
+
+        # HAR saved in one line
+        with gzip.open(crawler_artifacts.get_har_filepath(item_id), 'wt') as f:
+            json.dump(har, f)
+        self.assertEqual(json.loads(''.join(crawler_artifacts.iter_har(item_id))), json.loads(har_json))
+
+    def test_screenshot_dedup(self):
+        sha256_1 = Screenshot.save_crawled_screeshot(get_b64_png((10, 120, 30)), 5000000)
+        self.addCleanup(Screenshot.delete_screenshot_file, sha256_1)
+        # same pixels, other PNG encoding: same screenshot
+        sha256_2 = Screenshot.save_crawled_screeshot(get_b64_png((10, 120, 30), compress_level=1), 5000000)
+        self.assertEqual(sha256_1, sha256_2)
+        # one pixel: other screenshot, similar
+        sha256_3 = Screenshot.save_crawled_screeshot(get_b64_png((10, 120, 30), pixel=(300, 10)), 5000000)
+        self.addCleanup(Screenshot.delete_screenshot_file, sha256_3)
+        self.assertNotEqual(sha256_1, sha256_3)
+        self.assertTrue(Screenshot.exist_screenshot(sha256_3))
+        self.assertIn(sha256_3, [sha256 for sha256, _ in Screenshot.get_similar_screenshots(sha256_1)])
+
+if __name__ == '__main__':
+    unittest.main()
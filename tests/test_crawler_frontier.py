@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import time
+import unittest
+
+sys.path.append(os.environ['AIL_BIN'])
+
+# project packages
+import lib.crawler_frontier as crawler_frontier
+
+QUEUE_TYPE = 'test_frontier'
+
+class Test_Crawler_Frontier(unittest.TestCase):
+
+    def setUp(self):
+        crawler_frontier.clear(QUEUE_TYPE)
+
+    def tearDown(self):
+        crawler_frontier.clear(QUEUE_TYPE)
+
+    def test_source_fairness(self):
+        # flooding source
+        for i in range(10):
+            crawler_frontier.push(QUEUE_TYPE, 'priority', f'http://flood{i}.onion;flood/2021/01/01/{i}.gz')
+        crawler_frontier.push(QUEUE_TYPE, 'priority', 'http://other.onion;other/2021/01/01/0.gz')
+
+        popped = [crawler_frontier.pop(QUEUE_TYPE, 'priority')[0] for _ in range(2)]
+        self.assertIn('http://other.onion;other/2021/01/01/0.gz', popped)
+        self.assertEqual(crawler_frontier.get_queue_depth(QUEUE_TYPE, 'priority'), 9)
+
+    def test_priority_classes(self):
+        crawler_frontier.push(QUEUE_TYPE, 'default', 'http://default.onion;feeder/0.gz')
+        crawler_frontier.push(QUEUE_TYPE, 'priority', 'http://priority.onion;manual')
+        queue_type, queue_name, message, wait = crawler_frontier.pop_by_queue_types([QUEUE_TYPE])
+        self.assertEqual(queue_name, 'priority')
+        self.assertEqual(message, 'http://priority.onion;manual')
+
+    def test_domain_politeness(self):
+        if crawler_frontier.DOMAIN_CRAWL_DELAY <= 0:
+            self.skipTest('domain_crawl_delay disabled')
+        domain = f'polite{time.time()}.onion'
+        crawler_frontier.push(QUEUE_TYPE, 'discovery', f'http://{domain};feeder/0.gz')
+        crawler_frontier.push(QUEUE_TYPE, 'discovery', f'http://{domain}/page;feeder/1.gz')
+
+        self.assertEqual(crawler_frontier.pop(QUEUE_TYPE, 'discovery')[0], f'http://{domain};feeder/0.gz')
+        # same domain: delayed
+        self.assertEqual(crawler_frontier.pop(QUEUE_TYPE, 'discovery'), (None, None))
+        self.assertEqual(crawler_frontier.get_stats(QUEUE_TYPE)['delayed'], 1)
+        # popped: not queued, delayed: queued
+        self.assertFalse(crawler_frontier.contains(QUEUE_TYPE, f'http://{domain};feeder/0.gz'))
+        self.assertTrue(crawler_frontier.contains(QUEUE_TYPE, f'http://{domain}/page;feeder/1.gz', queue_name='discovery'))
+        self.assertGreater(crawler_frontier.get_next_due_epoch([QUEUE_TYPE]), time.time())
+
+    def test_contains_remove(self):
+        message = 'http://remove.onion;auto'
+        crawler_frontier.push(QUEUE_TYPE, 'priority', message)
+        self.assertTrue(crawler_frontier.contains(QUEUE_TYPE, message))
+        crawler_frontier.remove(QUEUE_TYPE, 'priority', message)
+        self.assertFalse(crawler_frontier.contains(QUEUE_TYPE, message))
+        self.assertIsNone(crawler_frontier.pop_by_queue_types([QUEUE_TYPE]))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import sys
+import threading
+import time
+import unittest
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+# crawler dependencies
+pytest.importorskip('scrapy')
+pytest.importorskip('twisted')
+from twisted.internet import defer, reactor
+
+sys.path.append(os.environ['AIL_BIN'])
+
+# project packages
+import lib.crawlers as crawlers
+sys.path.append(os.path.join(os.environ['AIL_BIN'], 'torcrawler'))
+from TorSplashCrawler import TorSplashCrawlerRunner
+
+class MockSplashHandler(BaseHTTPRequestHandler):
+    """
+    Stand-in Splash: /execute returns a page after a delay
+    """
+    lock = threading.Lock()
+    nb_running = 0
+    max_running = 0
+    urls = []
+
+    def do_GET(self):
+        self.send_response(200)
+        self.end_headers()
+
+    def do_POST(self):
+        args = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        cls = MockSplashHandler
+        with cls.lock:
+            cls.nb_running += 1
+            cls.max_running = max(cls.max_running, cls.nb_running)
+            cls.urls.append(args['url'])
+        time.sleep(0.5)
+        with cls.lock:
+            cls.nb_running -= 1
+        body = json.dumps({'html': '<html><body>It works!</body></html>', 'last_url': args['url'], 'cookies': []})
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.end_headers()
+        self.wfile.write(body.encode())
+
+    def log_message(self, format, *args):
+        pass
+
+class Test_Crawler_Service(unittest.TestCase):
+
+    def setUp(self):
+        self.splash = ThreadingHTTPServer(('127.0.0.1', 0), MockSplashHandler)
+        threading.Thread(target=self.splash.serve_forever, daemon=True).start()
+        self.splash_url = f'http://127.0.0.1:{self.splash.server_address[1]}'
+
+    def tearDown(self):
+        self.splash.shutdown()
+
+    def test_concurrent_crawls(self):
+        crawler_options = {'html': True, 'har': False, 'png': False, 'depth_limit': 0,
+                           'closespider_pagecount': 10, 'cookiejar_uuid': None, 'user_agent': 'AIL test'}
+        date = {'date_day': '20210101', 'date_month': '202101', 'epoch': 1609459200}
+        domains = [f'test{i}.onion' for i in range(4)]
+
+        runner = TorSplashCrawlerRunner()
+        crawled = []
+        l_deferred = []
+        for domain in domains:
+            d = runner.crawl(self.splash_url, 'onion', crawler_options, date, 'test', f'http://{domain}', domain, 80, [], None)
+            d.addCallback(lambda crawler: crawled.append(crawler.spider.domains[0]))
+            l_deferred.append(d)
+        defer.DeferredList(l_deferred).addBoth(lambda _: reactor.stop())
+        reactor.callLater(60, reactor.stop)
+        reactor.run()
+
+        self.assertCountEqual(crawled, domains)
+        self.assertEqual(len(MockSplashHandler.urls), len(domains))
+        # crawled concurrently by one reactor
+        self.assertGreater(MockSplashHandler.max_running, 1)
+        self.assertTrue(crawlers.is_test_ail_crawlers_successful())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import unittest
+
+sys.path.append(os.environ['AIL_BIN'])
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# project packages
+from dns_server import LocalDNSServer
+from lib.ConfigLoader import ConfigLoader
+from lib.dns_resolver import DNSResolver
+
+class Test_DNS_Resolver(unittest.TestCase):
+
+    def setUp(self):
+        self.r_cache = ConfigLoader().get_redis_conn("Redis_Cache")
+        self.dns_server = LocalDNSServer({'A': '192.0.2.1'})
+        self.dns_server.start()
+        self.dns_resolver = DNSResolver(self.r_cache, ['127.0.0.1'], port=self.dns_server.port, max_concurrent=10)
+        self.domains = [f'{i}.valid.test' for i in range(20)] + ['unknown.test']
+        self.r_cache.delete(*[f'dns:records:{domain}' for domain in self.domains])
+
+    def tearDown(self):
+        self.r_cache.delete(*[f'dns:records:{domain}' for domain in self.domains])
+        self.dns_server.stop()
+
+    def test_resolve(self):
+        records = self.dns_resolver.get_passive_dns_records(set(self.domains))
+        self.assertCountEqual(records, self.domains[:20])
+        self.assertIn('||0.valid.test||A||192.0.2.1||300||1\n', records['0.valid.test'][0])
+        nb_queries = self.dns_server.nb_queries
+        self.assertEqual(nb_queries, len(self.domains) * len(self.dns_resolver.rtypes))
+
+        # positive and negative cache
+        records = self.dns_resolver.get_passive_dns_records(set(self.domains))
+        self.assertCountEqual(records, self.domains[:20])
+        self.assertEqual(self.dns_server.nb_queries, nb_queries)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -24,6 +24,8 @@ from modules.Telegram import Telegram
 # project packages
 from lib.ConfigLoader import ConfigLoader
 import lib.crawlers as crawlers
+from lib import item_basic
+from lib import item_store
 import packages.Item as Item
 
 #### COPY SAMPLES ####
@@ -134,6 +136,33 @@ class Test_Module_Global(unittest.TestCase):
         # item.delete()
         # # TODO: remove from queue
 
+    def test_local_item(self):
+        item_id = 'tests/2021/01/01/global_local.gz'
+        item = Item.Item(item_id)
+        item.delete()
+
+        item_content = b'Lorem ipsum dolor sit amet, consectetur adipiscing elit'
+        saved_id, digest = item_store.save_local_item(ITEMS_FOLDER, item_id, gzip.compress(item_content))
+        self.assertEqual(saved_id, item_id)
+
+        # Test local item not sent by a local producer (feeder, sync)
+        message = item_store.create_local_item_message(item_id, digest)
+        result = self.module_obj.compute(message, r_result=True)
+        self.assertIsNone(result)
+
+        # Test saved item, local ingest queue (sent by the Mixer)
+        item_basic.add_local_ingest_message(item_basic.GLOBAL_LOCAL_INGEST_QUEUE, message)
+        result = self.module_obj.compute(self.module_obj.get_message(), r_result=True)
+        self.assertEqual(result, item_id)
+
+        # Test duplicate
+        self.assertEqual(item_store.save_local_item(ITEMS_FOLDER, item_id, gzip.compress(item_content)), (None, None))
+
+        # Test path traversal
+        message = item_store.create_local_item_message('../global_local.gz', digest)
+        result = self.module_obj.compute(item_basic.LocalItemMessage(message), r_result=True)
+        self.assertIsNone(result)
+
 class Test_Module_Keys(unittest.TestCase):
 
     def setUp(self):
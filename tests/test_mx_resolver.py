@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import unittest
+
+sys.path.append(os.environ['AIL_BIN'])
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# project packages
+from dns_server import LocalDNSServer
+from lib.ConfigLoader import ConfigLoader
+from lib.mx_resolver import MXResolver
+
+class Test_MX_Resolver(unittest.TestCase):
+
+    def setUp(self):
+        self.r_cache = ConfigLoader().get_redis_conn("Redis_Cache")
+        self.dns_server = LocalDNSServer({'MX': '10 mail.{qname}'})
+        self.dns_server.start()
+        self.mx_resolver = MXResolver(self.r_cache, ['127.0.0.1'], port=self.dns_server.port, max_concurrent=10)
+        self.domains = [f'{i}.valid.test' for i in range(50)] + ['a.nodata.test', 'unknown.test']
+        self.r_cache.delete(*[f'dns:mx:{domain}' for domain in self.domains])
+
+    def tearDown(self):
+        self.r_cache.delete(*[f'dns:mx:{domain}' for domain in self.domains])
+        self.dns_server.stop()
+
+    def test_resolve(self):
+        valid = self.mx_resolver.get_valid_mx_domains(set(self.domains))
+        self.assertCountEqual(valid, self.domains[:50])
+        self.assertEqual(self.dns_server.nb_queries, len(self.domains))
+
+        # positive and negative cache
+        self.assertEqual(self.r_cache.get('dns:mx:unknown.test'), '[]')
+        self.assertEqual(self.r_cache.get('dns:mx:a.nodata.test'), '[]')
+        self.assertIn('||0.valid.test||MX||', self.r_cache.get('dns:mx:0.valid.test'))
+        valid = self.mx_resolver.get_valid_mx_domains(set(self.domains))
+        self.assertCountEqual(valid, self.domains[:50])
+        self.assertEqual(self.dns_server.nb_queries, len(self.domains))
+
+if __name__ == '__main__':
+    unittest.main()
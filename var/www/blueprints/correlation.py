@@ -41,6 +41,8 @@ correlation = Blueprint('correlation', __name__, template_folder=os.path.join(os
 
 # ============ VARIABLES ============
 
+NB_SIMILAR_SCREENSHOTS = 20
+
 ######
 ### graph_line_json
 ### 'hashDecoded.pgpdump_graph_line_json'
@@ -123,6 +125,8 @@ def get_card_metadata(object_type, correlation_id, type_id=None, expand_card=Fal
         card_dict["tags"] = Domain.get_domain_tags(correlation_id)
     elif object_type == 'screenshot':
         card_dict["add_tags_modal"] = Tag.get_modal_add_tags(correlation_id, object_type='image')
+        # perceptual hash lookup
+        card_dict["similar"] = Screenshot.get_similar_screenshots(correlation_id)[:NB_SIMILAR_SCREENSHOTS]
     elif object_type == 'paste':
         card_dict["icon"] = Correlate_object.get_correlation_node_icon(object_type, value=correlation_id)
     return card_dict
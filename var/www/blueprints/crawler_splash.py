@@ -59,11 +59,13 @@ def crawlers_dashboard():
     is_manager_connected = crawlers.get_splash_manager_connection_metadata()
     all_splash_crawler_status = crawlers.get_all_spash_crawler_status()
     splash_crawlers_latest_stats = crawlers.get_splash_crawler_latest_stats()
+    queues_stats = crawlers.get_all_queues_stats()
     date = crawlers.get_current_date()
 
     return render_template("dashboard_splash_crawler.html", all_splash_crawler_status = all_splash_crawler_status,
                                 is_manager_connected=is_manager_connected, date=date,
-                                splash_crawlers_latest_stats=splash_crawlers_latest_stats)
+                                splash_crawlers_latest_stats=splash_crawlers_latest_stats,
+                                queues_stats=queues_stats)
 
 @crawler_splash.route("/crawlers/crawler_dashboard_json", methods=['GET'])
 @login_required
@@ -72,9 +74,11 @@ def crawler_dashboard_json():
 
     all_splash_crawler_status = crawlers.get_all_spash_crawler_status()
     splash_crawlers_latest_stats = crawlers.get_splash_crawler_latest_stats()
+    queues_stats = crawlers.get_all_queues_stats()
 
     return jsonify({'all_splash_crawler_status': all_splash_crawler_status,
-                        'splash_crawlers_latest_stats':splash_crawlers_latest_stats})
+                        'splash_crawlers_latest_stats':splash_crawlers_latest_stats,
+                        'queues_stats': queues_stats})
 
 @crawler_splash.route("/crawlers/manual", methods=['GET'])
 @login_required
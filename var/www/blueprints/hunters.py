@@ -96,6 +96,7 @@ def retro_hunt_add_task():
         name = request.form.get("name", '')
         description = request.form.get("description", '')
         timeout = request.form.get("timeout", 30)
+        nb_workers = request.form.get("nb_workers", None)
         tags = request.form.get("tags", [])
         if tags:
             tags = tags.split()
@@ -128,7 +129,7 @@ def retro_hunt_add_task():
 
         input_dict = {"name": name, "description": description, "creator": user_id,
                         "rule": rule, "type": rule_type,
-                        "tags": tags, "sources": sources, "timeout": timeout, #"mails": mails,
+                        "tags": tags, "sources": sources, "timeout": timeout, "nb_workers": nb_workers, #"mails": mails,
                         "date_from": date_from, "date_to": date_to}
 
         res = Tracker.api_create_retro_hunt_task(input_dict, user_id)
@@ -140,6 +141,7 @@ def retro_hunt_add_task():
     else:
         return render_template("add_retro_hunt_task.html",
                                 all_yara_files=Tracker.get_all_default_yara_files(),
+                                max_workers=Tracker.retro_hunt_max_workers,
                                 all_sources=item_basic.get_all_items_sources(r_list=True))
 
 @hunters.route('/retro_hunt/task/pause', methods=['GET'])
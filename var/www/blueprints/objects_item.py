@@ -9,7 +9,7 @@ import os
 import sys
 import json
 
-from flask import Flask, render_template, jsonify, request, Blueprint, redirect, url_for, Response, abort, send_file
+from flask import Flask, render_template, jsonify, request, Blueprint, redirect, url_for, Response, abort, send_file, stream_with_context
 from flask_login import login_required, current_user
 
 # Import Role_Manager
@@ -19,6 +19,9 @@ sys.path.append(os.path.join(os.environ['AIL_BIN'], 'packages'))
 import Item
 import Tag
 
+sys.path.append(os.path.join(os.environ['AIL_BIN'], 'lib'))
+import crawler_artifacts
+
 sys.path.append(os.path.join(os.environ['AIL_BIN'], 'export'))
 import Export
 
@@ -95,3 +98,16 @@ def item_download(): # # TODO: support post
     if not item_id or not Item.exist_item(item_id):
         abort(404)
     return send_file(Item.get_raw_content(item_id), attachment_filename=item_id, as_attachment=True)
+
+@objects_item.route("/object/item/har")
+@login_required
+@login_read_only
+def item_har():
+    item_id = request.args.get('id')
+    if not item_id or not Item.exist_item(item_id):
+        abort(404)
+    har = crawler_artifacts.iter_har(item_id)
+    if har is None:
+        abort(404)
+    return Response(stream_with_context(har), mimetype='application/json',
+                    headers={'Content-Disposition': f'attachment; filename={os.path.basename(item_id)}.json'})
@@ -196,6 +196,9 @@ def get_obj_by_tags():
         dict_tagged = {"object_type":object_type, "object_name":object_type.title() + "s",
                         "tagged_obj":[], "page":dict_obj['page'] ,"nb_pages":dict_obj['nb_pages'],
                         "nb_first_elem":dict_obj['nb_first_elem'], "nb_last_elem":dict_obj['nb_last_elem'], "nb_all_elem":dict_obj['nb_all_elem']}
+        # approximate number of objects (max), exact when all the days are counted
+        if not dict_obj.get('nb_all_elem_exact', True):
+            dict_tagged['nb_all_elem'] = f"~{dict_obj['nb_all_elem']}"
 
         for obj_id in dict_obj['tagged_obj']:
             obj_metadata = Correlate_object.get_object_metadata(object_type, obj_id)
@@ -20,6 +20,7 @@ from flask_login import login_required
 
 sys.path.append(os.path.join(os.environ['AIL_BIN'], 'lib'))
 import queues_modules
+import Statistics
 
 # ============ VARIABLES ============
 import Flask_config
@@ -151,6 +152,16 @@ def stuff():
     return jsonify(row1=get_queues(r_serv))
 
 
+@dashboard.route("/_get_mixer_stats_json")
+@login_required
+@login_read_only
+def get_mixer_stats_json():
+    date = request.args.get('date')
+    if date and (len(date) != 8 or not date.isdigit()):
+        return jsonify({'error': 'Invalid date, expected format: YYYYMMDD'}), 400
+    return jsonify(Statistics.get_mixer_feeders_statistics(date=date))
+
+
 @dashboard.route("/")
 @login_required
 @login_read_only
@@ -32,6 +32,7 @@ bootstrap_label = Flask_config.bootstrap_label
 
 sys.path.append(os.path.join(os.environ['AIL_BIN'], 'lib'))
 import crawlers
+import crawler_frontier
 
 hiddenServices = Blueprint('hiddenServices', __name__, template_folder='templates')
 
@@ -134,9 +135,7 @@ def get_last_domains_crawled(type):
     return r_serv_onion.lrange('last_{}'.format(type), 0 ,-1)
 
 def get_nb_domains_inqueue(type):
-    nb = r_serv_onion.scard('{}_crawler_queue'.format(type))
-    nb += r_serv_onion.scard('{}_crawler_priority_queue'.format(type))
-    return nb
+    return crawlers.get_nb_elem_to_crawl_by_type(type)
 
 def get_stats_last_crawled_domains(type, date):
     statDomains = {}
@@ -226,6 +225,7 @@ def delete_auto_crawler(url):
     r_serv_onion.delete('crawler_config:auto:{}:{}:{}'.format(type, domain, url))
     # remove from queue
     r_serv_onion.srem('{}_crawler_priority_queue'.format(type), '{};auto'.format(url))
+    crawler_frontier.remove(type, 'priority', '{};auto'.format(url))
     # remove from crawler_auto_queue
     r_serv_onion.zrem('crawler_auto_queue'.format(type), '{};auto;{}'.format(url, type))
 
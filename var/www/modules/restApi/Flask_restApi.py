@@ -24,6 +24,7 @@ import Paste
 import Tag
 import Term
 import Tracker
+import queues_modules
 
 sys.path.append(os.path.join(os.environ['AIL_BIN'], 'import'))
 import importer
@@ -663,5 +664,16 @@ def import_json_item():
 def v1_ping():
     return Response(json.dumps({'status': 'pong'}), mimetype='application/json'), 200
 
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+#
+#       MODULES
+#
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+@restApi.route("api/v1/get/modules/telemetry", methods=['GET'])
+@token_required('read_only')
+def get_modules_telemetry():
+    res = queues_modules.get_modules_telemetry()
+    return Response(json.dumps(res, indent=2, sort_keys=True), mimetype='application/json'), 200
+
 # ========= REGISTRATION =========
 app.register_blueprint(restApi, url_prefix=baseUrl)
@@ -15,9 +15,8 @@ from Role_Manager import login_admin, login_analyst
 from flask_login import login_required
 
 import Paste
+import index_whoosh
 from whoosh import index
-from whoosh.fields import Schema, TEXT, ID
-from whoosh.qparser import QueryParser
 
 import time
 
@@ -34,26 +33,37 @@ bootstrap_label = Flask_config.bootstrap_label
 PASTES_FOLDER = Flask_config.PASTES_FOLDER
 
 baseindexpath = os.path.join(os.environ['AIL_HOME'], config_loader.get_config_str("Indexer", "path"))
-indexRegister_path = os.path.join(os.environ['AIL_HOME'], config_loader.get_config_str("Indexer", "register"))
 
 searches = Blueprint('searches', __name__, template_folder='templates')
 
+# search across the index shards, process pool + results cache
+index_searcher = index_whoosh.IndexSearcher()
+
 # ============ FUNCTIONS ============
-def get_current_index():
-    with open(indexRegister_path, "r") as f:
-        allIndex = f.read()
-        allIndex = allIndex.split() # format [time1\ntime2]
-        allIndex.sort()
-        try:
-            indexname = allIndex[-1].strip('\n\r')
-        except IndexError as e:
-            indexname = "no-index"
-        indexpath = os.path.join(baseindexpath, indexname)
-    return indexpath
+def get_index_name(index_name):
+    """
+    Get the index name selected, "0": current index. The first page and the
+    next pages are searched in the same indexes
+    """
+    if index_name is None or index_name == "0":
+        all_index = sorted(index_whoosh.get_all_index())
+        return all_index[-1] if all_index else ""
+    return index_name
+
+def get_selected_indexes(index_name):
+    """
+    Get the list of index names to search, None: all indexes
+    """
+    if index_name == "all":
+        return None
+    elif index_name in index_whoosh.get_all_index() or index_name == "old_index":
+        return [index_name]
+    else:
+        return []
 
 def get_index_list(selected_index=""):
     temp = []
-    index_list = []
+    index_list = [["all", "All indexes", selected_index == "all"]]
     for dirs in os.listdir(baseindexpath):
         if os.path.isdir(os.path.join(baseindexpath, dirs)):
             value = dirs
@@ -85,6 +95,24 @@ def get_item_count(dirs):
     ix = index.open_dir(os.path.join(baseindexpath, dirs))
     return ix.doc_count_all()
 
+def get_item_tags(path):
+    l_tags = []
+    for tag in r_serv_metadata.smembers('tag:'+path):
+        complete_tag = tag
+        tag = tag.split('=')
+        if len(tag) > 1:
+            if tag[1] != '':
+                tag = tag[1][1:-1]
+            # no value
+            else:
+                tag = tag[0][1:-1]
+        # use for custom tags
+        else:
+            tag = tag[0]
+
+        l_tags.append( (tag, complete_tag) )
+    return l_tags
+
 def to_iso_date(timestamp):
     if timestamp == "old_index":
         return "old_index"
@@ -105,59 +133,33 @@ def search():
     paste_date = []
     paste_size = []
     paste_tags = []
-    index_name = request.form['index_name']
+    # current index selected by default
+    index_name = get_index_name(request.form['index_name'])
     num_elem_to_get = 50
 
     # select correct index
-    if index_name is None or index_name == "0":
-        selected_index = get_current_index()
-    else:
-        selected_index = os.path.join(baseindexpath, index_name)
+    selected_indexes = get_selected_indexes(index_name)
 
     ''' temporary disabled
     # # TODO: search by filename/item id
     '''
 
     # Search full line
-    schema = Schema(title=TEXT(stored=True), path=ID(stored=True), content=TEXT)
-
-    ix = index.open_dir(selected_index)
-    with ix.searcher() as searcher:
-        query = QueryParser("content", ix.schema).parse("".join(q))
-        results = searcher.search_page(query, 1, pagelen=num_elem_to_get)
-        for x in results:
-            r.append(x.items()[0][1].replace(PASTES_FOLDER, '', 1))
-            path = x.items()[0][1].replace(PASTES_FOLDER, '', 1)
-            paste = Paste.Paste(path)
-            content = paste.get_p_content()
-            content_range = max_preview_char if len(content)>max_preview_char else len(content)-1
-            c.append(content[0:content_range])
-            curr_date = str(paste._get_p_date())
-            curr_date = curr_date[0:4]+'/'+curr_date[4:6]+'/'+curr_date[6:]
-            paste_date.append(curr_date)
-            paste_size.append(paste._get_p_size())
-            p_tags = r_serv_metadata.smembers('tag:'+path)
-            l_tags = []
-            for tag in p_tags:
-                complete_tag = tag
-                tag = tag.split('=')
-                if len(tag) > 1:
-                    if tag[1] != '':
-                        tag = tag[1][1:-1]
-                    # no value
-                    else:
-                        tag = tag[0][1:-1]
-                # use for custom tags
-                else:
-                    tag = tag[0]
-
-                l_tags.append( (tag, complete_tag) )
-
-            paste_tags.append(l_tags)
-        results = searcher.search(query)
-        num_res = len(results)
-
-    index_list = get_index_list()
+    num_res, results = index_searcher.search("".join(q), page=1, pagelen=num_elem_to_get, index_names=selected_indexes)
+    for score, result_index, path in results:
+        path = path.replace(PASTES_FOLDER, '', 1)
+        r.append(path)
+        paste = Paste.Paste(path)
+        content = paste.get_p_content()
+        content_range = max_preview_char if len(content)>max_preview_char else len(content)-1
+        c.append(content[0:content_range])
+        curr_date = str(paste._get_p_date())
+        curr_date = curr_date[0:4]+'/'+curr_date[4:6]+'/'+curr_date[6:]
+        paste_date.append(curr_date)
+        paste_size.append(paste._get_p_size())
+        paste_tags.append(get_item_tags(path))
+
+    index_list = get_index_list(index_name)
 
     index_min = 1
     index_max = len(index_list)
@@ -180,14 +182,11 @@ def get_more_search_result():
     q = []
     q.append(query)
     page_offset = int(request.form['page_offset'])
-    index_name = request.form['index_name']
+    index_name = get_index_name(request.form['index_name'])
     num_elem_to_get = 50
 
     # select correct index
-    if index_name is None or index_name == "0":
-        selected_index = get_current_index()
-    else:
-        selected_index = os.path.join(baseindexpath, index_name)
+    selected_indexes = get_selected_indexes(index_name)
 
     path_array = []
     preview_array = []
@@ -195,53 +194,31 @@ def get_more_search_result():
     size_array = []
     list_tags = []
 
-    schema = Schema(title=TEXT(stored=True), path=ID(stored=True), content=TEXT)
-
-    ix = index.open_dir(selected_index)
-    with ix.searcher() as searcher:
-        query = QueryParser("content", ix.schema).parse(" ".join(q))
-        results = searcher.search_page(query, page_offset, num_elem_to_get)
-        for x in results:
-            path = x.items()[0][1]
-            path = path.replace(PASTES_FOLDER, '', 1)
-            path_array.append(path)
-            paste = Paste.Paste(path)
-            content = paste.get_p_content()
-            content_range = max_preview_char if len(content)>max_preview_char else len(content)-1
-            preview_array.append(content[0:content_range])
-            curr_date = str(paste._get_p_date())
-            curr_date = curr_date[0:4]+'/'+curr_date[4:6]+'/'+curr_date[6:]
-            date_array.append(curr_date)
-            size_array.append(paste._get_p_size())
-            p_tags = r_serv_metadata.smembers('tag:'+path)
-            l_tags = []
-            for tag in p_tags:
-                complete_tag = tag
-                tag = tag.split('=')
-                if len(tag) > 1:
-                    if tag[1] != '':
-                        tag = tag[1][1:-1]
-                    # no value
-                    else:
-                        tag = tag[0][1:-1]
-                # use for custom tags
-                else:
-                    tag = tag[0]
-
-                l_tags.append( (tag, complete_tag) )
-            list_tags.append(l_tags)
-
-        to_return = {}
-        to_return["path_array"] = path_array
-        to_return["preview_array"] = preview_array
-        to_return["date_array"] = date_array
-        to_return["size_array"] = size_array
-        to_return["list_tags"] = list_tags
-        to_return["bootstrap_label"] = bootstrap_label
-        if len(path_array) < num_elem_to_get: #pagelength
-            to_return["moreData"] = False
-        else:
-            to_return["moreData"] = True
+    num_res, results = index_searcher.search(" ".join(q), page=page_offset, pagelen=num_elem_to_get, index_names=selected_indexes)
+    for score, result_index, path in results:
+        path = path.replace(PASTES_FOLDER, '', 1)
+        path_array.append(path)
+        paste = Paste.Paste(path)
+        content = paste.get_p_content()
+        content_range = max_preview_char if len(content)>max_preview_char else len(content)-1
+        preview_array.append(content[0:content_range])
+        curr_date = str(paste._get_p_date())
+        curr_date = curr_date[0:4]+'/'+curr_date[4:6]+'/'+curr_date[6:]
+        date_array.append(curr_date)
+        size_array.append(paste._get_p_size())
+        list_tags.append(get_item_tags(path))
+
+    to_return = {}
+    to_return["path_array"] = path_array
+    to_return["preview_array"] = preview_array
+    to_return["date_array"] = date_array
+    to_return["size_array"] = size_array
+    to_return["list_tags"] = list_tags
+    to_return["bootstrap_label"] = bootstrap_label
+    if len(path_array) < num_elem_to_get: #pagelength
+        to_return["moreData"] = False
+    else:
+        to_return["moreData"] = True
 
     return jsonify(to_return)
 